@@ -0,0 +1,180 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, current_app, request
+
+from backend.config import RESPONSE_CACHE_MAX_BYTES
+from backend.database.data_generation import read_generation
+from backend.database.schema import get_db_connection
+
+# Cache of the response bodies of the read-only analytics endpoints. Entries are keyed by the
+# request (endpoint, path and query arguments) and the data generation read before the view
+# runs, so a response is served from the cache until the next ingest or Slurm store bumps the
+# generation. Generations only grow, so the entries of older ones are dropped as soon as a newer
+# one is seen.
+#
+# The same key gives the strong ETag of conditional_response, which answers a matching
+# If-None-Match with 304 before any query runs. Last-Modified is sent too, but If-Modified-Since is
+# not answered: it has a resolution of one second, so a request made within the second of an
+# ingest would be told that a response computed before the ingest is still current.
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of response bodies, bounded by their total size in bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _set_generation(self, generation: int):
+        """Drop every entry when a newer generation is seen. Must be called with the lock held."""
+        if self.generation is None or generation > self.generation:
+            self._entries.clear()
+            self._bytes = 0
+            self.generation = generation
+
+    def get(self, generation: int, key):
+        """Return the cached (body, mimetype) of `key` in `generation`, or None"""
+        with self._lock:
+            self._set_generation(generation)
+            entry = self._entries.get((generation, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((generation, key))
+            self.hits += 1
+            return entry
+
+    def put(self, generation: int, key, body: bytes, mimetype: str):
+        """Store a response body, evicting the least recently used entries beyond the byte budget"""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._set_generation(generation)
+            if generation < self.generation:
+                return
+            previous = self._entries.pop((generation, key), None)
+            if previous is not None:
+                self._bytes -= len(previous[0])
+            self._entries[(generation, key)] = (body, mimetype)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry and forget the generation, e.g. before serving another database"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.generation = None
+
+    def stats(self) -> dict:
+        """Return hit and miss counts, the hit rate and the memory use of the cache"""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'generation': self.generation,
+            }
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES)
+
+
+def current_generation() -> tuple:
+    """
+    Return the (generation, updated_at) of the app's database, read once per request. It is kept
+    in the WSGI environ rather than flask.g, whose app context can outlive a streamed response.
+    """
+    environ = request.environ
+    if 'cluster_usage.data_generation' not in environ:
+        conn = get_db_connection(current_app.config['DB_PATH'], profile='read')
+        try:
+            environ['cluster_usage.data_generation'] = read_generation(conn)
+        finally:
+            conn.close()
+    return environ['cluster_usage.data_generation']
+
+
+def request_key() -> tuple:
+    """Identify the current request by database, endpoint, path arguments and sorted query arguments"""
+    return (
+        current_app.config['DB_PATH'],
+        request.endpoint,
+        tuple(sorted((request.view_args or {}).items())),
+        tuple(sorted(request.args.items(multi=True))),
+    )
+
+
+def request_etag(generation: int) -> str:
+    """Strong entity tag of the current request's response in `generation`"""
+    digest = hashlib.sha1(repr(request_key()).encode()).hexdigest()[:16]
+    return f"{generation}-{digest}"
+
+
+def conditional_response(view):
+    """
+    Add a strong ETag and Last-Modified to a view's successful responses and answer matching
+    If-None-Match requests with 304 without running the view. If-Modified-Since is ignored, the
+    ETag is always available and unlike the date it changes with every generation. Only for views
+    whose response depends on nothing but the request and the data generation.
+
+    Streamed responses are passed through without validators: a stream that fails after it
+    started still goes out as a 200 ending in an error record (see backend.api.streaming), and a
+    304 must never confirm such a truncated body.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        generation, updated_at = current_generation()
+        etag = request_etag(generation)
+        last_modified = datetime.fromtimestamp(updated_at, timezone.utc) if updated_at is not None else None
+
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        # Let browsers keep the response but revalidate it on every use
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+
+def cached_response(view):
+    """Serve a view's successful responses from response_cache until the data generation changes"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Read before the view runs, so that a response is never stored under a newer generation
+        # than the data it was computed from
+        generation, _ = current_generation()
+        key = request_key()
+        entry = response_cache.get(generation, key)
+        if entry is not None:
+            body, mimetype = entry
+            return Response(body, mimetype=mimetype)
+
+        response = current_app.make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.is_streamed:
+            response_cache.put(generation, key, response.get_data(), response.mimetype)
+        return response
+    return wrapper
@@ -12,11 +12,17 @@ from backend.database.queries import (
     get_database_stats, get_all_users, get_all_machines,
     get_user_usage, get_machine_usage, get_time_usage, get_size_distribution,
     get_time_stats_for_user, get_top_users_recent_logs, get_historic_usage,
-    get_historic_usage_per_user, # get_user_thesis_and_supervisors, get_all_theses_and_supervisors
+    iter_historic_usage, get_historic_usage_per_user, iter_historic_usage_per_user,
+    # get_user_thesis_and_supervisors, get_all_theses_and_supervisors
 )
+from backend.config import HISTORIC_COALESCED_PAGE_MAX
 from backend.tasks.periodic_tasks import get_task_logs, get_task_logs_count
 from backend.tasks.calendar_tasks import CALENDAR_LOGS_DIR
-from backend.database.schema import get_db_connection
+from backend.api.response_cache import cached_response, conditional_response, response_cache
+from backend.api.streaming import array_response, stream_array, stream_object
+from backend.database.schema import get_db_connection, get_pool_stats
+from backend.utils.single_flight import get_single_flight_stats
+from backend.utils.timezone_utils import CET_TIMEZONE
 from backend.parsers.slurm_parser import (
     parse_slurm_log, 
     get_current_usage_summary,
@@ -27,32 +33,141 @@ from backend.email_notifications.email_notifications import get_email_notificati
 
 api = Blueprint('api', __name__, url_prefix='/api')
 
+def int_arg(name, default=None, minimum=None):
+    """
+    Read an integer parameter, or `default` if it is not given. Raises ValueError if it is not
+    an integer or is below `minimum`.
+    """
+    value = request.args.get(name, default=None, type=str)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid '{name}' value '{value}', expected an integer") from None
+    if minimum is not None and number < minimum:
+        raise ValueError(f"{name} must be at least {minimum}")
+    return number
+
+def time_arg(name):
+    """
+    Read a time parameter as a local 'YYYY-MM-DD HH:MM:SS' timestamp like LogEntries.timestamp,
+    or None if it is not given. Accepts ISO 8601 (times without an offset are local CET/CEST)
+    and unix times in seconds. Raises ValueError for anything else.
+    """
+    value = request.args.get(name, default=None, type=str)
+    if value is None:
+        return None
+    try:
+        if value.lstrip('-').isdecimal() and value.isascii():
+            parsed = datetime.fromtimestamp(int(value), CET_TIMEZONE)
+        else:
+            # fromisoformat only reads a trailing Z from Python 3.11 on
+            parsed = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    except (ValueError, OverflowError, OSError):
+        raise ValueError(f"Invalid '{name}' time '{value}', expected ISO 8601 or unix seconds") from None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(CET_TIMEZONE)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+def time_range_args(start_name='from', end_name='to'):
+    """Read a pair of time parameters with time_arg, raising ValueError if the start is after the end"""
+    start, end = time_arg(start_name), time_arg(end_name)
+    if start is not None and end is not None and start > end:
+        raise ValueError(f"'{start_name}' ({start}) is after '{end_name}' ({end})")
+    return start, end
+
+def time_series_args():
+    """
+    Read the time series parameters of the request: `from` and `to` bound the timestamps (see
+    time_arg), `bucket` (10m, 1h, 1d or 1w) aggregates the series per interval and `max_points`
+    caps the number of points returned, downsampling with LTTB. Raises ValueError for invalid
+    values.
+    """
+    from_time, to_time = time_range_args()
+    return {
+        'from_time': from_time,
+        'to_time': to_time,
+        'bucket': request.args.get('bucket', default=None, type=str),
+        'max_points': int_arg('max_points'),
+    }
+
+def columnar_format():
+    """
+    Read the `format` parameter: 'rows' (the default) returns lists of objects, 'columns' returns
+    them as one array per column, with time series timestamps as unix times. Returns whether
+    columns were requested.
+    """
+    value = request.args.get('format', default='rows', type=str)
+    if value not in ('rows', 'columns'):
+        raise ValueError(f"Unknown format '{value}', expected 'rows' or 'columns'")
+    return value == 'columns'
+
+def ndjson_format():
+    """
+    Read the `format` parameter of the streamed endpoints: 'json' (the default) streams one JSON
+    document, 'ndjson' one JSON object per line. Returns whether NDJSON was requested.
+    """
+    value = request.args.get('format', default='json', type=str)
+    if value not in ('json', 'ndjson'):
+        raise ValueError(f"Unknown format '{value}', expected 'json' or 'ndjson'")
+    return value == 'ndjson'
+
 @api.route('/stats', methods=['GET'])
+@conditional_response
+@cached_response
 def stats():
     """Get overall database statistics"""
     db_path = current_app.config['DB_PATH']
     stats = get_database_stats(db_path)
     return jsonify(stats)
 
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """Get runtime metrics of the backend"""
+    return jsonify({
+        'connection_pool': get_pool_stats(),
+        'response_cache': response_cache.stats(),
+        'single_flight': get_single_flight_stats(),
+    })
+
 @api.route('/users', methods=['GET'])
+@conditional_response
+@cached_response
 def users():
-    """Get all users"""
+    """Get all users, see columnar_format for the `format` parameter"""
     db_path = current_app.config['DB_PATH']
-    users_list = get_all_users(db_path)
+    try:
+        users_list = get_all_users(db_path, columnar=columnar_format())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     return jsonify(users_list)
 
 @api.route('/machines', methods=['GET'])
+@conditional_response
+@cached_response
 def machines():
-    """Get all machines"""
+    """Get all machines, see columnar_format for the `format` parameter"""
     db_path = current_app.config['DB_PATH']
-    machines_list = get_all_machines(db_path)
+    try:
+        machines_list = get_all_machines(db_path, columnar=columnar_format())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     return jsonify(machines_list)
 
 @api.route('/usage/user/<username>', methods=['GET'])
+@conditional_response
+@cached_response
 def user_usage(username):
-    """Get usage statistics for a specific user"""
+    """
+    Get usage statistics for a specific user, see time_series_args for the time series parameters
+    and columnar_format for the `format` parameter
+    """
     db_path = current_app.config['DB_PATH']
-    user_data = get_user_usage(db_path, username=username)
+    try:
+        user_data = get_user_usage(db_path, username=username, columnar=columnar_format(), **time_series_args())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     if not user_data:
         return jsonify({'error': f'User {username} not found'}), 404
@@ -60,10 +175,19 @@ def user_usage(username):
     return jsonify(user_data)
 
 @api.route('/usage/machine/<machine_name>', methods=['GET'])
+@conditional_response
+@cached_response
 def machine_usage(machine_name):
-    """Get usage statistics for a specific machine"""
+    """
+    Get usage statistics for a specific machine, see time_series_args for the time series parameters
+    and columnar_format for the `format` parameter
+    """
     db_path = current_app.config['DB_PATH']
-    machine_data = get_machine_usage(db_path, machine_name=machine_name)
+    try:
+        machine_data = get_machine_usage(db_path, machine_name=machine_name, columnar=columnar_format(),
+                                         **time_series_args())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     if not machine_data:
         return jsonify({'error': f'Machine {machine_name} not found'}), 404
@@ -71,27 +195,57 @@ def machine_usage(machine_name):
     return jsonify(machine_data)
 
 @api.route('/usage/time', methods=['GET'])
+@conditional_response
+@cached_response
 def time_usage():
-    """Get time-based usage statistics"""
+    """
+    Get time-based usage statistics, optionally with the patterns limited to a role and machine type.
+    See time_series_args for the time series parameters and columnar_format for the `format` parameter.
+    """
     db_path = current_app.config['DB_PATH']
-    time_data = get_time_usage(db_path)
+    user_role = request.args.get('role', default=None, type=str)
+    machine_type = request.args.get('machine_type', default=None, type=str)
+    try:
+        time_data = get_time_usage(db_path, user_role=user_role, machine_type=machine_type,
+                                   columnar=columnar_format(), **time_series_args())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     return jsonify(time_data)
 
 @api.route('/usage/size', methods=['GET'])
+@conditional_response
+@cached_response
 def size_usage():
-    """Get size distribution statistics"""
+    """
+    Get size distribution statistics, optionally limited to the days from `since` to `until`
+    (see time_arg). Users without a role are not part of `by_role`.
+    """
     db_path = current_app.config['DB_PATH']
-    size_data = get_size_distribution(db_path)
+    try:
+        since, until = time_range_args('since', 'until')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    size_data = get_size_distribution(db_path, since=since, until=until)
     return jsonify(size_data)
 
 @api.route('/usage/user/<username>/time', methods=['GET'])
+@conditional_response
+@cached_response
 def user_time_stats(username):
-    """Get time-based usage statistics for a specific user"""
+    """
+    Get time-based usage statistics for a specific user, see time_series_args for the time series
+    parameters and columnar_format for the `format` parameter
+    """
     db_path = current_app.config['DB_PATH']
-    time_data = get_time_stats_for_user(db_path, username)
+    try:
+        time_data = get_time_stats_for_user(db_path, username, columnar=columnar_format(), **time_series_args())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     return jsonify(time_data)
 
 @api.route('/top-users/recent', methods=['GET'])
+@conditional_response
+@cached_response
 def top_users_recent():
     """Get top users by IO operations for recent logs"""
     db_path = current_app.config['DB_PATH']
@@ -101,12 +255,32 @@ def top_users_recent():
     return jsonify(users_data)
 
 @api.route('/usage/historic', methods=['GET'])
+@conditional_response
 def historic_usage():
-    """Get historic usage data with top N users for each log entry"""
+    """
+    Get historic usage data with top N users for each log entry, most recent first.
+
+    `top_n` (at least 1, 10 by default) is the number of users listed per entry. Pass the
+    unix_timestamp of the last entry as `before` to get the next page of `limit` entries, both
+    non-negative integers. Pages
+    of up to HISTORIC_COALESCED_PAGE_MAX entries are returned whole with an ETag, larger and
+    unbounded requests are streamed as the rows come out of the database, as a JSON array or
+    with format=ndjson one entry per line.
+    """
     db_path = current_app.config['DB_PATH']
-    top_n = request.args.get('top_n', default=10, type=int)
-    historic_data = get_historic_usage(db_path, top_n)
-    return jsonify(historic_data)
+    try:
+        top_n = int_arg('top_n', default=10, minimum=1)
+        before = int_arg('before', minimum=0)
+        limit = int_arg('limit', minimum=0)
+        from_time, to_time = time_range_args()
+        ndjson = ndjson_format()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    page = {'before': before, 'limit': limit, 'from_time': from_time, 'to_time': to_time}
+    if limit is not None and limit <= HISTORIC_COALESCED_PAGE_MAX:
+        # Dashboard pages are small, concurrent requests for the same page share one query
+        return array_response(get_historic_usage(db_path, top_n, **page), ndjson)
+    return stream_array(iter_historic_usage(db_path, top_n, **page), ndjson)
 
 @api.route('/task-logs', methods=['GET'])
 def task_logs():
@@ -173,7 +347,7 @@ def get_active_calendar_events():
         unparsed_file = os.path.join(CALENDAR_LOGS_DIR, 'calendar_unparsed.log')
         events = []
         unparsed_events = []
-        conn = get_db_connection(current_app.config['DB_PATH'])
+        conn = get_db_connection(current_app.config['DB_PATH'], profile='read')
         cursor = conn.cursor()
         if os.path.exists(log_file):
             with open(log_file, 'r') as f:
@@ -254,7 +428,7 @@ def get_user_overview(username):
 
 def get_user_current_usage(username, db_path):
     """Get current resource usage for a specific user"""
-    conn = get_db_connection(db_path)
+    conn = get_db_connection(db_path, profile='read')
     try:
         cursor = conn.cursor()
         
@@ -303,7 +477,7 @@ def get_user_current_usage(username, db_path):
 
 def get_user_running_jobs(username, db_path):
     """Get currently running jobs for a specific user"""
-    conn = get_db_connection(db_path)
+    conn = get_db_connection(db_path, profile='read')
     try:
         cursor = conn.cursor()
         
@@ -352,7 +526,7 @@ def get_user_running_jobs(username, db_path):
 
 def get_user_job_history(username, db_path, limit=100):
     """Get job history for a specific user"""
-    conn = get_db_connection(db_path)
+    conn = get_db_connection(db_path, profile='read')
     try:
         cursor = conn.cursor()
         
@@ -408,6 +582,7 @@ def get_user_job_history(username, db_path, limit=100):
 #     return jsonify(result)
 
 @api.route('/users/<username>/historic-usage', methods=['GET'])
+@conditional_response
 def get_user_historic_usage(username):
     """Get historic GPU usage for a specific user, grouped by machine"""
     try:
@@ -418,23 +593,35 @@ def get_user_historic_usage(username):
         return jsonify({'error': str(e)}), 500
 
 @api.route('/historic-usage', methods=['GET'])
+@conditional_response
 def get_all_historic_usage():
-    """Get historic GPU usage for all users, grouped by machine"""
+    """
+    Get historic GPU usage for all users, grouped by machine.
+
+    The object is streamed one user at a time as the jobs are read. With format=ndjson every line
+    is an object with the username and its usage by machine.
+    """
+    db_path = current_app.config['DB_PATH']
     try:
-        db_path = current_app.config['DB_PATH']
-        usage_data = get_historic_usage_per_user(db_path)
-        return jsonify(usage_data)
+        ndjson = ndjson_format()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        usage = iter_historic_usage_per_user(db_path)
+        if ndjson:
+            return stream_array(({'username': username, 'machines': machines} for username, machines in usage), True)
+        return stream_object(usage)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @api.route('/users/gpu-hours', methods=['GET'])
+@conditional_response
 def get_all_users_gpu_hours():
     """Return the total GPU hours for all users, summed across all machines."""
     try:
         db_path = current_app.config['DB_PATH']
-        usage_by_user = get_historic_usage_per_user(db_path)
         result = {}
-        for username, machines in usage_by_user.items():
+        for username, machines in iter_historic_usage_per_user(db_path):
             gpu_hours = 0.0
             for machine, stats in machines.items():
                 gpu_hours += stats.get('total_gpu_hours', 0.0)
@@ -448,14 +635,14 @@ def get_users_emailed_last_12h():
     """Return a list of usernames who received an email from the system in the last 12 hours."""
     try:
         db_path = current_app.config['DB_PATH']
-        conn = get_db_connection(db_path)
+        conn = get_db_connection(db_path, profile='read')
         cursor = conn.cursor()
         from backend.utils.timezone_utils import get_current_time_cet
         twelve_hours_ago = get_current_time_cet() - timedelta(hours=12)
         # Query PeriodicTaskLogs for recent email notifications
         cursor.execute("""
             SELECT message FROM PeriodicTaskLogs
-            WHERE task_name LIKE 'email-%' AND timestamp >= ?
+            WHERE task_name GLOB 'email-*' AND timestamp >= ?
         """, (twelve_hours_ago.strftime('%Y-%m-%d %H:%M:%S'),))
         import re
         emailed_users = set()
@@ -540,7 +727,7 @@ def get_all_theses():
     """
     try:
         db_path = current_app.config['DB_PATH']
-        conn = get_db_connection(db_path)
+        conn = get_db_connection(db_path, profile='read')
         cursor = conn.cursor()
         
         # Get all theses with their student-supervisor relationships
@@ -0,0 +1,130 @@
+import json
+import logging
+from typing import Any, Iterable, Iterator, Tuple
+
+from flask import Response, stream_with_context
+
+from backend.config import STREAM_CHUNK_SIZE
+
+# Streamed JSON and NDJSON responses for results too large to build in memory with jsonify.
+# The items come from a generator, e.g. rows as they are read from a cursor, and are encoded
+# one at a time, so the first chunk goes out once STREAM_CHUNK_SIZE characters are encoded and
+# the memory held does not grow with the size of the result. Items are encoded like jsonify
+# does: compact separators and sorted keys. The generator is closed, and with it its cursor,
+# when the client disconnects.
+#
+# The first item is read before the response is returned, so that bad arguments and database
+# errors still raise in the view and get an error status. Once the response has started, a
+# failure ends it with a well-formed error record instead: a last {"error": ...} element of an
+# array, a last STREAM_ERROR_KEY member of an object or a last {"error": ...} line of NDJSON.
+# Such a response still has status 200, so streamed responses get no ETag (see
+# backend.api.response_cache.conditional_response).
+
+JSON_MIMETYPE = 'application/json'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Member that ends a streamed object on failure. The keys of streamed objects are usernames,
+# which cannot contain '@', so the member cannot be mistaken for an entry.
+STREAM_ERROR_KEY = '@error'
+
+_encode = json.JSONEncoder(separators=(',', ':'), sort_keys=True).encode
+
+
+def _error_record(error: Exception) -> dict:
+    """Log a failure of a started stream and return the record that ends the response"""
+    logging.exception("Streamed response failed after it started")
+    return {'error': str(error)}
+
+
+def prefetch(items: Iterable[Any]) -> Iterator[Any]:
+    """
+    Read the first item of `items` now, raising any error of the query behind it, and return an
+    iterator over all items
+    """
+    iterator = iter(items)
+    try:
+        first = next(iterator)
+    except StopIteration:
+        return iter(())
+
+    def resume():
+        yield first
+        yield from iterator
+    return resume()
+
+
+def _chunks(parts: Iterable[str]):
+    """Join consecutive strings of `parts` into chunks of at least STREAM_CHUNK_SIZE characters"""
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= STREAM_CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def iter_json_array(items: Iterable[Any]):
+    """Yield the JSON encoding of a list of `items` in parts"""
+    yield '['
+    count = 0
+    try:
+        for item in items:
+            yield (',' if count else '') + _encode(item)
+            count += 1
+    except Exception as e:
+        yield (',' if count else '') + _encode(_error_record(e))
+    yield ']'
+
+
+def iter_json_object(pairs: Iterable[Tuple[str, Any]]):
+    """Yield the JSON encoding of an object with the (key, value) `pairs` in parts, in their order"""
+    yield '{'
+    count = 0
+    try:
+        for key, value in pairs:
+            yield (',' if count else '') + _encode(str(key)) + ':' + _encode(value)
+            count += 1
+    except Exception as e:
+        yield (',' if count else '') + _encode(STREAM_ERROR_KEY) + ':' + _encode(_error_record(e)['error'])
+    yield '}'
+
+
+def iter_ndjson(items: Iterable[Any]):
+    """Yield `items` as newline delimited JSON, one line per item"""
+    try:
+        for item in items:
+            yield _encode(item) + '\n'
+    except Exception as e:
+        yield _encode(_error_record(e)) + '\n'
+
+
+def stream_response(parts: Iterable[str], mimetype: str = JSON_MIMETYPE) -> Response:
+    """Return a response streaming `parts`, e.g. iter_json_array(rows), in chunks"""
+    return Response(stream_with_context(_chunks(parts)), mimetype=mimetype)
+
+
+def stream_array(items: Iterable[Any], ndjson: bool = False) -> Response:
+    """Return a response streaming `items` as a JSON array, or with `ndjson` one JSON line per item"""
+    items = prefetch(items)
+    if ndjson:
+        return stream_response(iter_ndjson(items), NDJSON_MIMETYPE)
+    return stream_response(iter_json_array(items))
+
+
+def array_response(items: Iterable[Any], ndjson: bool = False) -> Response:
+    """
+    Return a response holding `items` encoded like stream_array, for results already in memory.
+    Unlike a stream it is complete when returned, so conditional_response gives it an ETag.
+    """
+    parts = iter_ndjson(items) if ndjson else iter_json_array(items)
+    return Response(''.join(parts), mimetype=NDJSON_MIMETYPE if ndjson else JSON_MIMETYPE)
+
+
+def stream_object(pairs: Iterable[Tuple[str, Any]]) -> Response:
+    """Return a response streaming the (key, value) `pairs` as a JSON object"""
+    return stream_response(iter_json_object(prefetch(pairs)))
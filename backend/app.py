@@ -12,9 +12,12 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from config import (
     DATA_DIR, DB_PATH, INCOMING_LOGS_DIR, ARCHIVE_LOGS_DIR, 
-    API_PREFIX, DEBUG, HOST, PORT
+    API_PREFIX, DEBUG, HOST, PORT, LOG_FOLLOW_ENABLED, LOG_FOLLOW_INTERVAL_MINUTES, HISTOGRAM_STORAGE
 )
 from backend.database import schema # import initialize_database, get_db_connection
+from backend.database.snapshot_writer import SnapshotWriter
+from backend.database.bulk_load import BulkSnapshotWriter
+from backend.database import histograms, query_plans, rollups, stats_counters
 from api import routes # import api
 from parsers import log_parser # import process_log_file
 from backend.tasks.periodic_tasks import scheduler
@@ -23,6 +26,7 @@ from backend.tasks.calendar_tasks import get_active_calendar_events
 from backend.tasks.check_reservation import check_reservation_activity
 from backend.tasks.check_usage import check_usage_activity
 from backend.tasks.parse_slurm_job_task import parse_and_store_slurm_log
+from backend.tasks.follow_logs_task import follow_incoming_logs
 # --- BEGIN: Import disco scraper task function ---
 from backend.tasks.disco_scraper_task import scrape_disco_theses
 # --- END: Import disco scraper task function ---
@@ -36,8 +40,9 @@ app.config['DB_PATH'] = DB_PATH
 app.config['INCOMING_LOGS_DIR'] = INCOMING_LOGS_DIR
 app.config['ARCHIVE_LOGS_DIR'] = ARCHIVE_LOGS_DIR
 
-# Enable CORS for all routes and origins
-CORS(app)
+# Enable CORS for all routes and origins, letting the frontend read the validators of
+# conditional GETs when the API runs on another origin
+CORS(app, expose_headers=['ETag', 'Last-Modified'])
 
 # Register API blueprint
 app.register_blueprint(routes.api, url_prefix=API_PREFIX)
@@ -60,10 +65,13 @@ def serve_frontend(path):
         return send_from_directory(frontend_build_dir, 'index.html')
 
 def find_log_files(directory):
-    """Find all log files in the given directory"""
+    """Find all plain and compressed (.log.gz, .log.zst, .log.xz) log files in the given directory"""
     import glob
-    log_files = glob.glob(os.path.join(directory, "*.log"))
-    return log_files
+    log_files = []
+    for suffix in log_parser.LOG_FILE_SUFFIXES:
+        log_files.extend(glob.glob(os.path.join(directory, "*" + suffix)))
+    # Sorted so that sequential and parallel ingest see the files in the same order
+    return sorted(log_files)
 
 def init_database():
     """Initialize the database"""
@@ -74,8 +82,15 @@ def init_database():
     print(f"Database initialized at {DB_PATH}")
     return True
 
-def process_logs(incoming_dir=INCOMING_LOGS_DIR, archive_dir: Union[str, None]=ARCHIVE_LOGS_DIR):
-    """Process all log files in the incoming directory"""
+def process_logs(incoming_dir=INCOMING_LOGS_DIR, archive_dir: Union[str, None]=ARCHIVE_LOGS_DIR,
+                 commit_every=log_parser.DEFAULT_COMMIT_EVERY, skip_existing=True, workers=1,
+                 archive_compression=None, bulk=False):
+    """
+    Process all log files in the incoming directory, parsing them in `workers` processes if > 1.
+
+    With `bulk`, rows are staged without indexes and merged into the database at the end, and
+    files are only archived once the merge has been committed.
+    """
     log_files = find_log_files(incoming_dir)
     
     if not log_files:
@@ -85,35 +100,150 @@ def process_logs(incoming_dir=INCOMING_LOGS_DIR, archive_dir: Union[str, None]=A
     print(f"Found {len(log_files)} log files to process")
     
     conn = schema.get_db_connection(DB_PATH)
-    processed_count = 0
+    writer = BulkSnapshotWriter(conn) if bulk else SnapshotWriter(conn)
+    file_archive_dir = None if bulk else archive_dir
+    processed_files = []
+
+    if workers > 1:
+        results = log_parser.process_log_files_parallel(conn, log_files, workers, file_archive_dir, commit_every=commit_every,
+                                                        writer=writer, skip_existing=skip_existing,
+                                                        archive_compression=archive_compression)
+        for log_file, success in tqdm.tqdm(zip(log_files, results), total=len(log_files)):
+            if success:
+                processed_files.append(log_file)
+    else:
+        for log_file in tqdm.tqdm(log_files):
+            if log_parser.process_log_file(conn, log_file, file_archive_dir, verbose=False, commit_every=commit_every,
+                                           writer=writer, skip_existing=skip_existing,
+                                           archive_compression=archive_compression):
+                processed_files.append(log_file)
 
-    for log_file in tqdm.tqdm(log_files):
-        if log_parser.process_log_file(conn, log_file, archive_dir, verbose=False):
-            processed_count += 1
+    if bulk:
+        print(f"Staged {writer.summary()}, merging into the database")
+        writer.finish()
+        if archive_dir:
+            for log_file in processed_files:
+                log_parser.archive_log_file(log_file, archive_dir, archive_compression)
     
     conn.close()
     
-    print(f"Processed {processed_count} out of {len(log_files)} log files")
-    return processed_count == len(log_files)
+    print(f"Processed {len(processed_files)} out of {len(log_files)} log files: {writer.summary()}")
+    return len(processed_files) == len(log_files)
 
-def process_specific_log(log_path, archive_dir=None):
-    """Process a specific log file"""
+def process_specific_log(log_path, archive_dir=None, commit_every=log_parser.DEFAULT_COMMIT_EVERY, skip_existing=True,
+                         workers=1, archive_compression=None):
+    """Process a specific log file, splitting it into chunks parsed by `workers` processes if > 1"""
     if not os.path.exists(log_path):
         print(f"Log file not found: {log_path}")
         return False
     
     conn = schema.get_db_connection(DB_PATH)
-    result = log_parser.process_log_file(conn, log_path, archive_dir)
+    if workers > 1:
+        results = log_parser.process_log_files_parallel(conn, [log_path], workers, archive_dir, commit_every=commit_every,
+                                                        skip_existing=skip_existing, chunk_min_bytes=0,
+                                                        archive_compression=archive_compression)
+        result = all(results)
+    else:
+        result = log_parser.process_log_file(conn, log_path, archive_dir, commit_every=commit_every,
+                                             skip_existing=skip_existing, archive_compression=archive_compression)
     conn.close()
     
     return result
 
+def pack_histograms():
+    """Convert the IOOperations rows into packed SessionHistograms and reclaim the freed space"""
+    schema.initialize_database(DB_PATH)
+    conn = schema.get_db_connection(DB_PATH)
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        packed = histograms.pack_histograms(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+    conn.execute("VACUUM")
+    conn.close()
+    
+    print(f"Packed the histograms of {packed} sessions")
+    if HISTOGRAM_STORAGE != 'packed':
+        print("Set HISTOGRAM_STORAGE = 'packed' in config.py so that ingest and queries use the packed layout")
+    return True
+
+def rebuild_rollups():
+    """Regenerate the SessionRollups table read by the dashboard queries"""
+    schema.initialize_database(DB_PATH)
+    conn = schema.get_db_connection(DB_PATH)
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        written = rollups.rebuild_rollups(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    print(f"Rebuilt {written} session rollups")
+    return True
+
+def verify_stats_counters(fix=False):
+    """Recount the /stats counters from scratch and report any drift, overwriting it with `fix`"""
+    schema.initialize_database(DB_PATH)
+    conn = schema.get_db_connection(DB_PATH)
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        drift = stats_counters.verify_counters(conn, fix=fix)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    for name, (stored, actual) in drift.items():
+        print(f"{name}: stored {stored}, recounted {actual} ({actual - stored:+d})")
+    if not drift:
+        print("All stats counters match a recount")
+        return True
+    if fix:
+        print(f"Fixed {len(drift)} drifted stats counter(s)")
+        return True
+    print(f"{len(drift)} stats counter(s) drifted, run verify --fix to overwrite them with the recount")
+    return False
+
+def check_query_plans(verbose=False):
+    """Fail if a dashboard query plan scans a large table that is not in the allow-list"""
+    failures = query_plans.check_query_plans(verbose=verbose)
+    for function, table, detail, sql in failures:
+        print(f"{function}: {detail} on {table}\n    {sql}")
+    if failures:
+        print(f"{len(failures)} query plan(s) scan a large table, add an index or an ALLOWED_SCANS entry")
+        return False
+    print("All query plans use indexes on the large tables")
+    return True
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='IO Usage Dashboard Backend')
-    parser.add_argument('action', choices=['run', 'init', 'scrape_disco_website', 'process_logs', 'process_file'], 
+    parser.add_argument('action', choices=['run', 'init', 'scrape_disco_website', 'process_logs', 'process_file',
+                                           'pack_histograms', 'rebuild_rollups', 'check_query_plans', 'verify'], 
                        help='Action to perform')
     parser.add_argument('--file', help='Path to log file for process_file action')
     parser.add_argument('--archive', action='store_true', help='Archive processed files')
+    parser.add_argument('--compress-archive', choices=sorted(log_parser.COMPRESSION_SUFFIXES),
+                        help='Compress plain log files when archiving them')
+    parser.add_argument('--commit-every', type=int, default=log_parser.DEFAULT_COMMIT_EVERY,
+                        help='Number of log snapshots to write per transaction when ingesting logs')
+    parser.add_argument('--reprocess', action='store_true',
+                        help='Re-parse snapshots that are already in the database instead of skipping them')
+    parser.add_argument('--bulk', action='store_true',
+                       help='Backfill mode for process_logs: stage rows without indexes and merge them at the end')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Print every checked statement for check_query_plans')
+    parser.add_argument('--fix', action='store_true',
+                        help='Overwrite drifted stats counters with the recounted values for verify')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes used to parse log files; large files are split into chunks')
     
     # In case no arguments provided, default to 'run'
     if len(sys.argv) == 1:
@@ -131,7 +261,8 @@ if __name__ == '__main__':
             print(f"Database not found at {DB_PATH}. Initializing...")
             init_database()
         archive_dir = ARCHIVE_LOGS_DIR if args.archive else None
-        process_logs(archive_dir=archive_dir)
+        process_logs(archive_dir=archive_dir, commit_every=args.commit_every, skip_existing=not args.reprocess,
+                     workers=args.workers, archive_compression=args.compress_archive, bulk=args.bulk)
     elif args.action == 'process_file':
         if not args.file:
             print("Error: --file argument is required for process_file action")
@@ -140,7 +271,18 @@ if __name__ == '__main__':
             print(f"Database not found at {DB_PATH}. Initializing...")
             init_database()
         archive_dir = ARCHIVE_LOGS_DIR if args.archive else None
-        process_specific_log(args.file, archive_dir)
+        process_specific_log(args.file, archive_dir, commit_every=args.commit_every, skip_existing=not args.reprocess,
+                             workers=args.workers, archive_compression=args.compress_archive)
+    elif args.action == 'pack_histograms':
+        pack_histograms()
+    elif args.action == 'rebuild_rollups':
+        rebuild_rollups()
+    elif args.action == 'check_query_plans':
+        if not check_query_plans(verbose=args.verbose):
+            sys.exit(1)
+    elif args.action == 'verify':
+        if not verify_stats_counters(fix=args.fix):
+            sys.exit(1)
     elif args.action == 'run':
         init_database()  # Always ensure schema is up-to-date
         
@@ -164,6 +306,12 @@ if __name__ == '__main__':
         scheduler.add_task("slurm_log_parser", parse_and_store_slurm_log, interval_minutes=10)
         print("Registered slurm_log_parser task (runs every 10 minutes)")
 
+        # Register and start the incremental IO log ingestion task, runs without new data are not logged
+        if LOG_FOLLOW_ENABLED:
+            scheduler.add_task("log_follower", follow_incoming_logs, interval_minutes=LOG_FOLLOW_INTERVAL_MINUTES,
+                               log_skipped=False)
+            print(f"Registered log_follower task (runs every {LOG_FOLLOW_INTERVAL_MINUTES} minutes)")
+
         # Register and start the disco thesis scraper task
         # scheduler.add_task("disco_thesis_scraper", run_disco_scraper, interval_minutes=7*24*60, initial_delay=DELAY)
         # print("Registered disco_thesis_scraper task (runs every 7 days)")
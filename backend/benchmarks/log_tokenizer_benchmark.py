@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark the rd_client log tokenizer against the previous regex-based line parsing.
+
+Writes a synthetic IO log of about 1M lines to a temporary file and times, for both paths,
+tokenizing every line and the full iter_log_snapshots parse of the file.
+
+Usage: python benchmarks/log_tokenizer_benchmark.py [--lines N] [--repeat N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Set up the parent directory in path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.parsers.log_parser import (
+    TIMESTAMP_PATTERN, SESSION_PATTERN, HISTOGRAM_PATTERN,
+    convert_to_bytes, parse_histogram_line, iter_log_snapshots
+)
+
+SIZES = ['0', '512', '1K', '2K', '4K', '8K', '16K', '32K', '64K', '128K', '256K', '512K',
+         '1M', '2M', '4M', '8M', '16M', '32M', '64M', '128M', '256M', '512M', '1G']
+
+def write_synthetic_log(file, line_count, seed=0):
+    """Write a log in the rd_client format with roughly `line_count` lines"""
+    rng = random.Random(seed)
+    unix_timestamp = 1735689600
+    written = 0
+    while written < line_count:
+        timestamp = datetime.fromtimestamp(unix_timestamp, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        file.write(f"Log: {timestamp} ({unix_timestamp})\n")
+        written += 1
+        for user in rng.sample(range(200), 20):
+            file.write(f"@rd_client(tikgpu{user % 10:02d},gpu)[user{user}(student/ethz)]: \n")
+            written += 1
+            for low, high in zip(SIZES, SIZES[1:]):
+                count = rng.randint(1, 1000000)
+                file.write(f"[{low}, {high}){count:>12} |{'@' * rng.randint(0, 52):<52}|\n")
+                written += 1
+        unix_timestamp += 600
+
+def tokenize_with_regexes(lines):
+    """The previous approach: try the three patterns in turn on every line"""
+    tokens = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if TIMESTAMP_PATTERN.match(line):
+            tokens += 1
+            continue
+        if SESSION_PATTERN.match(line):
+            tokens += 1
+            continue
+        match = HISTOGRAM_PATTERN.match(line)
+        if match:
+            size_min_str, size_max_str = match.group(1), match.group(2)
+            (convert_to_bytes(size_min_str), convert_to_bytes(size_max_str), f"[{size_min_str}, {size_max_str})")
+            int(match.group(3))
+            tokens += 1
+    return tokens
+
+def tokenize_by_first_character(lines):
+    """The tokenizer used by iter_log_snapshots: dispatch on the first character"""
+    tokens = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        first = line[0]
+        if first == '[':
+            if parse_histogram_line(line) is not None:
+                tokens += 1
+        elif first == 'L':
+            if TIMESTAMP_PATTERN.match(line):
+                tokens += 1
+        elif first == '@':
+            if SESSION_PATTERN.match(line):
+                tokens += 1
+    return tokens
+
+def parse_snapshots_with_regexes(lines):
+    """Full snapshot parse as done before the tokenizer, for the end-to-end comparison"""
+    snapshots = 0
+    in_session = False
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if TIMESTAMP_PATTERN.match(line):
+            snapshots += 1
+            in_session = False
+            continue
+        session_match = SESSION_PATTERN.match(line)
+        if session_match:
+            session_match.group(4).split('/')
+            counts = {}
+            in_session = True
+            continue
+        match = HISTOGRAM_PATTERN.match(line)
+        if match and in_session:
+            size_min_str, size_max_str = match.group(1), match.group(2)
+            key = (convert_to_bytes(size_min_str), convert_to_bytes(size_max_str), f"[{size_min_str}, {size_max_str})")
+            counts[key] = int(match.group(3))
+    return snapshots
+
+def parse_snapshots_with_tokenizer(lines):
+    return sum(1 for _ in iter_log_snapshots(lines))
+
+def time_over_file(log_path, function, repeat):
+    """Best wall time of `repeat` runs of function over the lines of the file"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        with open(log_path, 'r') as file:
+            start = time.perf_counter()
+            result = function(file)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the rd_client log tokenizer')
+    parser.add_argument('--lines', type=int, default=1000000, help='Approximate number of lines in the synthetic log')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (the best is reported)')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        log_path = os.path.join(directory, 'synthetic.log')
+        with open(log_path, 'w') as file:
+            write_synthetic_log(file, args.lines)
+        with open(log_path, 'r') as file:
+            line_count = sum(1 for _ in file)
+        print(f"Synthetic log: {line_count:,} lines, {os.path.getsize(log_path) / 1024 / 1024:.1f} MiB")
+        
+        comparisons = [
+            ("tokenize lines", tokenize_with_regexes, tokenize_by_first_character),
+            ("parse snapshots", parse_snapshots_with_regexes, parse_snapshots_with_tokenizer),
+        ]
+        for name, regex_function, tokenizer_function in comparisons:
+            regex_time, regex_result = time_over_file(log_path, regex_function, args.repeat)
+            tokenizer_time, tokenizer_result = time_over_file(log_path, tokenizer_function, args.repeat)
+            if regex_result != tokenizer_result:
+                print(f"{name}: results differ ({regex_result} vs {tokenizer_result})")
+                return 1
+            print(f"{name:<16} regex {regex_time:6.2f}s ({line_count / regex_time:>10,.0f} lines/s)  "
+                  f"tokenizer {tokenizer_time:6.2f}s ({line_count / tokenizer_time:>10,.0f} lines/s)  "
+                  f"speedup {regex_time / tokenizer_time:.1f}x")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -31,5 +31,37 @@ GPU_MAX_HOURS = 4.0
 
 SLURM_DIRECTORY = os.path.join(DATA_DIR, 'slurm.log')
 
+# Tail-follow ingestion of the incoming IO logs by `app.py run`, off by default: the trailing
+# snapshot of a file is only ingested once the file has not been modified for this many seconds
+LOG_FOLLOW_ENABLED = False
+LOG_FOLLOW_INTERVAL_MINUTES = 1
+LOG_FOLLOW_QUIET_SECONDS = 30
+
+# How IO histograms are stored: 'rows' keeps one IOOperations row per session and size range,
+# 'packed' keeps one SessionHistograms BLOB per session (convert with `app.py pack_histograms`)
+HISTOGRAM_STORAGE = 'rows'
+
+# SQLite connection profiles of schema.get_db_connection: 'read' for the API handlers and
+# 'write' for ingest and the periodic tasks. Connections are pooled across threads and the
+# database runs in WAL mode, so readers never wait for the writer. busy_timeout is in milliseconds,
+# cache_size in KiB and mmap_size in bytes.
+DB_CONNECTION_PROFILES = {
+    'read': {'query_only': True, 'busy_timeout': 5000, 'cache_size': 64 * 1024, 'mmap_size': 256 * 1024 * 1024},
+    'write': {'query_only': False, 'busy_timeout': 30000, 'cache_size': 64 * 1024, 'mmap_size': 256 * 1024 * 1024},
+}
+# Idle connections kept per database and profile, more are closed when they are returned
+DB_POOL_MAX_IDLE = 8
+
+# Memory budget of the in-process cache of API responses (see backend.api.response_cache), in bytes
+RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Streamed JSON and NDJSON responses (see backend.api.streaming) are handed to the server in
+# chunks of about this many characters
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Pages of /usage/historic of up to this many log entries are read through the coalesced
+# get_historic_usage, larger and unbounded requests are streamed straight from the cursor
+HISTORIC_COALESCED_PAGE_MAX = 1000
+
 # Feature flags
 NOTIFY_SUPERVISORS_ON_NON_ETHZ_STUDENT_EMAILS = False
@@ -0,0 +1,175 @@
+import sqlite3
+
+from backend.config import HISTOGRAM_STORAGE
+from backend.database.dimension_cache import DimensionCache
+from backend.database.histograms import pack_histograms
+from backend.database.rollups import rebuild_rollups
+from backend.database.snapshot_writer import SnapshotWriter
+from backend.database.stats_counters import add_to_counters
+
+# Tables whose secondary indexes are dropped during the merge and rebuilt afterwards
+BULK_TARGET_TABLES = ('LogEntries', 'UserSessions', 'IOOperations', 'SessionHistograms', 'SessionRollups')
+
+# Page cache used while bulk loading, in KiB (negative values are KiB for PRAGMA cache_size)
+BULK_CACHE_SIZE_KIB = 512 * 1024
+
+# Number of buffered operation rows after which the staging tables are written
+BULK_FLUSH_ROWS = 50000
+
+
+class BulkSnapshotWriter(SnapshotWriter):
+    """
+    Snapshot writer for large backfills.
+
+    Rows are appended to TEMP staging tables that have no indexes, with synchronous=OFF and a
+    large page cache. `finish()` then merges the staged rows into LogEntries, UserSessions and
+    IOOperations in a single transaction, using the same ON CONFLICT rules as SnapshotWriter,
+    and rebuilds the secondary indexes of those tables. With packed histogram storage the merged
+    IOOperations rows are packed into SessionHistograms in the same transaction. The
+    SessionRollups of the merged snapshots are rebuilt at the end of the merge.
+
+    The real tables are only written by `finish()`, so an interrupted run leaves them as they
+    were: the staging tables live in the connection's temp database and disappear with it, and
+    an interrupted merge is rolled back. Only new Users, Machines and IOSizeRanges rows can be
+    left behind, which the next run reuses.
+    """
+
+    def __init__(self, conn, cache: DimensionCache = None, histogram_storage: str = HISTOGRAM_STORAGE):
+        self._pragmas = {name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+                         for name in ('synchronous', 'cache_size')}
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(f"PRAGMA cache_size = {-BULK_CACHE_SIZE_KIB}")
+        conn.execute("PRAGMA temp_store = FILE")
+        conn.executescript('''
+        DROP TABLE IF EXISTS temp.BulkLogEntries;
+        DROP TABLE IF EXISTS temp.BulkUserSessions;
+        DROP TABLE IF EXISTS temp.BulkIOOperations;
+        CREATE TEMP TABLE BulkLogEntries (timestamp TEXT, unix_timestamp INTEGER);
+        CREATE TEMP TABLE BulkUserSessions (unix_timestamp INTEGER, user_id INTEGER, machine_id INTEGER);
+        CREATE TEMP TABLE BulkIOOperations (
+            unix_timestamp INTEGER, user_id INTEGER, machine_id INTEGER, range_id INTEGER, operation_count INTEGER
+        );
+        ''')
+        self._log_entry_rows = []
+        super().__init__(conn, cache, histogram_storage)
+
+    def _load_ingested_timestamps(self):
+        cursor = self.conn.execute(
+            "SELECT unix_timestamp FROM LogEntries UNION SELECT unix_timestamp FROM temp.BulkLogEntries"
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+    def add(self, snapshot):
+        """Buffer the rows of one parsed snapshot, writing the staging tables when the buffer is full"""
+        if len(self._operation_rows) >= BULK_FLUSH_ROWS:
+            self.flush()
+        self.ingested_timestamps.add(snapshot.unix_timestamp)
+        self._log_entry_rows.append((snapshot.timestamp, snapshot.unix_timestamp))
+        # Staged rows refer to their snapshot by unix timestamp, log IDs are assigned by the merge
+        self._buffer_rows(snapshot, snapshot.unix_timestamp)
+        return None
+
+    def flush(self):
+        """Append the buffered rows to the staging tables"""
+        if not self._log_entry_rows:
+            return
+        conn = self.conn
+        conn.executemany("INSERT INTO temp.BulkLogEntries VALUES (?, ?)", self._log_entry_rows)
+        conn.executemany("INSERT INTO temp.BulkUserSessions VALUES (?, ?, ?)", self._session_rows)
+        conn.executemany("INSERT INTO temp.BulkIOOperations VALUES (?, ?, ?, ?, ?)", self._operation_rows)
+
+        self.snapshots_written += len(self._log_entry_rows)
+        self.rows_written += len(self._log_entry_rows) + len(self._session_rows) + len(self._operation_rows)
+        self.discard()
+
+    def discard(self):
+        super().discard()
+        self._log_entry_rows = []
+
+    def _secondary_indexes(self):
+        """Return (name, sql) of the explicitly created indexes on the target tables"""
+        placeholders = ', '.join('?' * len(BULK_TARGET_TABLES))
+        cursor = self.conn.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+            f"AND tbl_name IN ({placeholders})",
+            BULK_TARGET_TABLES
+        )
+        return cursor.fetchall()
+
+    def finish(self):
+        """Merge the staged rows into the real tables in one transaction and rebuild their indexes"""
+        conn = self.conn
+        self.flush()
+        conn.commit()
+        # The merge is the only write to the real tables, so it runs with normal durability
+        conn.execute("PRAGMA synchronous = NORMAL")
+
+        indexes = self._secondary_indexes()
+        try:
+            conn.execute("BEGIN TRANSACTION")
+            for name, _ in indexes:
+                conn.execute(f'DROP INDEX "{name}"')
+
+            # Staging order is ingest order, so IDs are assigned exactly as in a sequential run.
+            # The WHERE true is needed for SQLite to parse ON CONFLICT after a SELECT.
+            cursor = conn.execute('''
+            INSERT INTO LogEntries (timestamp, unix_timestamp)
+            SELECT timestamp, unix_timestamp FROM temp.BulkLogEntries WHERE true ORDER BY rowid
+            ON CONFLICT (unix_timestamp) DO NOTHING
+            ''')
+            new_logs = cursor.rowcount
+            cursor = conn.execute('''
+            INSERT INTO UserSessions (log_id, user_id, machine_id)
+            SELECT l.log_id, s.user_id, s.machine_id
+            FROM temp.BulkUserSessions s
+            JOIN LogEntries l ON l.unix_timestamp = s.unix_timestamp
+            WHERE true
+            ORDER BY s.rowid
+            ON CONFLICT (log_id, user_id, machine_id) DO NOTHING
+            ''')
+            new_sessions = cursor.rowcount
+            # Rows of re-imported snapshots are updated in place, so new rows are counted by difference
+            previous_operations = conn.execute("SELECT COUNT(*) FROM IOOperations").fetchone()[0]
+            conn.execute('''
+            INSERT INTO IOOperations (session_id, range_id, operation_count)
+            SELECT us.session_id, o.range_id, o.operation_count
+            FROM temp.BulkIOOperations o
+            JOIN LogEntries l ON l.unix_timestamp = o.unix_timestamp
+            JOIN UserSessions us ON us.log_id = l.log_id AND us.user_id = o.user_id AND us.machine_id = o.machine_id
+            WHERE true
+            ORDER BY o.rowid
+            ON CONFLICT (session_id, range_id) DO UPDATE SET operation_count = excluded.operation_count
+            ''')
+            new_operations = conn.execute("SELECT COUNT(*) FROM IOOperations").fetchone()[0] - previous_operations
+            add_to_counters(conn, log_count=new_logs, session_count=new_sessions, operation_count=new_operations)
+            if self.histogram_storage == 'packed':
+                pack_histograms(conn)
+            rebuild_rollups(conn, "SELECT l.log_id FROM LogEntries l "
+                                  "JOIN temp.BulkLogEntries b ON b.unix_timestamp = l.unix_timestamp")
+
+            for _, sql in indexes:
+                conn.execute(sql)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            self.close()
+            raise
+
+        conn.execute("ANALYZE")
+        self.close()
+
+    def close(self):
+        """Drop the staging tables and restore the connection's pragmas"""
+        conn = self.conn
+        try:
+            conn.executescript('''
+            DROP TABLE IF EXISTS temp.BulkLogEntries;
+            DROP TABLE IF EXISTS temp.BulkUserSessions;
+            DROP TABLE IF EXISTS temp.BulkIOOperations;
+            ''')
+            for name, value in self._pragmas.items():
+                conn.execute(f"PRAGMA {name} = {value}")
+        except sqlite3.ProgrammingError:
+            # The connection was already closed
+            pass
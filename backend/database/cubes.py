@@ -0,0 +1,83 @@
+import sqlite3
+
+from backend.database.histograms import get_histogram_layout, sum_histograms
+from backend.database.stats_counters import add_to_counters, set_counters
+
+# Small aggregate tables over SessionRollups that are kept current as snapshots are ingested.
+# Each snapshot's rollups are added to the cubes when they are written and subtracted again
+# before they are replaced, so the cubes always equal an aggregation over SessionRollups.
+# Users without a role (NULL in Users) are stored with user_role = NO_ROLE, apart from users whose
+# role is the empty string. The role is read when a snapshot's rollups are added, so the cubes go
+# stale when Users.user_role is edited afterwards. Nothing in the application changes a role; after
+# an edit by hand the cubes only match again once rebuilt with `app.py rebuild_rollups`.
+#
+# UsagePatterns: total operations by hour of day, day of week, user role and machine type.
+# hour and weekday are the strftime('%H') / strftime('%w') strings of the snapshot timestamp.
+#
+# SizeDistribution: operations per IO size range by day, user role and machine type.
+#
+# The total_operations counter of /stats (backend.database.stats_counters) is the grand total of
+# the cubes and is kept current with them.
+
+# Roles are parsed from `username(role/affiliation)` and cannot contain ')', so no role equals this
+NO_ROLE = '(no role)'
+
+_ADD_PATTERNS_SQL = """
+INSERT INTO UsagePatterns (hour, weekday, user_role, machine_type, total_operations)
+SELECT
+    strftime('%H', l.timestamp),
+    strftime('%w', l.timestamp),
+    COALESCE(u.user_role, ?),
+    m.machine_type,
+    ? * SUM(sr.total_operations)
+FROM SessionRollups sr
+JOIN LogEntries l ON sr.log_id = l.log_id
+JOIN Users u ON sr.user_id = u.user_id
+JOIN Machines m ON sr.machine_id = m.machine_id
+WHERE {rollup_filter}
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (hour, weekday, user_role, machine_type) DO UPDATE SET
+    total_operations = total_operations + excluded.total_operations
+"""
+
+_SELECT_SIZE_HISTOGRAMS_SQL = """
+SELECT date(l.timestamp), COALESCE(u.user_role, ?), m.machine_type, sr.histogram
+FROM SessionRollups sr
+JOIN LogEntries l ON sr.log_id = l.log_id
+JOIN Users u ON sr.user_id = u.user_id
+JOIN Machines m ON sr.machine_id = m.machine_id
+WHERE {rollup_filter}
+"""
+
+_ADD_SIZE_DISTRIBUTION_SQL = """
+INSERT INTO SizeDistribution (day, range_id, user_role, machine_type, total_operations) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (day, range_id, user_role, machine_type) DO UPDATE SET
+    total_operations = total_operations + excluded.total_operations
+"""
+
+
+def add_to_cubes(conn: sqlite3.Connection, rollup_filter: str, params=(), sign: int = 1):
+    """
+    Add (sign=1) or subtract (sign=-1) the SessionRollups rows matching `rollup_filter`, a
+    condition on the alias `sr`, to or from the cubes. The caller owns the transaction.
+    """
+    conn.execute(_ADD_PATTERNS_SQL.format(rollup_filter=rollup_filter), (NO_ROLE, sign, *params))
+    cursor = conn.execute(f"SELECT SUM(sr.total_operations) FROM SessionRollups sr WHERE {rollup_filter}", params)
+    add_to_counters(conn, total_operations=sign * (cursor.fetchone()[0] or 0))
+
+    layout = get_histogram_layout(conn)
+    cursor = conn.execute(_SELECT_SIZE_HISTOGRAMS_SQL.format(rollup_filter=rollup_filter), (NO_ROLE, *params))
+    totals = sum_histograms(((tuple(row)[:-1], row[-1]) for row in cursor), len(layout))
+    conn.executemany(_ADD_SIZE_DISTRIBUTION_SQL, [
+        (day, layout[slot]['range_id'], user_role, machine_type, sign * int(counts[slot]))
+        for (day, user_role, machine_type), counts in totals.items()
+        for slot in counts.nonzero()[0]
+    ])
+
+
+def rebuild_cubes(conn: sqlite3.Connection):
+    """Regenerate all cubes from SessionRollups. The caller owns the transaction."""
+    conn.execute("DELETE FROM UsagePatterns")
+    conn.execute("DELETE FROM SizeDistribution")
+    set_counters(conn, total_operations=0)
+    add_to_cubes(conn, "true")
@@ -0,0 +1,23 @@
+import sqlite3
+from typing import Optional, Tuple
+
+# DataGeneration holds a single counter that every transaction changing the data served by the
+# dashboard increments: snapshot ingest, rollup rebuilds, histogram packing, the Slurm store and
+# the member sync. It lives in the database so that writes from other processes (the CLI, forked
+# ingest workers) are seen too. Cached API responses are keyed by it (see
+# backend.api.response_cache), so a bump invalidates them all. updated_at is the unix time of
+# the last bump and is sent as Last-Modified.
+
+
+def bump_generation(conn: sqlite3.Connection):
+    """Increment the data generation. The caller owns the transaction."""
+    conn.execute("""
+    UPDATE DataGeneration SET generation = generation + 1, updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+    WHERE id = 1
+    """)
+
+
+def read_generation(conn: sqlite3.Connection) -> Tuple[int, Optional[int]]:
+    """Return the current data generation and the unix time it was reached"""
+    row = conn.execute("SELECT generation, updated_at FROM DataGeneration WHERE id = 1").fetchone()
+    return (row[0], row[1]) if row else (0, None)
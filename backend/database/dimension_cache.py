@@ -0,0 +1,101 @@
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
+
+from backend.database.stats_counters import add_to_counters
+
+
+class DimensionCache:
+    """
+    In-memory map from dimension keys to IDs for Users, Machines and IOSizeRanges.
+
+    Loaded once per ingest run so that lookups never hit the database. Keys that are
+    not known yet are inserted in one executemany per table, after which the table is
+    re-read, so the dimension tables are only touched when something is actually new.
+    Inserted users and machines are added to the /stats counters.
+    """
+
+    def __init__(self):
+        self.users: Dict[str, int] = {}
+        self.machines: Dict[Tuple[str, str], int] = {}
+        self.io_size_ranges: Dict[Tuple[int, int], int] = {}
+        self.io_size_range_slots: Dict[int, int] = {}
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection) -> 'DimensionCache':
+        """Create a cache holding every user, machine and IO size range in the database"""
+        cache = cls()
+        cache.reload(conn)
+        return cache
+
+    def reload(self, conn: sqlite3.Connection):
+        """Re-read all dimension tables, e.g. after a rolled back transaction"""
+        self._load_users(conn)
+        self._load_machines(conn)
+        self._load_io_size_ranges(conn)
+
+    def _load_users(self, conn):
+        cursor = conn.execute("SELECT username, user_id FROM Users")
+        self.users = {row[0]: row[1] for row in cursor.fetchall()}
+
+    def _load_machines(self, conn):
+        cursor = conn.execute("SELECT machine_name, machine_type, machine_id FROM Machines")
+        self.machines = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+
+    def _load_io_size_ranges(self, conn):
+        cursor = conn.execute("SELECT min_bytes, max_bytes, range_id FROM IOSizeRanges")
+        self.io_size_ranges = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+        # Histogram slot of each range for the packed layout, see backend.database.histograms
+        self.io_size_range_slots = {range_id: slot for slot, range_id in enumerate(sorted(self.io_size_ranges.values()))}
+
+    def add_users(self, conn: sqlite3.Connection,
+                  users: Iterable[Tuple[str, Optional[str], Optional[str]]]) -> int:
+        """Insert the (username, user_role, user_affiliation) entries that are not cached yet"""
+        missing = {}
+        for username, user_role, user_affiliation in users:
+            if username not in self.users and username not in missing:
+                missing[username] = (username, user_role, user_affiliation)
+        if missing:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO Users (username, user_role, user_affiliation) VALUES (?, ?, ?)",
+                list(missing.values())
+            )
+            add_to_counters(conn, user_count=cursor.rowcount)
+            self._load_users(conn)
+        return len(missing)
+
+    def add_machines(self, conn: sqlite3.Connection, machines: Iterable[Tuple[str, str]]) -> int:
+        """Insert the (machine_name, machine_type) entries that are not cached yet"""
+        missing = dict.fromkeys(key for key in machines if key not in self.machines)
+        if missing:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO Machines (machine_name, machine_type) VALUES (?, ?)",
+                list(missing)
+            )
+            add_to_counters(conn, machine_count=cursor.rowcount)
+            self._load_machines(conn)
+        return len(missing)
+
+    def add_io_size_ranges(self, conn: sqlite3.Connection,
+                           io_size_ranges: Iterable[Tuple[int, int, str]]) -> int:
+        """Insert the (min_bytes, max_bytes, display_text) entries that are not cached yet"""
+        missing = {}
+        for min_bytes, max_bytes, display_text in io_size_ranges:
+            key = (min_bytes, max_bytes)
+            if key not in self.io_size_ranges and key not in missing:
+                missing[key] = (min_bytes, max_bytes, display_text)
+        if missing:
+            conn.executemany(
+                "INSERT OR IGNORE INTO IOSizeRanges (min_bytes, max_bytes, display_text) VALUES (?, ?, ?)",
+                list(missing.values())
+            )
+            self._load_io_size_ranges(conn)
+        return len(missing)
+
+    def user_id(self, username: str) -> int:
+        return self.users[username]
+
+    def machine_id(self, machine_name: str, machine_type: str) -> int:
+        return self.machines[(machine_name, machine_type)]
+
+    def io_size_range_id(self, min_bytes: int, max_bytes: int) -> int:
+        return self.io_size_ranges[(min_bytes, max_bytes)]
@@ -0,0 +1,155 @@
+import itertools
+import sqlite3
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+import numpy as np
+
+from backend.database.data_generation import bump_generation
+
+# Operation counts are stored as little-endian int64, one slot per IOSizeRanges row in range_id
+# order. Ranges are never deleted and new ones get higher IDs, so adding a range only appends a
+# slot: histograms written before that are shorter and read back zero-padded.
+HISTOGRAM_DTYPE = np.dtype('<i8')
+
+# Number of rows decoded at once by the aggregation helpers
+DECODE_BATCH_ROWS = 100000
+
+UPSERT_HISTOGRAM_SQL = """
+INSERT INTO SessionHistograms (session_id, total_operations, histogram, bucket_count) VALUES (?, ?, ?, ?)
+ON CONFLICT (session_id) DO UPDATE SET
+    total_operations = excluded.total_operations,
+    histogram = excluded.histogram,
+    bucket_count = excluded.bucket_count
+"""
+
+
+def get_histogram_layout(conn: sqlite3.Connection) -> List[dict]:
+    """Return the IOSizeRanges rows in histogram slot order"""
+    cursor = conn.execute("SELECT range_id, min_bytes, max_bytes, display_text FROM IOSizeRanges ORDER BY range_id")
+    return [
+        {'range_id': row[0], 'min_bytes': row[1], 'max_bytes': row[2], 'display_text': row[3]}
+        for row in cursor.fetchall()
+    ]
+
+
+def encode_histogram(counts) -> bytes:
+    """Encode a sequence of per-slot operation counts as a histogram BLOB"""
+    return np.asarray(counts, dtype=HISTOGRAM_DTYPE).tobytes()
+
+
+def decode_histograms(blobs: List[bytes], width: int) -> np.ndarray:
+    """Decode histogram BLOBs into an (n, width) array, zero-padding histograms with fewer slots"""
+    if all(len(blob) == width * HISTOGRAM_DTYPE.itemsize for blob in blobs):
+        return np.frombuffer(b''.join(blobs), dtype=HISTOGRAM_DTYPE).reshape(len(blobs), width)
+    histograms = np.zeros((len(blobs), width), dtype=HISTOGRAM_DTYPE)
+    for i, blob in enumerate(blobs):
+        counts = np.frombuffer(blob, dtype=HISTOGRAM_DTYPE)
+        histograms[i, :len(counts)] = counts
+    return histograms
+
+
+def sum_histograms(rows: Iterable[Tuple[Hashable, bytes]], width: int) -> Dict[Hashable, np.ndarray]:
+    """Sum the histograms of (key, histogram BLOB) rows per key, decoding them in batches"""
+    key_index = {}
+    totals = np.zeros((0, width), dtype=HISTOGRAM_DTYPE)
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, DECODE_BATCH_ROWS))
+        if not batch:
+            break
+        indices = np.fromiter((key_index.setdefault(key, len(key_index)) for key, _ in batch),
+                              dtype=np.intp, count=len(batch))
+        if len(key_index) > len(totals):
+            totals = np.vstack([totals, np.zeros((len(key_index) - len(totals), width), dtype=HISTOGRAM_DTYPE)])
+        np.add.at(totals, indices, decode_histograms([blob for _, blob in batch], width))
+    return dict(zip(key_index, totals))
+
+
+def merged_bucket_count(counts: np.ndarray, written_slots: Iterable[int], existing_count: int = 0) -> int:
+    """
+    Return the bucket_count of a packed histogram, the number of IOOperations rows it stands for.
+
+    `counts` is the histogram after `written_slots` were written over a histogram that stood for
+    `existing_count` rows. Every written slot is a row, zero counts included, like the per-range
+    upsert into IOOperations. A slot that was listed with a zero count before cannot be told
+    apart from one that was never listed, so a re-imported session is assumed to list at least
+    the ranges it listed before, which holds when the same log is read again.
+    """
+    listed = counts != 0
+    listed[list(written_slots)] = True
+    return max(int(np.count_nonzero(listed)), existing_count)
+
+
+def iter_operation_histograms(rows: Iterable[tuple], slots: Dict[int, int], width: int):
+    """
+    Build histograms from IOOperations rows.
+
+    `rows` are (key columns..., range_id, operation_count, existing histogram BLOB or None),
+    ordered by key. Yields (key tuple, counts, written slots) per key, with the operation counts
+    written over the existing histogram.
+    """
+    for key, group in itertools.groupby(rows, key=lambda row: tuple(row[:-3])):
+        group = list(group)
+        existing = group[0][-1]
+        if existing is not None:
+            counts = decode_histograms([existing], width)[0].copy()
+        else:
+            counts = np.zeros(width, dtype=HISTOGRAM_DTYPE)
+        written_slots = [slots[row[-3]] for row in group]
+        counts[written_slots] = [row[-2] for row in group]
+        yield key, counts, written_slots
+
+
+def write_in_batches(conn: sqlite3.Connection, sql: str, rows: Iterable[tuple]) -> int:
+    """executemany `sql` over `rows` in batches of DECODE_BATCH_ROWS and return the row count"""
+    written = 0
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, DECODE_BATCH_ROWS))
+        if not batch:
+            return written
+        conn.executemany(sql, batch)
+        written += len(batch)
+
+
+def pack_histograms(conn: sqlite3.Connection) -> int:
+    """
+    Move all IOOperations rows into SessionHistograms and return the number of sessions packed.
+
+    Counts are merged into packed histograms that already exist for the same session, and the
+    operation_count counter of /stats is moved from the rows to the bucket_count of the
+    histograms. The caller owns the transaction.
+    """
+    # Imported here, backend.database.stats_counters depends on this module
+    from backend.database.stats_counters import add_to_counters
+
+    layout = get_histogram_layout(conn)
+    slots = {size_range['range_id']: slot for slot, size_range in enumerate(layout)}
+
+    cursor = conn.execute("""
+    SELECT SUM(bucket_count) FROM SessionHistograms
+    WHERE session_id IN (SELECT session_id FROM IOOperations)
+    """)
+    merged_buckets = cursor.fetchone()[0] or 0
+    packed_buckets = 0
+
+    def packed_rows(cursor):
+        nonlocal packed_buckets
+        for (session_id, existing_buckets), counts, written_slots in iter_operation_histograms(cursor, slots,
+                                                                                                len(layout)):
+            bucket_count = merged_bucket_count(counts, written_slots, existing_buckets or 0)
+            packed_buckets += bucket_count
+            yield session_id, int(counts.sum()), encode_histogram(counts), bucket_count
+
+    cursor = conn.execute("""
+    SELECT io.session_id, sh.bucket_count, io.range_id, io.operation_count, sh.histogram
+    FROM IOOperations io
+    LEFT JOIN SessionHistograms sh ON sh.session_id = io.session_id
+    ORDER BY io.session_id
+    """)
+    packed = write_in_batches(conn, UPSERT_HISTOGRAM_SQL, packed_rows(cursor))
+
+    deleted_rows = conn.execute("DELETE FROM IOOperations").rowcount
+    add_to_counters(conn, operation_count=packed_buckets - merged_buckets - deleted_rows)
+    bump_generation(conn)
+    return packed
@@ -1,4 +1,4 @@
-import logging
+import itertools
 import os
 import sys
 from typing import Any, Union
@@ -8,47 +8,132 @@ from backend.config import GPU_MAX_HOURS
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
 from backend.database.schema import get_db_connection
+from backend.database.cubes import NO_ROLE
+from backend.database.histograms import get_histogram_layout, sum_histograms
+from backend.database.stats_counters import read_counters
+from backend.utils.downsample import downsample_columns, downsample_series, downsample_table
+from backend.utils.single_flight import single_flight
+
+# The heavy query functions are wrapped with single_flight, so that concurrent requests for the
+# same data, e.g. when many people open the dashboard at once, share one execution.
+
+# SQL expressions for the start of the time series bucket of a timestamp column, in the local
+# time the LogEntries timestamps are stored in. Weeks start on Monday.
+TIME_SERIES_BUCKETS = {
+    '10m': "strftime('%Y-%m-%d %H:', {column}) || printf('%02d', CAST(strftime('%M', {column}) AS INTEGER) / 10 * 10) || ':00'",
+    '1h': "strftime('%Y-%m-%d %H:00:00', {column})",
+    '1d': "strftime('%Y-%m-%d 00:00:00', {column})",
+    '1w': "datetime({column}, 'start of day', '-6 days', 'weekday 1')",
+}
+
+def _histogram_distribution(cursor, query, params=()):
+    """
+    Sum histogram BLOBs (SessionRollups or SessionHistograms) per group.
+
+    `query` selects the group key columns followed by the histogram BLOB. Returns a dict from
+    key tuple to the non-empty size ranges, ordered by min_bytes, with their total_operations.
+    """
+    layout = get_histogram_layout(cursor.connection)
+    cursor.execute(query, params)
+    totals = sum_histograms(((tuple(row)[:-1], row[-1]) for row in cursor), len(layout))
+    slots = sorted(range(len(layout)), key=lambda slot: layout[slot]['min_bytes'])
+    return {
+        key: [
+            {
+                'display_text': layout[slot]['display_text'],
+                'min_bytes': layout[slot]['min_bytes'],
+                'max_bytes': layout[slot]['max_bytes'],
+                'total_operations': int(counts[slot])
+            }
+            for slot in slots if counts[slot]
+        ]
+        for key, counts in totals.items()
+    }
+
+
+def _epoch_expression(bucket_expression, column='l.timestamp', unix_column='l.unix_timestamp'):
+    """
+    Return SQL for the unix time at which a time series bucket starts, for a query grouped by
+    `bucket_expression`. The stored timestamps are wall-clock times, so the bucket start is
+    shifted by the offset of the bucket's first snapshot between its timestamp and unix_timestamp.
+    """
+    return (f"MIN({unix_column}) - CAST(strftime('%s', MIN({column})) AS INTEGER) "
+            f"+ CAST(strftime('%s', {bucket_expression}) AS INTEGER)")
+
+
+def _fetch_columns(cursor) -> dict:
+    """Return the remaining rows of a cursor as {column name: list of values}, without a dict per row"""
+    names = [description[0] for description in cursor.description]
+    rows = cursor.fetchall()
+    columns = zip(*rows) if rows else [()] * len(names)
+    return {name: list(values) for name, values in zip(names, columns)}
+
+
+def _fetch_table(cursor, columnar: bool):
+    """Return the remaining rows of a cursor as a list of dicts, or as columns if `columnar`"""
+    if columnar:
+        return _fetch_columns(cursor)
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def _io_distribution_table(distribution, columnar: bool):
+    """Return the size ranges of _histogram_distribution as display_text / total_operations rows or columns"""
+    if columnar:
+        return {
+            'display_text': [size_range['display_text'] for size_range in distribution],
+            'total_operations': [size_range['total_operations'] for size_range in distribution],
+        }
+    return [
+        {'display_text': size_range['display_text'], 'total_operations': size_range['total_operations']}
+        for size_range in distribution
+    ]
+
+
+def _fetch_time_series(cursor, max_points, columnar: bool):
+    """Fetch a time series selected as timestamp, total_operations, ... and downsample it with LTTB"""
+    if columnar:
+        return downsample_table(_fetch_columns(cursor), max_points)
+    return downsample_series([dict(row) for row in cursor.fetchall()], max_points)
+
+
+def _time_series_window(from_time=None, to_time=None, bucket=None, column='l.timestamp'):
+    """
+    Return (bucket expression, conditions, params) for a time series over `column`.
+
+    `from_time` and `to_time` bound the timestamps (inclusive, any format accepted by SQLite's
+    datetime()), `bucket` is one of TIME_SERIES_BUCKETS or None for one point per snapshot.
+    """
+    if bucket is None:
+        expression = column
+    elif bucket in TIME_SERIES_BUCKETS:
+        expression = TIME_SERIES_BUCKETS[bucket].format(column=column)
+    else:
+        raise ValueError(f"Unknown bucket '{bucket}', expected one of {', '.join(TIME_SERIES_BUCKETS)}")
+    
+    conditions = []
+    params = []
+    if from_time is not None:
+        conditions.append(f"{column} >= datetime(?)")
+        params.append(from_time)
+    if to_time is not None:
+        conditions.append(f"{column} <= datetime(?)")
+        params.append(to_time)
+    return expression, conditions, params
+
 
 def get_database_stats(db_path: str):
     """Get overall database statistics"""
-    conn = get_db_connection(db_path)
+    conn = get_db_connection(db_path, profile='read')
     cursor = conn.cursor()
     
-    stats = {}
-    
-    # Count of log entries (for I/O data)
-    cursor.execute("SELECT COUNT(*) as count FROM LogEntries")
-    stats['log_count'] = cursor.fetchone()['count']
+    # Row counts and totals, maintained at ingest time (see backend.database.stats_counters)
+    stats = read_counters(conn)
     
-    # Count of users
-    cursor.execute("SELECT COUNT(*) as count FROM Users")
-    stats['user_count'] = cursor.fetchone()['count']
-    
-    # Count of machines
-    cursor.execute("SELECT COUNT(*) as count FROM Machines")
-    stats['machine_count'] = cursor.fetchone()['count']
-    
-    # Count of user sessions
-    cursor.execute("SELECT COUNT(*) as count FROM UserSessions")
-    stats['session_count'] = cursor.fetchone()['count']
-    
-    # Count of IO operations
-    cursor.execute("SELECT COUNT(*) as count FROM IOOperations")
-    stats['operation_count'] = cursor.fetchone()['count']
-    
-    # Total operations across all sessions
-    cursor.execute("SELECT SUM(operation_count) as total FROM IOOperations")
-    stats['total_operations'] = cursor.fetchone()['total'] or 0
-    
-    # Count of jobs
-    cursor.execute("SELECT COUNT(*) as count FROM Jobs")
-    stats['job_count'] = cursor.fetchone()['count']
-    
-    # Date range from LogEntries (for I/O data)
-    cursor.execute("SELECT MIN(timestamp) as min_date, MAX(timestamp) as max_date FROM LogEntries")
-    result = cursor.fetchone()
-    stats['min_date'] = result['min_date']
-    stats['max_date'] = result['max_date']
+    # Date range from LogEntries (for I/O data), one query each so both are index lookups
+    cursor.execute("SELECT MIN(timestamp) as min_date FROM LogEntries")
+    stats['min_date'] = cursor.fetchone()['min_date']
+    cursor.execute("SELECT MAX(timestamp) as max_date FROM LogEntries")
+    stats['max_date'] = cursor.fetchone()['max_date']
     
     # Latest job collection timestamp
     cursor.execute("SELECT MAX(created_at) as latest_job_collection FROM Jobs")
@@ -58,9 +143,10 @@ def get_database_stats(db_path: str):
     conn.close()
     return stats
 
-def get_all_users(db_path: str):
-    """Get list of all users with basic stats"""
-    conn = get_db_connection(db_path)
+@single_flight
+def get_all_users(db_path: str, columnar: bool = False):
+    """Get list of all users with basic stats, as columns if `columnar`"""
+    conn = get_db_connection(db_path, profile='read')
     cursor = conn.cursor()
     
     query = """
@@ -84,15 +170,16 @@ def get_all_users(db_path: str):
     """
     
     cursor.execute(query)
-    users = [dict(row) for row in cursor.fetchall()]
+    users = _fetch_table(cursor, columnar)
     
     conn.close()
     return users
 
 
-def get_all_machines(db_path: str):
-    """Get list of all machines with basic stats"""
-    conn = get_db_connection(db_path)
+@single_flight
+def get_all_machines(db_path: str, columnar: bool = False):
+    """Get list of all machines with basic stats, as columns if `columnar`"""
+    conn = get_db_connection(db_path, profile='read')
     cursor = conn.cursor()
     
     query = """
@@ -115,15 +202,25 @@ def get_all_machines(db_path: str):
     """
     
     cursor.execute(query)
-    machines = [dict(row) for row in cursor.fetchall()]
+    machines = _fetch_table(cursor, columnar)
     
     conn.close()
     return machines
 
 
-def get_user_usage(db_path: str, username: Union[str, None]=None, user_id=None):
-    """Get detailed usage statistics for a specific user"""
-    conn = get_db_connection(db_path)
+@single_flight
+def get_user_usage(db_path: str, username: Union[str, None]=None, user_id=None,
+                   from_time=None, to_time=None, bucket=None, max_points=None, columnar=False):
+    """
+    Get detailed usage statistics for a specific user.
+
+    The time series is limited to `from_time` .. `to_time`, aggregated per `bucket` and reduced
+    to `max_points` points, see _time_series_window and downsample_series. With `columnar`, the
+    lists are returned as columns and the time series timestamps as unix times.
+    """
+    bucket_expression, window_conditions, window_params = _time_series_window(from_time, to_time, bucket)
+    time_column = _epoch_expression(bucket_expression) if columnar else bucket_expression
+    conn = get_db_connection(db_path, profile='read')
     cursor = conn.cursor()
     
     if username is not None:
@@ -182,61 +279,56 @@ def get_user_usage(db_path: str, username: Union[str, None]=None, user_id=None):
     """
     
     cursor.execute(query, (param,))
-    user['machines'] = [dict(row) for row in cursor.fetchall()]
+    user['machines'] = _fetch_table(cursor, columnar)
     
     # Get user's IO patterns
     query = f"""
-    SELECT 
-        r.display_text, 
-        SUM(io.operation_count) as total_operations
-    FROM 
-        IOOperations io
-    JOIN 
-        UserSessions us ON io.session_id = us.session_id
-    JOIN 
-        Users u ON us.user_id = u.user_id
-    JOIN 
-        IOSizeRanges r ON io.range_id = r.range_id
+    SELECT sr.histogram
+    FROM SessionRollups sr
+    JOIN Users u ON sr.user_id = u.user_id
     {where_clause}
-    GROUP BY 
-        r.display_text
-    ORDER BY 
-        r.min_bytes
     """
-    
-    cursor.execute(query, (param,))
-    user['io_distribution'] = [dict(row) for row in cursor.fetchall()]
+    distribution = _histogram_distribution(cursor, query, (param,)).get((), [])
+    user['io_distribution'] = _io_distribution_table(distribution, columnar)
     
     # Get user's time series usage
     query = f"""
     SELECT 
-        l.timestamp, 
-        SUM(io.operation_count) as total_operations
+        {time_column} as timestamp, 
+        SUM(sr.total_operations) as total_operations
     FROM 
-        IOOperations io
+        SessionRollups sr
     JOIN 
-        UserSessions us ON io.session_id = us.session_id
+        Users u ON sr.user_id = u.user_id
     JOIN 
-        Users u ON us.user_id = u.user_id
-    JOIN 
-        LogEntries l ON us.log_id = l.log_id
-    {where_clause}
+        LogEntries l ON sr.log_id = l.log_id
+    {' AND '.join([where_clause] + window_conditions)}
     GROUP BY 
-        l.timestamp
+        {bucket_expression}
     ORDER BY 
-        l.timestamp
+        1
     """
     
-    cursor.execute(query, (param,))
-    user['time_series'] = [dict(row) for row in cursor.fetchall()]
+    cursor.execute(query, (param, *window_params))
+    user['time_series'] = _fetch_time_series(cursor, max_points, columnar)
     
     conn.close()
     return user
 
 
-def get_machine_usage(db_path: str, machine_name: Union[str, None]=None, machine_id=None):
-    """Get detailed usage statistics for a specific machine"""
-    conn = get_db_connection(db_path)
+@single_flight
+def get_machine_usage(db_path: str, machine_name: Union[str, None]=None, machine_id=None,
+                      from_time=None, to_time=None, bucket=None, max_points=None, columnar=False):
+    """
+    Get detailed usage statistics for a specific machine.
+
+    The time series is limited to `from_time` .. `to_time`, aggregated per `bucket` and reduced
+    to `max_points` points, see _time_series_window and downsample_series. With `columnar`, the
+    lists are returned as columns and the time series timestamps as unix times.
+    """
+    bucket_expression, window_conditions, window_params = _time_series_window(from_time, to_time, bucket)
+    time_column = _epoch_expression(bucket_expression) if columnar else bucket_expression
+    conn = get_db_connection(db_path, profile='read')
     cursor = conn.cursor()
     
     if machine_name is not None:
@@ -289,281 +381,270 @@ def get_machine_usage(db_path: str, machine_name: Union[str, None]=None, machine
     """
     
     cursor.execute(query, (param,))
-    machine['users'] = [dict(row) for row in cursor.fetchall()]
+    machine['users'] = _fetch_table(cursor, columnar)
     
     # Get machine's IO patterns
     query = f"""
-    SELECT 
-        r.display_text, 
-        SUM(io.operation_count) as total_operations
-    FROM 
-        IOOperations io
-    JOIN 
-        UserSessions us ON io.session_id = us.session_id
-    JOIN 
-        Machines m ON us.machine_id = m.machine_id
-    JOIN 
-        IOSizeRanges r ON io.range_id = r.range_id
+    SELECT sr.histogram
+    FROM SessionRollups sr
+    JOIN Machines m ON sr.machine_id = m.machine_id
     {where_clause}
-    GROUP BY 
-        r.display_text
-    ORDER BY 
-        r.min_bytes
     """
-    
-    cursor.execute(query, (param,))
-    machine['io_distribution'] = [dict(row) for row in cursor.fetchall()]
+    distribution = _histogram_distribution(cursor, query, (param,)).get((), [])
+    machine['io_distribution'] = _io_distribution_table(distribution, columnar)
     
     # Get machine's time series usage
     query = f"""
     SELECT 
-        l.timestamp, 
-        SUM(io.operation_count) as total_operations
+        {time_column} as timestamp, 
+        SUM(sr.total_operations) as total_operations
     FROM 
-        IOOperations io
+        SessionRollups sr
     JOIN 
-        UserSessions us ON io.session_id = us.session_id
+        Machines m ON sr.machine_id = m.machine_id
     JOIN 
-        Machines m ON us.machine_id = m.machine_id
-    JOIN 
-        LogEntries l ON us.log_id = l.log_id
-    {where_clause}
+        LogEntries l ON sr.log_id = l.log_id
+    {' AND '.join([where_clause] + window_conditions)}
     GROUP BY 
-        l.timestamp
+        {bucket_expression}
     ORDER BY 
-        l.timestamp
+        1
     """
     
-    cursor.execute(query, (param,))
-    machine['time_series'] = [dict(row) for row in cursor.fetchall()]
+    cursor.execute(query, (param, *window_params))
+    machine['time_series'] = _fetch_time_series(cursor, max_points, columnar)
     
     conn.close()
     return machine
 
-def get_time_usage(db_path: str):
-    """Get time-based usage statistics"""
-    conn = get_db_connection(db_path)
+@single_flight
+def get_time_usage(db_path: str, user_role: Union[str, None] = None, machine_type: Union[str, None] = None,
+                   from_time=None, to_time=None, bucket=None, max_points=None, columnar=False):
+    """
+    Get time-based usage statistics.
+
+    The time series is limited to `from_time` .. `to_time`, aggregated per `bucket` and reduced
+    to `max_points` points, see _time_series_window and downsample_series. Within a bucket,
+    active_users and active_machines count the distinct users and machines of all its snapshots.
+    The hourly and daily patterns come from the UsagePatterns cube and can be restricted to a
+    user role (NO_ROLE for users without one) and a machine type. With `columnar`, the series and
+    patterns are returned as columns and the time series timestamps as unix times.
+    """
+    bucket_expression, window_conditions, window_params = _time_series_window(from_time, to_time, bucket)
+    time_column = _epoch_expression(bucket_expression) if columnar else bucket_expression
+    window_where = f"WHERE {' AND '.join(window_conditions)}" if window_conditions else ""
+    conn = get_db_connection(db_path, profile='read')
     cursor = conn.cursor()
     
     # Get overall time series
-    query = """
+    query = f"""
     SELECT 
-        l.timestamp, 
-        SUM(io.operation_count) as total_operations,
-        COUNT(DISTINCT us.user_id) as active_users,
-        COUNT(DISTINCT us.machine_id) as active_machines
+        {time_column} as timestamp, 
+        SUM(sr.total_operations) as total_operations,
+        COUNT(DISTINCT sr.user_id) as active_users,
+        COUNT(DISTINCT sr.machine_id) as active_machines
     FROM 
-        IOOperations io
+        SessionRollups sr
     JOIN 
-        UserSessions us ON io.session_id = us.session_id
-    JOIN 
-        LogEntries l ON us.log_id = l.log_id
+        LogEntries l ON sr.log_id = l.log_id
+    {window_where}
     GROUP BY 
-        l.timestamp
+        {bucket_expression}
     ORDER BY 
-        l.timestamp
+        1
     """
     
-    cursor.execute(query)
+    cursor.execute(query, window_params)
     time_usage = {
-        'time_series': [dict(row) for row in cursor.fetchall()]
+        'time_series': _fetch_time_series(cursor, max_points, columnar)
     }
     
+    pattern_filters = []
+    pattern_params = []
+    if user_role is not None:
+        pattern_filters.append("user_role = ?")
+        pattern_params.append(user_role)
+    if machine_type is not None:
+        pattern_filters.append("machine_type = ?")
+        pattern_params.append(machine_type)
+    where_clause = f"WHERE {' AND '.join(pattern_filters)}" if pattern_filters else ""
+    
     # Get hourly patterns (hour of day)
-    query = """
+    query = f"""
     SELECT 
-        strftime('%H', timestamp) as hour,
-        SUM(io.operation_count) as total_operations
+        hour,
+        SUM(total_operations) as total_operations
     FROM 
-        IOOperations io
-    JOIN 
-        UserSessions us ON io.session_id = us.session_id
-    JOIN 
-        LogEntries l ON us.log_id = l.log_id
+        UsagePatterns
+    {where_clause}
     GROUP BY 
         hour
     ORDER BY 
         hour
     """
     
-    cursor.execute(query)
-    time_usage['hourly_pattern'] = [dict(row) for row in cursor.fetchall()]
+    cursor.execute(query, pattern_params)
+    time_usage['hourly_pattern'] = _fetch_table(cursor, columnar)
     
     # Get daily patterns (day of week)
-    query = """
+    query = f"""
     SELECT 
-        strftime('%w', timestamp) as day_of_week,
-        SUM(io.operation_count) as total_operations
+        weekday as day_of_week,
+        SUM(total_operations) as total_operations
     FROM 
-        IOOperations io
-    JOIN 
-        UserSessions us ON io.session_id = us.session_id
-    JOIN 
-        LogEntries l ON us.log_id = l.log_id
+        UsagePatterns
+    {where_clause}
     GROUP BY 
-        day_of_week
+        weekday
     ORDER BY 
-        day_of_week
+        weekday
     """
     
-    cursor.execute(query)
-    time_usage['daily_pattern'] = [dict(row) for row in cursor.fetchall()]
+    cursor.execute(query, pattern_params)
+    time_usage['daily_pattern'] = _fetch_table(cursor, columnar)
     
     conn.close()
     return time_usage
 
-def get_size_distribution(db_path: str):
-    """Get IO size distribution statistics"""
-    conn = get_db_connection(db_path)
+@single_flight
+def get_size_distribution(db_path: str, since: Union[str, None] = None, until: Union[str, None] = None):
+    """
+    Get IO size distribution statistics from the SizeDistribution cube, optionally limited to
+    the days from `since` to `until` (inclusive, any format accepted by SQLite's date())
+
+    Users without a role are counted in 'overall' and 'by_machine_type' but left out of 'by_role',
+    users whose role is the empty string are listed under ''.
+    """
+    conn = get_db_connection(db_path, profile='read')
     cursor = conn.cursor()
     
+    day_filters = []
+    params = []
+    if since is not None:
+        day_filters.append("c.day >= date(?)")
+        params.append(since)
+    if until is not None:
+        day_filters.append("c.day <= date(?)")
+        params.append(until)
+    
+    def where(*conditions):
+        conditions = day_filters + list(conditions)
+        return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
     # Get overall size distribution
-    query = """
+    query = f"""
     SELECT 
         r.display_text, 
         r.min_bytes,
         r.max_bytes,
-        SUM(io.operation_count) as total_operations
+        SUM(c.total_operations) as total_operations
     FROM 
-        IOOperations io
+        SizeDistribution c
     JOIN 
-        IOSizeRanges r ON io.range_id = r.range_id
+        IOSizeRanges r ON c.range_id = r.range_id
+    {where()}
     GROUP BY 
         r.range_id
+    HAVING 
+        total_operations != 0
     ORDER BY 
         r.min_bytes
     """
     
-    cursor.execute(query)
+    cursor.execute(query, params)
     size_dist: dict[Any, Any] = {
         'overall': [dict(row) for row in cursor.fetchall()]
     }
     
-    # Get size distribution by user role
-    query = """
-    SELECT 
-        u.user_role,
-        r.display_text, 
-        SUM(io.operation_count) as total_operations
-    FROM 
-        IOOperations io
-    JOIN 
-        UserSessions us ON io.session_id = us.session_id
-    JOIN 
-        Users u ON us.user_id = u.user_id
-    JOIN 
-        IOSizeRanges r ON io.range_id = r.range_id
-    WHERE
-        u.user_role IS NOT NULL
-    GROUP BY 
-        u.user_role, r.display_text
-    ORDER BY 
-        u.user_role, r.min_bytes
-    """
-    
-    cursor.execute(query)
-    roles_data = cursor.fetchall()
-    
-    # Process role-based data into a structured format
-    roles = {}
-    for row in roles_data:
-        role = row['user_role']
-        if role not in roles:
-            roles[role] = []
-        roles[role].append({
-            'display_text': row['display_text'],
-            'total_operations': row['total_operations']
-        })
-    
-    size_dist['by_role'] = roles
-    
-    # Get size distribution by machine type
-    query = """
-    SELECT 
-        m.machine_type,
-        r.display_text, 
-        SUM(io.operation_count) as total_operations
-    FROM 
-        IOOperations io
-    JOIN 
-        UserSessions us ON io.session_id = us.session_id
-    JOIN 
-        Machines m ON us.machine_id = m.machine_id
-    JOIN 
-        IOSizeRanges r ON io.range_id = r.range_id
-    GROUP BY 
-        m.machine_type, r.display_text
-    ORDER BY 
-        m.machine_type, r.min_bytes
-    """
-    
-    cursor.execute(query)
-    machines_data = cursor.fetchall()
-    
-    # Process machine-based data into a structured format
-    machine_types = {}
-    for row in machines_data:
-        mtype = row['machine_type']
-        if mtype not in machine_types:
-            machine_types[mtype] = []
-        machine_types[mtype].append({
-            'display_text': row['display_text'],
-            'total_operations': row['total_operations']
-        })
-    
-    size_dist['by_machine_type'] = machine_types
+    # Get size distribution by user role and by machine type
+    for column, key in (('user_role', 'by_role'), ('machine_type', 'by_machine_type')):
+        query = f"""
+        SELECT 
+            c.{column} as grp,
+            r.display_text, 
+            SUM(c.total_operations) as total_operations
+        FROM 
+            SizeDistribution c
+        JOIN 
+            IOSizeRanges r ON c.range_id = r.range_id
+        {where("c.user_role != ?") if column == 'user_role' else where()}
+        GROUP BY 
+            c.{column}, r.range_id
+        HAVING 
+            total_operations != 0
+        ORDER BY 
+            c.{column}, r.min_bytes
+        """
+        
+        cursor.execute(query, params + [NO_ROLE] if column == 'user_role' else params)
+        
+        # Process the rows into a structured format
+        groups = {}
+        for row in cursor.fetchall():
+            groups.setdefault(row['grp'], []).append({
+                'display_text': row['display_text'],
+                'total_operations': row['total_operations']
+            })
+        size_dist[key] = groups
     
     conn.close()
     return size_dist
 
 
-def get_time_stats_for_user(db_path, username):
-    """Get time-based usage statistics for a user with zeros filled in"""
-    conn = get_db_connection(db_path)
-    cursor = conn.cursor()
+@single_flight
+def get_time_stats_for_user(db_path, username, from_time=None, to_time=None, bucket=None, max_points=None,
+                            columnar=False):
+    """
+    Get time-based usage statistics for a user with zeros filled in.
 
-    # Get all timestamps
-    cursor.execute("SELECT DISTINCT timestamp FROM LogEntries ORDER BY timestamp")
-    all_timestamps = [row['timestamp'] for row in cursor.fetchall()]
+    Every snapshot in the window gets a point, the zero fill is a LEFT JOIN from LogEntries to
+    the user's rollups. The series is limited to `from_time` .. `to_time`, aggregated per
+    `bucket` and reduced to `max_points` points, see _time_series_window and downsample_series.
+    Returns the series as parallel 'timestamp' and 'total_operations' lists, with `columnar` the
+    timestamps are unix times like in the other time series.
+    """
+    bucket_expression, window_conditions, window_params = _time_series_window(from_time, to_time, bucket)
+    time_column = _epoch_expression(bucket_expression) if columnar else bucket_expression
+    window_where = f"WHERE {' AND '.join(window_conditions)}" if window_conditions else ""
+    conn = get_db_connection(db_path, profile='read')
+    cursor = conn.cursor()
 
-    # Get user data
-    query = """
+    query = f"""
     SELECT
-        l.timestamp,
-        SUM(io.operation_count) as total_operations
+        {time_column} as timestamp,
+        COALESCE(SUM(sr.total_operations), 0) as total_operations
     FROM
-        IOOperations io
-    JOIN
-        UserSessions us ON io.session_id = us.session_id
-    JOIN
-        Users u ON us.user_id = u.user_id
-    JOIN
-        LogEntries l ON us.log_id = l.log_id
-    WHERE
-        u.username = ?
+        LogEntries l
+    LEFT JOIN
+        SessionRollups sr ON sr.log_id = l.log_id
+        AND sr.user_id = (SELECT user_id FROM Users WHERE username = ?)
+    {window_where}
     GROUP BY
-        l.timestamp
+        {bucket_expression}
     ORDER BY
-        l.timestamp
+        1
     """
 
-    cursor.execute(query, (username,))
-    user_timestamps = {row['timestamp']: row['total_operations'] for row in cursor.fetchall()}
-
-    # Fill in missing timestamps with zeros
-    time_series = []
-    for timestamp in all_timestamps:
-        time_series.append({
-            'timestamp': timestamp,
-            'total_operations': user_timestamps.get(timestamp, 0)
-        })
-
+    cursor.execute(query, (username, *window_params))
+    if columnar:
+        series = _fetch_time_series(cursor, max_points, columnar)
+        conn.close()
+        return series
+    rows = cursor.fetchall()
     conn.close()
-    return time_series
 
+    timestamps, total_operations = downsample_columns(
+        [row['timestamp'] for row in rows], [row['total_operations'] for row in rows], max_points
+    )
+    return {
+        'timestamp': timestamps,
+        'total_operations': total_operations
+    }
+
+@single_flight
 def get_top_users_recent_logs(db_path, log_count=5, user_count=10):
     """Get top users by IO operations for the most recent logs"""
-    conn = get_db_connection(db_path)
+    conn = get_db_connection(db_path, profile='read')
     cursor = conn.cursor()
 
     query = """
@@ -577,20 +658,18 @@ def get_top_users_recent_logs(db_path, log_count=5, user_count=10):
         u.username,
         u.user_role,
         u.user_affiliation,
-        SUM(io.operation_count) as total_operations,
-        COUNT(DISTINCT us.session_id) as session_count,
+        SUM(sr.total_operations) as total_operations,
+        COUNT(*) as session_count,
         COUNT(DISTINCT m.machine_id) as machine_count,
         GROUP_CONCAT(DISTINCT m.machine_name) as machines
     FROM
-        IOOperations io
+        SessionRollups sr
     JOIN
-        UserSessions us ON io.session_id = us.session_id
+        Users u ON sr.user_id = u.user_id
     JOIN
-        Users u ON us.user_id = u.user_id
+        Machines m ON sr.machine_id = m.machine_id
     JOIN
-        Machines m ON us.machine_id = m.machine_id
-    JOIN
-        RecentLogs rl ON us.log_id = rl.log_id
+        RecentLogs rl ON sr.log_id = rl.log_id
     GROUP BY
         u.user_id
     ORDER BY
@@ -622,47 +701,113 @@ def get_top_users_recent_logs(db_path, log_count=5, user_count=10):
     }
 
 
-def get_historic_usage(db_path: str, top_n: int = 10):
-    """Get historic usage data with top N users for each log entry"""
-    conn = get_db_connection(db_path)
-    cursor = conn.cursor()
-    
-    # Get all log entries ordered by timestamp (descending order)
-    cursor.execute("SELECT log_id, timestamp FROM LogEntries ORDER BY timestamp DESC")
-    log_entries = [dict(row) for row in cursor.fetchall()]
+def iter_historic_usage(db_path: str, top_n: int = 10, before: Union[int, None] = None, limit: Union[int, None] = None,
+                        from_time: Union[str, None] = None, to_time: Union[str, None] = None):
+    """
+    Yield historic usage data with the top N users for each log entry, most recent first.
+    `top_n` must be at least 1.
+
+    Everything is computed by one query that ranks the users of each snapshot with ROW_NUMBER(),
+    snapshots without any usage are returned with an empty top_users list.
+    Pages are selected by keyset: `before` is the unix_timestamp of the last entry of the previous
+    page and `limit` the number of log entries per page. `from_time` and `to_time` bound the
+    timestamps (inclusive, any format accepted by SQLite's datetime()).
+    """
+    if top_n < 1:
+        raise ValueError("top_n must be at least 1")
+    conditions = []
+    params: list[Any] = []
+    if before is not None:
+        conditions.append("unix_timestamp < ?")
+        params.append(before)
+    if from_time is not None:
+        conditions.append("timestamp >= datetime(?)")
+        params.append(from_time)
+    if to_time is not None:
+        conditions.append("timestamp <= datetime(?)")
+        params.append(to_time)
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
     
-    # For each log entry, get the top N users by IO operations
-    for log_entry in log_entries:
-        query = """
+    query = f"""
+    WITH Logs AS (
+        SELECT log_id, timestamp, unix_timestamp
+        FROM LogEntries
+        {where_clause}
+        ORDER BY unix_timestamp DESC
+        LIMIT ?
+    ),
+    Ranked AS (
         SELECT 
-            u.username,
-            u.user_role,
-            u.user_affiliation,
-            SUM(io.operation_count) as total_operations,
-            COUNT(DISTINCT m.machine_id) as machine_count,
-            GROUP_CONCAT(DISTINCT m.machine_name) as machines
+            Logs.log_id,
+            Logs.timestamp,
+            Logs.unix_timestamp,
+            sr.user_id,
+            SUM(sr.total_operations) as total_operations,
+            COUNT(DISTINCT sr.machine_id) as machine_count,
+            GROUP_CONCAT(DISTINCT m.machine_name) as machines,
+            ROW_NUMBER() OVER (
+                PARTITION BY Logs.log_id ORDER BY SUM(sr.total_operations) DESC, sr.user_id
+            ) as user_rank
         FROM 
-            IOOperations io
-        JOIN 
-            UserSessions us ON io.session_id = us.session_id
-        JOIN 
-            Users u ON us.user_id = u.user_id
-        JOIN 
-            Machines m ON us.machine_id = m.machine_id
-        WHERE 
-            us.log_id = ?
+            Logs
+        LEFT JOIN 
+            SessionRollups sr ON sr.log_id = Logs.log_id
+        LEFT JOIN 
+            Machines m ON sr.machine_id = m.machine_id
         GROUP BY 
-            u.user_id
-        ORDER BY 
-            total_operations DESC
-        LIMIT ?
-        """
-        
-        cursor.execute(query, (log_entry['log_id'], top_n))
-        log_entry['top_users'] = [dict(row) for row in cursor.fetchall()]
+            Logs.log_id, sr.user_id
+    )
+    SELECT 
+        r.log_id,
+        r.timestamp,
+        r.unix_timestamp,
+        u.username,
+        u.user_role,
+        u.user_affiliation,
+        r.total_operations,
+        r.machine_count,
+        r.machines
+    FROM 
+        Ranked r
+    LEFT JOIN 
+        Users u ON r.user_id = u.user_id
+    WHERE 
+        r.user_rank <= ?
+    ORDER BY 
+        r.unix_timestamp DESC, r.user_rank
+    """
+    params.extend([limit if limit is not None else -1, top_n])
     
-    conn.close()
-    return log_entries
+    conn = get_db_connection(db_path, profile='read')
+    try:
+        cursor = conn.execute(query, params)
+        # Rows arrive grouped by log entry, so each entry is complete when the next one starts
+        for _, rows in itertools.groupby(cursor, key=lambda row: row['log_id']):
+            rows = list(rows)
+            yield {
+                'log_id': rows[0]['log_id'],
+                'timestamp': rows[0]['timestamp'],
+                'unix_timestamp': rows[0]['unix_timestamp'],
+                'top_users': [
+                    {
+                        'username': row['username'],
+                        'user_role': row['user_role'],
+                        'user_affiliation': row['user_affiliation'],
+                        'total_operations': row['total_operations'],
+                        'machine_count': row['machine_count'],
+                        'machines': row['machines']
+                    }
+                    for row in rows if row['username'] is not None
+                ]
+            }
+    finally:
+        conn.close()
+
+
+@single_flight
+def get_historic_usage(db_path: str, top_n: int = 10, **kwargs):
+    """Get historic usage data with top N users for each log entry, see iter_historic_usage"""
+    return list(iter_historic_usage(db_path, top_n, **kwargs))
 
 
 def parse_runtime_to_hours(runtime_str):
@@ -680,126 +825,115 @@ def parse_runtime_to_hours(runtime_str):
 
 MAX_DURATION = GPU_MAX_HOURS
 
-def get_historic_usage_per_user(db_path: str, username: Union[str, None] = None):
+def _job_gpu_hours(row) -> float:
     """
-    Get historic GPU usage per user, grouped by machine.
-    For completed jobs (with end_time), only count the last GPU_MAX_HOURS of runtime.
+    Return the GPU hours of a job row. For completed jobs (with end_time), only count the last
+    GPU_MAX_HOURS of runtime.
     """
     from datetime import datetime, timedelta
-    conn = get_db_connection(db_path)
-    cursor = conn.cursor()
-    try:
-        if username:
-            query = """
-            SELECT 
-                u.username,
-                m.machine_name,
-                j.gpus,
-                j.runtime,
-                j.end_time,
-                j.created_at
-            FROM Jobs j
-            JOIN Machines m ON j.machine_id = m.machine_id
-            JOIN Users u ON j.user_id = u.user_id
-            WHERE u.username = ?
-            """
-            cursor.execute(query, (username,))
-        else:
-            query = """
-            SELECT 
-                u.username,
-                m.machine_name,
-                j.gpus,
-                j.runtime,
-                j.end_time,
-                j.created_at
-            FROM Jobs j
-            JOIN Machines m ON j.machine_id = m.machine_id
-            JOIN Users u ON j.user_id = u.user_id
-            """
-            cursor.execute(query)
-        usage_by_user = {}
-        for row in cursor.fetchall():
-            user = row['username']
-            machine = row['machine_name']
-            gpus = row['gpus'] or 0
-            runtime = row['runtime'] or ''
-            end_time_str = row['end_time'] or ''
-            created_at_str = row['created_at'] or ''
-            capped_hours = 0.0
-            if ('Unknown' not in end_time_str) and (end_time_str != ''):
-                try:
-                    # Parse end_time and runtime
-                    end_time = datetime.fromisoformat(end_time_str)
-                    # Ensure end_time is timezone-aware (assume CET if naive)
-                    if end_time.tzinfo is None:
-                        import pytz
-                        cet_tz = pytz.timezone('Europe/Berlin')
-                        end_time = cet_tz.localize(end_time)
-                    # parse_runtime_to_hours returns float hours, but we want timedelta
-                    import re
-                    match = re.match(r"(?:(\d+)-)?(\d+):(\d+):(\d+)", runtime)
-                    if match:
-                        days, hours, minutes, seconds = match.groups(default="0")
-                        duration = timedelta(days=int(days), hours=int(hours), minutes=int(minutes), seconds=int(seconds))
-                        start_time = end_time - duration
-                        from datetime import datetime, timedelta
-                        import pytz
-                        cet_tz = pytz.timezone('Europe/Berlin')
-                        
-                        # Use the job's creation time instead of current time
-                        if created_at_str:
-                            try:
-                                created_at = datetime.fromisoformat(created_at_str)
-                                if created_at.tzinfo is None:
-                                    created_at = cet_tz.localize(created_at)
-                            except Exception:
-                                # Fallback to current time if parsing fails
-                                created_at = datetime.now(cet_tz)
-                        else:
-                            # Fallback to current time if no creation time
-                            created_at = datetime.now(cet_tz)
-                        min_start_time = created_at - timedelta(hours=GPU_MAX_HOURS)
-                        if start_time < min_start_time:
-                            start_time = min_start_time
-
-                        
-                        capped_duration = end_time - start_time
-                        capped_hours = capped_duration.total_seconds() / 3600.0
-                        capped_hours = max(0, capped_hours)
-                    else:
-                        capped_hours = 0.0
-                except Exception:
-                    capped_hours = 0.0
+    import re
+    import pytz
+    gpus = row['gpus'] or 0
+    runtime = row['runtime'] or ''
+    end_time_str = row['end_time'] or ''
+    created_at_str = row['created_at'] or ''
+    capped_hours = 0.0
+    if ('Unknown' not in end_time_str) and (end_time_str != ''):
+        try:
+            cet_tz = pytz.timezone('Europe/Berlin')
+            # Parse end_time and runtime
+            end_time = datetime.fromisoformat(end_time_str)
+            # Ensure end_time is timezone-aware (assume CET if naive)
+            if end_time.tzinfo is None:
+                end_time = cet_tz.localize(end_time)
+            # parse_runtime_to_hours returns float hours, but we want timedelta
+            match = re.match(r"(?:(\d+)-)?(\d+):(\d+):(\d+)", runtime)
+            if match:
+                days, hours, minutes, seconds = match.groups(default="0")
+                duration = timedelta(days=int(days), hours=int(hours), minutes=int(minutes), seconds=int(seconds))
+                start_time = end_time - duration
+
+                # Use the job's creation time instead of current time
+                if created_at_str:
+                    try:
+                        created_at = datetime.fromisoformat(created_at_str)
+                        if created_at.tzinfo is None:
+                            created_at = cet_tz.localize(created_at)
+                    except Exception:
+                        # Fallback to current time if parsing fails
+                        created_at = datetime.now(cet_tz)
+                else:
+                    # Fallback to current time if no creation time
+                    created_at = datetime.now(cet_tz)
+                min_start_time = created_at - timedelta(hours=GPU_MAX_HOURS)
+                if start_time < min_start_time:
+                    start_time = min_start_time
+
+                capped_duration = end_time - start_time
+                capped_hours = capped_duration.total_seconds() / 3600.0
+                capped_hours = max(0, capped_hours)
             else:
-                # If no end_time, fallback to old logic (use runtime capped at GPU_MAX_HOURS)
-                capped_hours = min(parse_runtime_to_hours(runtime), GPU_MAX_HOURS)
-            gpu_hours = gpus * capped_hours
-            if user not in usage_by_user:
-                usage_by_user[user] = {}
-            if machine not in usage_by_user[user]:
-                usage_by_user[user][machine] = {
-                    'total_gpus': 0,
-                    'job_count': 0,
-                    'total_gpu_hours': 0.0
-                }
-            usage_by_user[user][machine]['total_gpus'] += gpus
-            usage_by_user[user][machine]['job_count'] += 1
-            usage_by_user[user][machine]['total_gpu_hours'] += gpu_hours
-        # Normalize total_gpu_hours by GPU_MAX_HOURS
-        for user in usage_by_user:
-            for machine in usage_by_user[user]:
-                usage_by_user[user][machine]['total_gpu_hours'] /= GPU_MAX_HOURS
-        return usage_by_user
+                capped_hours = 0.0
+        except Exception:
+            capped_hours = 0.0
+    else:
+        # If no end_time, fallback to old logic (use runtime capped at GPU_MAX_HOURS)
+        capped_hours = min(parse_runtime_to_hours(runtime), GPU_MAX_HOURS)
+    return gpus * capped_hours
+
+
+def iter_historic_usage_per_user(db_path: str, username: Union[str, None] = None):
+    """
+    Yield (username, GPU usage by machine) for every user with jobs, or only for `username`.
+
+    The jobs are read in user_id order along the Jobs index and each user is yielded as soon as
+    their jobs are summed, so only one user's usage is held at a time.
+    """
+    where_clause = "WHERE u.username = ?" if username else ""
+    query = f"""
+    SELECT 
+        u.username,
+        m.machine_name,
+        j.gpus,
+        j.runtime,
+        j.end_time,
+        j.created_at
+    FROM Jobs j
+    JOIN Machines m ON j.machine_id = m.machine_id
+    JOIN Users u ON j.user_id = u.user_id
+    {where_clause}
+    ORDER BY j.user_id
+    """
+    conn = get_db_connection(db_path, profile='read')
+    try:
+        cursor = conn.execute(query, (username,) if username else ())
+        for user, rows in itertools.groupby(cursor, key=lambda row: row['username']):
+            usage = {}
+            for row in rows:
+                stats = usage.setdefault(row['machine_name'], {'total_gpus': 0, 'job_count': 0, 'total_gpu_hours': 0.0})
+                stats['total_gpus'] += row['gpus'] or 0
+                stats['job_count'] += 1
+                stats['total_gpu_hours'] += _job_gpu_hours(row)
+            # Normalize total_gpu_hours by GPU_MAX_HOURS
+            for stats in usage.values():
+                stats['total_gpu_hours'] /= GPU_MAX_HOURS
+            yield user, usage
+    finally:
+        conn.close()
+
+
+@single_flight
+def get_historic_usage_per_user(db_path: str, username: Union[str, None] = None):
+    """Get historic GPU usage per user, grouped by machine, see iter_historic_usage_per_user"""
+    try:
+        return dict(iter_historic_usage_per_user(db_path, username))
     except Exception as e:
         print(f"Error getting historic usage per user: {e}")
         return {}
-    finally:
-        conn.close()
 
 # def get_user_thesis_and_supervisors(db_path, username):
 #     """Return thesis info and supervisors for a given student username from Theses table where is_past is False."""
-#     conn = get_db_connection(db_path)
+#     conn = get_db_connection(db_path, profile='read')
 #     cursor = conn.cursor()
 #     cursor.execute('''
 #         SELECT thesis_title, semester, student_email, GROUP_CONCAT(DISTINCT supervisor_username) as supervisors
@@ -827,7 +961,7 @@ def get_historic_usage_per_user(db_path: str, username: Union[str, None] = None)
 
 # def get_all_theses_and_supervisors(db_path):
 #     """Return all users with their theses and supervisors from UserSupervisors table."""
-#     conn = get_db_connection(db_path)
+#     conn = get_db_connection(db_path, profile='read')
 #     cursor = conn.cursor()
 #     cursor.execute('''
 #         SELECT student_username, thesis_title, semester, student_email, GROUP_CONCAT(DISTINCT supervisor_username) as supervisors
@@ -850,15 +984,13 @@ def get_historic_usage_per_user(db_path: str, username: Union[str, None] = None)
 
 def get_running_jobs_with_timestamp(db_path: str):
     """Get all running jobs from the latest collection along with the collection timestamp."""
-    conn = get_db_connection(db_path)
+    conn = get_db_connection(db_path, profile='read')
     try:
         cursor = conn.cursor()
         
         # Get the latest collection timestamp
         cursor.execute("""
-            SELECT created_at FROM Jobs 
-            ORDER BY created_at DESC 
-            LIMIT 1
+            SELECT MAX(created_at) FROM Jobs
         """)
         result = cursor.fetchone()
         collection_timestamp = result[0] if result else None
@@ -0,0 +1,217 @@
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from flask import Flask
+
+from backend.database import queries, schema, thesis_queries
+from backend.database.rollups import rebuild_rollups
+
+# Query plan regression check, run with `app.py check_query_plans`.
+#
+# The read queries of queries.py, thesis_queries.py and the API routes are run against a small
+# scratch database while every statement is captured together with the function that ran it.
+# A statement fails the check if its EXPLAIN QUERY PLAN scans one of LARGE_TABLES, unless
+# (function, table) is in ALLOWED_SCANS.
+# No ANALYZE statistics exist in the scratch database, so the planner assumes large tables and
+# the plans only depend on the schema and its indexes.
+
+# Tables that grow with every snapshot or Slurm collection
+LARGE_TABLES = {
+    'LogEntries', 'UserSessions', 'IOOperations', 'SessionHistograms', 'SessionRollups', 'Jobs', 'PeriodicTaskLogs',
+}
+
+# Scans that are expected, with the reason: (function, table) -> reason
+ALLOWED_SCANS = {
+    ('queries.get_all_users', 'UserSessions'): "session counts of every user",
+    ('queries.get_all_machines', 'UserSessions'): "session counts of every machine",
+    ('queries.get_time_usage', 'LogEntries'): "whole history when no window is given",
+    ('queries.get_time_stats_for_user', 'LogEntries'): "whole history when no window is given, zero-filled",
+    ('queries.get_top_users_recent_logs', 'LogEntries'): "walks the timestamp index, stops after LIMIT rows",
+    ('queries.iter_historic_usage', 'LogEntries'): "walks the unix_timestamp index, stops after LIMIT rows",
+    ('queries.iter_historic_usage_per_user', 'Jobs'): "GPU hours of every job, walks the user_id index",
+    ('periodic_tasks.get_task_logs', 'PeriodicTaskLogs'): "walks the timestamp index, stops after LIMIT rows",
+    ('periodic_tasks.get_task_logs_count', 'PeriodicTaskLogs'): "counts every task log",
+}
+
+# Modules whose functions run the checked statements, by their name in the reports
+_SOURCE_MODULES = {
+    'backend.database.queries': 'queries',
+    'backend.database.thesis_queries': 'thesis_queries',
+    'backend.api.routes': 'routes',
+    'backend.email_notifications.email_notifications': 'email_notifications',
+    'backend.tasks.periodic_tasks': 'periodic_tasks',
+    'backend.parsers.slurm_parser': 'slurm_parser',
+}
+
+# Modules that read config.DB_PATH at import time and are pointed at the scratch database
+_DB_PATH_MODULES = ('backend.database.thesis_queries', 'backend.email_notifications.email_notifications',
+                    'backend.tasks.periodic_tasks')
+
+_SQL_KEYWORDS = {'WHERE', 'JOIN', 'LEFT', 'INNER', 'CROSS', 'ON', 'USING', 'GROUP', 'ORDER', 'LIMIT', 'HAVING',
+                 'UNION', 'WINDOW', 'AS', 'NATURAL'}
+_TABLE_REFERENCE = re.compile(r'\b(?:FROM|JOIN)\s+([A-Za-z_][\w.]*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?', re.IGNORECASE)
+
+USERNAME = 'planuser'
+MACHINE_NAME = 'planhost'
+
+
+def _seed(db_path: str):
+    """Create the schema with one row per table, enough for every query to run all its statements"""
+    schema.initialize_database(db_path)
+    conn = schema.get_db_connection(db_path)
+    conn.executescript(f'''
+    INSERT INTO LogEntries (log_id, timestamp, unix_timestamp) VALUES (1, '2025-01-01 10:00:00', 1735722000);
+    INSERT INTO Users (user_id, username, user_role) VALUES (1, '{USERNAME}', 'staff');
+    INSERT INTO Machines (machine_id, machine_name, machine_type) VALUES (1, '{MACHINE_NAME}', 'gpu');
+    INSERT OR IGNORE INTO IOSizeRanges (range_id, min_bytes, max_bytes, display_text) VALUES (1, 0, 4096, '0-4K');
+    INSERT INTO UserSessions (session_id, log_id, user_id, machine_id) VALUES (1, 1, 1, 1);
+    INSERT INTO IOOperations (session_id, range_id, operation_count) VALUES (1, 1, 5);
+    INSERT INTO Jobs (job_id, user_id, machine_id, cpus, memory, gpus, runtime, state, command, end_time, created_at)
+    VALUES (1, 1, 1, 4, 16000, 1, '1:00:00', 'RUNNING', 'python train.py', '', '2025-01-01 10:00:00');
+    INSERT INTO PeriodicTaskLogs (timestamp, task_name, status, message)
+    VALUES ('2025-01-01 10:00:00', 'email-gpu', 'success', 'Email notification sent to {USERNAME}');
+    INSERT INTO UserSupervisors (student_username, supervisor_username, thesis_title, semester)
+    VALUES ('{USERNAME}', 'supervisor', 'Thesis', 'FS25');
+    INSERT INTO Theses (title, semester) VALUES ('Thesis', 'FS25');
+    ''')
+    conn.execute("BEGIN TRANSACTION")
+    rebuild_rollups(conn)
+    conn.commit()
+    conn.close()
+
+
+def _calling_function() -> str:
+    """Return the innermost function of _SOURCE_MODULES on the stack as 'module.function'"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = _SOURCE_MODULES.get(frame.f_globals.get('__name__'))
+        if module is not None:
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return '?'
+
+
+def _query_cases(db_path: str):
+    """Yield (case, callable) for the query functions"""
+    yield 'get_database_stats', lambda: queries.get_database_stats(db_path)
+    yield 'get_all_users', lambda: queries.get_all_users(db_path)
+    yield 'get_all_machines', lambda: queries.get_all_machines(db_path)
+    yield 'get_user_usage', lambda: queries.get_user_usage(db_path, username=USERNAME)
+    yield 'get_user_usage', lambda: queries.get_user_usage(db_path, username=USERNAME, from_time='2025-01-01',
+                                                           to_time='2025-02-01', bucket='1d')
+    yield 'get_machine_usage', lambda: queries.get_machine_usage(db_path, machine_name=MACHINE_NAME)
+    yield 'get_machine_usage', lambda: queries.get_machine_usage(db_path, machine_name=MACHINE_NAME,
+                                                                 from_time='2025-01-01', bucket='1h')
+    yield 'get_time_usage', lambda: queries.get_time_usage(db_path)
+    yield 'get_time_usage', lambda: queries.get_time_usage(db_path, user_role='staff', machine_type='gpu',
+                                                           from_time='2025-01-01', to_time='2025-02-01')
+    yield 'get_size_distribution', lambda: queries.get_size_distribution(db_path, since='2025-01-01',
+                                                                         until='2025-02-01')
+    yield 'get_time_stats_for_user', lambda: queries.get_time_stats_for_user(db_path, USERNAME)
+    yield 'get_time_stats_for_user', lambda: queries.get_time_stats_for_user(db_path, USERNAME,
+                                                                             from_time='2025-01-01', bucket='1w')
+    yield 'get_top_users_recent_logs', lambda: queries.get_top_users_recent_logs(db_path)
+    yield 'get_historic_usage', lambda: queries.get_historic_usage(db_path, limit=50)
+    yield 'get_historic_usage', lambda: queries.get_historic_usage(db_path, before=1735722001, limit=50,
+                                                                   from_time='2025-01-01', to_time='2025-02-01')
+    yield 'get_historic_usage_per_user', lambda: queries.get_historic_usage_per_user(db_path, USERNAME)
+    yield 'get_historic_usage_per_user', lambda: queries.get_historic_usage_per_user(db_path)
+    yield 'get_running_jobs_with_timestamp', lambda: queries.get_running_jobs_with_timestamp(db_path)
+    yield 'get_user_thesis_details', lambda: thesis_queries.get_user_thesis_details(USERNAME)
+
+
+def _route_cases(db_path: str):
+    """Yield (case, callable) for every GET route of the API blueprint"""
+    from backend.api.routes import api
+
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    app.config['DB_PATH'] = db_path
+    client = app.test_client()
+    values = {'username': USERNAME, 'machine_name': MACHINE_NAME}
+    query_strings = {
+        '/api/email-notifications/counts': '?start_time=2025-01-01&end_time=2025-02-01',
+    }
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if 'GET' not in rule.methods or rule.endpoint == 'static':
+            continue
+        url = rule.rule
+        for argument in rule.arguments:
+            url = url.replace(f'<{argument}>', values.get(argument, 'x'))
+        url += query_strings.get(rule.rule, '')
+        yield rule.rule, lambda url=url: client.get(url)
+
+
+@contextmanager
+def _scratch_db_path(db_path: str):
+    """Point the modules that read config.DB_PATH at the scratch database"""
+    import importlib
+    modules = [importlib.import_module(name) for name in _DB_PATH_MODULES]
+    saved = [module.DB_PATH for module in modules]
+    for module in modules:
+        module.DB_PATH = db_path
+    try:
+        yield
+    finally:
+        for module, path in zip(modules, saved):
+            module.DB_PATH = path
+
+
+def _scanned_tables(conn: sqlite3.Connection, sql: str):
+    """Return the tables of LARGE_TABLES that the plan of `sql` scans, with the plan lines"""
+    names = {}
+    for table, alias in _TABLE_REFERENCE.findall(sql):
+        table = table.split('.')[-1]
+        names[table] = table
+        if alias and alias.upper() not in _SQL_KEYWORDS:
+            names[alias] = table
+    scans = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        detail = row[3]
+        match = re.match(r'SCAN (\w+)', detail)
+        if match and names.get(match.group(1)) in LARGE_TABLES:
+            scans.append((names[match.group(1)], detail))
+    return scans
+
+
+def check_query_plans(verbose: bool = False) -> list:
+    """
+    Run the check and return the failures as (function, table, plan line, SQL) tuples.
+    With `verbose`, every captured statement and the large tables it scans are printed.
+    """
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'query_plans.db')
+        _seed(db_path)
+        statements = []
+        with _scratch_db_path(db_path):
+            cases = list(_query_cases(db_path)) + list(_route_cases(db_path))
+            for case, run in cases:
+                schema.set_statement_trace(lambda sql: statements.append((_calling_function(), sql)))
+                try:
+                    run()
+                except Exception as e:
+                    print(f"{case}: failed to run ({e}), its statements are checked as far as they ran")
+                finally:
+                    schema.set_statement_trace(None)
+
+        conn = sqlite3.connect(db_path)
+        checked = set()
+        for function, sql in statements:
+            if (function, sql) in checked or not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                continue
+            checked.add((function, sql))
+            scans = _scanned_tables(conn, sql)
+            if verbose:
+                print(f"{function}: {' '.join(sql.split())[:120]}")
+                for table, detail in scans:
+                    print(f"    {detail}")
+            for table, detail in scans:
+                if (function, table) not in ALLOWED_SCANS:
+                    failures.append((function, table, detail, ' '.join(sql.split())))
+        conn.close()
+    return failures
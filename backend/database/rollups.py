@@ -0,0 +1,68 @@
+import sqlite3
+from typing import Optional
+
+from backend.database.cubes import add_to_cubes, rebuild_cubes
+from backend.database.data_generation import bump_generation
+from backend.database.histograms import (
+    encode_histogram, get_histogram_layout, iter_operation_histograms, write_in_batches
+)
+
+# SessionRollups holds one row per (log_id, user_id, machine_id) with the total operation count
+# and the per-range totals as a histogram BLOB (see backend.database.histograms), whichever
+# histogram storage is configured. The dashboard queries read it instead of the raw tables.
+
+UPSERT_ROLLUP_SQL = """
+INSERT INTO SessionRollups (log_id, user_id, machine_id, total_operations, histogram) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (log_id, user_id, machine_id) DO UPDATE SET
+    total_operations = excluded.total_operations,
+    histogram = excluded.histogram
+"""
+
+
+def rebuild_rollups(conn: sqlite3.Connection, log_ids_sql: Optional[str] = None) -> int:
+    """
+    Regenerate SessionRollups from UserSessions and the IOOperations / SessionHistograms tables,
+    and update the cubes built on top of them.
+
+    `log_ids_sql` is a SELECT of the log_ids to rebuild, all snapshots are rebuilt if it is None.
+    Returns the number of rollup rows written. The caller owns the transaction.
+    """
+    log_filter = f"WHERE us.log_id IN ({log_ids_sql})" if log_ids_sql else ""
+    if log_ids_sql:
+        add_to_cubes(conn, f"sr.log_id IN ({log_ids_sql})", sign=-1)
+    conn.execute(f"DELETE FROM SessionRollups WHERE log_id IN ({log_ids_sql})" if log_ids_sql
+                 else "DELETE FROM SessionRollups")
+
+    # Packed histograms are copied as they are
+    cursor = conn.execute(f"""
+    INSERT INTO SessionRollups (log_id, user_id, machine_id, total_operations, histogram)
+    SELECT us.log_id, us.user_id, us.machine_id, sh.total_operations, sh.histogram
+    FROM SessionHistograms sh
+    JOIN UserSessions us ON us.session_id = sh.session_id
+    {log_filter}
+    """)
+    written = cursor.rowcount
+
+    # IOOperations rows are packed on the way, on top of a packed histogram of the same session
+    layout = get_histogram_layout(conn)
+    slots = {size_range['range_id']: slot for slot, size_range in enumerate(layout)}
+    cursor = conn.execute(f"""
+    SELECT us.log_id, us.user_id, us.machine_id, io.range_id, io.operation_count, sr.histogram
+    FROM IOOperations io
+    JOIN UserSessions us ON us.session_id = io.session_id
+    LEFT JOIN SessionRollups sr
+        ON sr.log_id = us.log_id AND sr.user_id = us.user_id AND sr.machine_id = us.machine_id
+    {log_filter}
+    ORDER BY io.session_id
+    """)
+    written += write_in_batches(conn, UPSERT_ROLLUP_SQL, (
+        (*key, int(counts.sum()), encode_histogram(counts))
+        for key, counts, _ in iter_operation_histograms(cursor, slots, len(layout))
+    ))
+
+    if log_ids_sql:
+        add_to_cubes(conn, f"sr.log_id IN ({log_ids_sql})")
+    else:
+        rebuild_cubes(conn)
+    bump_generation(conn)
+    return written
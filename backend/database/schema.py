@@ -1,11 +1,175 @@
+import os
 import sqlite3
+import threading
+import time
 
-def get_db_connection(db_path: str):
-    """Create a database connection to the SQLite database"""
-    conn = sqlite3.connect(db_path)
+import numpy as np
+
+from backend.config import DB_CONNECTION_PROFILES, DB_POOL_MAX_IDLE
+from backend.database.histograms import decode_histograms, get_histogram_layout, write_in_batches
+from backend.database.cubes import NO_ROLE, rebuild_cubes
+from backend.database.rollups import rebuild_rollups
+from backend.database.stats_counters import initialize_counters
+
+# Idle connections by (database path, profile), shared by all threads. Flask's threaded server
+# runs every request in a new thread, so a per-thread pool would never be reused.
+_pool = {}
+_pool_lock = threading.Lock()
+_pool_stats = {profile: {'hits': 0, 'misses': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+               for profile in DB_CONNECTION_PROFILES}
+_pool_stats_lock = threading.Lock()
+# Called with every statement run on the connections handed out, see set_statement_trace
+_statement_trace = None
+
+# Secondary indexes kept by initialize_database: name -> (table, indexed columns). An index whose
+# definition differs from its entry is recreated, indexes not listed here are left alone.
+INDEXES = {
+    # Time series windows filter and group on the local timestamp
+    'idx_log_entries_timestamp': ('LogEntries', 'timestamp'),
+    'idx_user_sessions_user': ('UserSessions', 'user_id, log_id'),
+    'idx_user_sessions_machine': ('UserSessions', 'machine_id, log_id'),
+    'idx_session_rollups_user': ('SessionRollups', 'user_id, log_id'),
+    'idx_session_rollups_machine': ('SessionRollups', 'machine_id, log_id'),
+    'idx_jobs_created_at': ('Jobs', 'created_at'),
+    'idx_jobs_user_state': ('Jobs', 'user_id, state'),
+    'idx_periodic_task_logs_timestamp': ('PeriodicTaskLogs', 'timestamp'),
+    'idx_periodic_task_logs_task': ('PeriodicTaskLogs', 'task_name, timestamp'),
+    'idx_user_supervisors_supervisor': ('UserSupervisors', 'supervisor_username'),
+}
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    Connection handed out by get_db_connection. close() rolls back any open transaction and
+    returns the connection to the pool instead of closing it. A connection is used by one thread
+    at a time, but may be handed to another thread once it is back in the pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool_key = None
+        self.pooled = False
+
+    def close(self):
+        if not self.pooled and not _release(self):
+            super().close()
+
+
+def _reset_pool():
+    """Forget the connections inherited from the parent process in a forked child"""
+    global _pool, _pool_lock
+    _pool = {}
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_pool)
+
+
+def _connect(db_path: str, profile: str) -> PooledConnection:
+    settings = DB_CONNECTION_PROFILES[profile]
+    conn = sqlite3.connect(db_path, timeout=settings['busy_timeout'] / 1000, factory=PooledConnection,
+                           check_same_thread=False)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+    except sqlite3.OperationalError:
+        # Another connection holds a lock, WAL is persistent so a later connection switches
+        pass
+    conn.execute(f"PRAGMA cache_size = {-int(settings['cache_size'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(settings['mmap_size'])}")
+    if settings['query_only']:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def _release(conn: PooledConnection) -> bool:
+    """Put a connection back into the pool, returns False if it should be closed instead"""
+    if conn.pool_key is None:
+        return False
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = sqlite3.Row
+        conn.set_trace_callback(None)
+    except sqlite3.Error:
+        return False
+    with _pool_lock:
+        idle = _pool.setdefault(conn.pool_key, [])
+        if len(idle) >= DB_POOL_MAX_IDLE:
+            return False
+        conn.pooled = True
+        idle.append(conn)
+    return True
+
+
+def get_db_connection(db_path: str, profile: str = 'write'):
+    """
+    Get a connection to the SQLite database from the pool.
+
+    `profile` is one of config.DB_CONNECTION_PROFILES: 'read' connections are query-only and are
+    meant for the API handlers, 'write' connections for ingest and the periodic tasks. Closing
+    the connection returns it to the pool.
+    """
+    if profile not in DB_CONNECTION_PROFILES:
+        raise ValueError(f"Unknown connection profile '{profile}', expected one of {', '.join(DB_CONNECTION_PROFILES)}")
+    start = time.perf_counter()
+    # In-memory databases are private to their connection and cannot be pooled
+    key = (os.path.abspath(db_path), profile) if db_path != ':memory:' else None
+    conn = None
+    if key is not None:
+        with _pool_lock:
+            idle = _pool.get(key)
+            if idle:
+                conn = idle.pop()
+                conn.pooled = False
+    hit = conn is not None
+    if not hit:
+        conn = _connect(db_path, profile)
+        conn.pool_key = key
     conn.row_factory = sqlite3.Row  # This enables column access by name
+    conn.set_trace_callback(_statement_trace)
+    wait = time.perf_counter() - start
+
+    with _pool_stats_lock:
+        stats = _pool_stats[profile]
+        stats['hits' if hit else 'misses'] += 1
+        stats['wait_seconds'] += wait
+        stats['max_wait_seconds'] = max(stats['max_wait_seconds'], wait)
     return conn
 
+
+def get_pool_stats() -> dict:
+    """Return the hit rate and the time spent getting connections per connection profile"""
+    report = {}
+    with _pool_stats_lock:
+        for profile, stats in _pool_stats.items():
+            requests = stats['hits'] + stats['misses']
+            report[profile] = {
+                'hits': stats['hits'],
+                'misses': stats['misses'],
+                'hit_rate': stats['hits'] / requests if requests else None,
+                'avg_wait_ms': 1000 * stats['wait_seconds'] / requests if requests else None,
+                'max_wait_ms': 1000 * stats['max_wait_seconds'],
+            }
+    return report
+
+
+def set_statement_trace(callback):
+    """Pass the SQL of every statement run on connections from get_db_connection to `callback`, None to stop"""
+    global _statement_trace
+    _statement_trace = callback
+
+
+def apply_indexes(conn: sqlite3.Connection):
+    """Create the INDEXES that are missing and recreate those whose definition changed"""
+    existing = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall())
+    for name, (table, columns) in INDEXES.items():
+        sql = f"CREATE INDEX {name} ON {table} ({columns})"
+        if name in existing and ' '.join(existing[name].split()) == sql:
+            continue
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.execute(sql)
+
+
 def initialize_database(db_path: str):
     """Create database schema if it doesn't exist"""
     conn = get_db_connection(db_path)
@@ -80,6 +244,60 @@ def initialize_database(db_path: str):
     )
     ''')
     
+    # Packed alternative to IOOperations (HISTOGRAM_STORAGE = 'packed'): one array of operation
+    # counts per session, with one slot per IOSizeRanges row in range_id order. bucket_count is
+    # the number of IOOperations rows the histogram replaces, for the /stats operation_count.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS SessionHistograms (
+        session_id INTEGER PRIMARY KEY,
+        total_operations INTEGER NOT NULL,
+        histogram BLOB NOT NULL,
+        bucket_count INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (session_id) REFERENCES UserSessions (session_id)
+    )
+    ''')
+    
+    # Per snapshot, user and machine totals maintained at ingest time, read by the dashboard
+    # queries (see backend.database.rollups)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS SessionRollups (
+        log_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        machine_id INTEGER NOT NULL,
+        total_operations INTEGER NOT NULL,
+        histogram BLOB NOT NULL,
+        PRIMARY KEY (log_id, user_id, machine_id),
+        FOREIGN KEY (log_id) REFERENCES LogEntries (log_id),
+        FOREIGN KEY (user_id) REFERENCES Users (user_id),
+        FOREIGN KEY (machine_id) REFERENCES Machines (machine_id)
+    ) WITHOUT ROWID
+    ''')
+    
+    # Hour-of-day / day-of-week usage by role and machine type (see backend.database.cubes)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS UsagePatterns (
+        hour TEXT NOT NULL,
+        weekday TEXT NOT NULL,
+        user_role TEXT NOT NULL,
+        machine_type TEXT NOT NULL,
+        total_operations INTEGER NOT NULL,
+        PRIMARY KEY (hour, weekday, user_role, machine_type)
+    ) WITHOUT ROWID
+    ''')
+    
+    # Operations per IO size range by day, role and machine type (see backend.database.cubes)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS SizeDistribution (
+        day TEXT NOT NULL,
+        range_id INTEGER NOT NULL,
+        user_role TEXT NOT NULL,
+        machine_type TEXT NOT NULL,
+        total_operations INTEGER NOT NULL,
+        PRIMARY KEY (day, range_id, user_role, machine_type),
+        FOREIGN KEY (range_id) REFERENCES IOSizeRanges (range_id)
+    ) WITHOUT ROWID
+    ''')
+    
     # Define Jobs table structure
     jobs_table_structure = '''
     (
@@ -124,6 +342,51 @@ def initialize_database(db_path: str):
     )
     ''')
     
+    # Thesis list, filled by the DISCO scraper (see backend.tasks.disco_scraper_task)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS Theses (
+        thesis_id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        icon_url TEXT,
+        semester TEXT,
+        is_past INTEGER DEFAULT 0,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    # Row counts and totals served by /stats (see backend.database.stats_counters)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS StatsCounters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    
+    # Counter bumped by every write to the dashboard data (see backend.database.data_generation)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS DataGeneration (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        generation INTEGER NOT NULL,
+        updated_at INTEGER
+    )
+    ''')
+    cursor.execute('''
+    INSERT OR IGNORE INTO DataGeneration (id, generation, updated_at)
+    VALUES (1, 0, CAST(strftime('%s', 'now') AS INTEGER))
+    ''')
+    
+    # Byte offsets up to which incoming log files have been ingested by the follow task
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS LogIngestCheckpoints (
+        path TEXT PRIMARY KEY,
+        inode INTEGER NOT NULL,
+        byte_offset INTEGER NOT NULL,
+        last_unix_timestamp INTEGER,
+        updated_at DATETIME
+    )
+    ''')
+    
     # Add end_time column to Jobs table if it does not exist
     try:
         cursor.execute("PRAGMA table_info(Jobs)")
@@ -152,6 +415,43 @@ def initialize_database(db_path: str):
     except Exception as e:
         print(f"Error checking/fixing Jobs table schema: {e}")
     
+    # Packed histograms written before bucket_count existed cannot tell a range logged with a zero
+    # count from one that was not logged, so they are counted by their non-zero buckets
+    cursor.execute("PRAGMA table_info(SessionHistograms)")
+    if 'bucket_count' not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE SessionHistograms ADD COLUMN bucket_count INTEGER NOT NULL DEFAULT 0")
+        width = len(get_histogram_layout(conn))
+        cursor.execute("SELECT session_id, histogram FROM SessionHistograms")
+        write_in_batches(conn, "UPDATE SessionHistograms SET bucket_count = ? WHERE session_id = ?", (
+            (int(np.count_nonzero(decode_histograms([row[1]], width))), row[0]) for row in cursor
+        ))
+        # The counter was kept with the earlier definition, initialize_counters recounts it
+        cursor.execute("DELETE FROM StatsCounters WHERE name = 'operation_count'")
+        print("Added bucket_count column to SessionHistograms table.")
+    
+    apply_indexes(conn)
+    
+    # Databases from before SessionRollups existed have sessions but no rollups, and every
+    # dashboard query reads the rollups and the cubes built on them
+    has_sessions = conn.execute("SELECT EXISTS (SELECT 1 FROM UserSessions)").fetchone()[0]
+    has_rollups = conn.execute("SELECT EXISTS (SELECT 1 FROM SessionRollups)").fetchone()[0]
+    if has_sessions and not has_rollups:
+        written = rebuild_rollups(conn)
+        print(f"Built {written} SessionRollups rows and the usage cubes from the existing sessions.")
+    
+    # Cubes built before NO_ROLE stored users without a role under the empty role
+    stale_cubes = conn.execute("""
+    SELECT NOT EXISTS (SELECT 1 FROM UsagePatterns WHERE user_role = ?)
+        AND EXISTS (SELECT 1 FROM Users u WHERE u.user_role IS NULL
+                    AND EXISTS (SELECT 1 FROM SessionRollups sr WHERE sr.user_id = u.user_id))
+    """, (NO_ROLE,)).fetchone()[0]
+    if stale_cubes:
+        rebuild_cubes(conn)
+        print("Rebuilt the usage cubes to keep users without a role apart.")
+    
+    if initialize_counters(conn):
+        print("Counted the /stats counters from scratch.")
+    
     conn.commit()
     conn.close()
 
@@ -0,0 +1,245 @@
+import time
+
+from backend.config import HISTOGRAM_STORAGE
+from backend.database.cubes import add_to_cubes
+from backend.database.data_generation import bump_generation
+from backend.database.dimension_cache import DimensionCache
+from backend.database.histograms import (
+    UPSERT_HISTOGRAM_SQL, decode_histograms, encode_histogram, merged_bucket_count
+)
+from backend.database.rollups import UPSERT_ROLLUP_SQL
+from backend.database.stats_counters import add_to_counters
+
+
+class SnapshotWriter:
+    """
+    Buffered writer for parsed log snapshots.
+
+    Rows for UserSessions and IOOperations are collected per snapshot and written with one
+    executemany each, using INSERT ... ON CONFLICT so that re-importing rows that already
+    exist is a plain upsert instead of an IntegrityError per row.
+
+    `ingested_timestamps` holds the unix timestamps of all stored snapshots. It is loaded
+    with one query when the writer is created and kept current as snapshots are added, so
+    the parser can skip blocks that are already in the database.
+
+    With histogram_storage='packed' the IO counts of each session are written as one
+    SessionHistograms row instead of one IOOperations row per size range. Either way the
+    snapshot's SessionRollups rows are written in the same transaction, and added to the
+    aggregate cubes in backend.database.cubes. The /stats counters of the written rows are
+    updated and the data generation is bumped in the same transaction (see
+    backend.database.stats_counters and backend.database.data_generation).
+    """
+
+    def __init__(self, conn, cache: DimensionCache = None, histogram_storage: str = HISTOGRAM_STORAGE):
+        self.conn = conn
+        self.histogram_storage = histogram_storage
+        self.cache = cache if cache is not None else DimensionCache.load(conn)
+        self.ingested_timestamps = self._load_ingested_timestamps()
+        self.snapshots_written = 0
+        self.rows_written = 0
+        self.started_at = time.monotonic()
+        self._session_rows = []
+        self._operation_rows = []
+        self._log_id = None
+        self._log_is_new = False
+
+    def _load_ingested_timestamps(self):
+        cursor = self.conn.execute("SELECT unix_timestamp FROM LogEntries")
+        return {row[0] for row in cursor.fetchall()}
+
+    def reload(self):
+        """Re-read the cached dimension IDs and stored timestamps, e.g. after a rollback"""
+        self.cache.reload(self.conn)
+        self.ingested_timestamps.clear()
+        self.ingested_timestamps.update(self._load_ingested_timestamps())
+
+    def add(self, snapshot):
+        """Buffer the rows of one parsed snapshot, flushing the previous one first"""
+        self.flush()
+        self._log_id, self._log_is_new = self._store_log_entry(snapshot)
+        self.ingested_timestamps.add(snapshot.unix_timestamp)
+        self._buffer_rows(snapshot, self._log_id)
+        return self._log_id
+
+    def _store_log_entry(self, snapshot):
+        """
+        Get or create the LogEntries row of a snapshot and return the key its sessions refer to,
+        and whether the row was created
+        """
+        cursor = self.conn.execute("SELECT log_id FROM LogEntries WHERE unix_timestamp = ?", (snapshot.unix_timestamp,))
+        result = cursor.fetchone()
+        if result:
+            return result[0], False
+        cursor = self.conn.execute(
+            "INSERT INTO LogEntries (timestamp, unix_timestamp) VALUES (?, ?)",
+            (snapshot.timestamp, snapshot.unix_timestamp)
+        )
+        return cursor.lastrowid, True
+
+    def _buffer_rows(self, snapshot, snapshot_key):
+        """Resolve the dimension IDs of a snapshot's sessions and buffer their rows"""
+        conn = self.conn
+        cache = self.cache
+        sessions = snapshot.sessions.values()
+
+        # Insert any new dimension keys in bulk
+        cache.add_users(conn, ((s.username, s.user_role, s.user_affiliation) for s in sessions))
+        cache.add_machines(conn, ((s.machine_name, s.machine_type) for s in sessions))
+        cache.add_io_size_ranges(conn, (size_range for s in sessions for size_range in s.counts))
+
+        for session in sessions:
+            user_id = cache.user_id(session.username)
+            machine_id = cache.machine_id(session.machine_name, session.machine_type)
+            self._session_rows.append((snapshot_key, user_id, machine_id))
+            for (min_bytes, max_bytes, _), count in session.counts.items():
+                range_id = cache.io_size_range_id(min_bytes, max_bytes)
+                self._operation_rows.append((snapshot_key, user_id, machine_id, range_id, count))
+
+    def flush(self):
+        """Write the buffered rows of the current snapshot"""
+        if self._log_id is None:
+            return
+        conn = self.conn
+        # Operation rows already stored for a snapshot that is imported again
+        previous_operations = 0 if self._log_is_new else self._count_operations()
+
+        cursor = conn.executemany(
+            """
+            INSERT INTO UserSessions (log_id, user_id, machine_id) VALUES (?, ?, ?)
+            ON CONFLICT (log_id, user_id, machine_id) DO NOTHING
+            """,
+            self._session_rows
+        )
+        new_sessions = cursor.rowcount
+
+        # Map the snapshot's sessions back to their IDs
+        cursor = conn.execute(
+            "SELECT user_id, machine_id, session_id FROM UserSessions WHERE log_id = ?",
+            (self._log_id,)
+        )
+        session_ids = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+
+        histograms, replaces_rollups = self._session_histograms()
+        if self.histogram_storage == 'packed':
+            operation_rows = self._packed_histogram_rows(session_ids, histograms)
+            conn.executemany(UPSERT_HISTOGRAM_SQL, operation_rows)
+            written_operations = sum(row[3] for row in operation_rows)
+        else:
+            operation_rows = [
+                (session_ids[(user_id, machine_id)], range_id, count)
+                for _, user_id, machine_id, range_id, count in self._operation_rows
+            ]
+            conn.executemany(
+                """
+                INSERT INTO IOOperations (session_id, range_id, operation_count) VALUES (?, ?, ?)
+                ON CONFLICT (session_id, range_id) DO UPDATE SET operation_count = excluded.operation_count
+                """,
+                operation_rows
+            )
+            written_operations = len(operation_rows)
+        if self._log_is_new:
+            new_operations = written_operations
+        else:
+            new_operations = self._count_operations() - previous_operations
+
+        if replaces_rollups:
+            add_to_cubes(conn, "sr.log_id = ?", (self._log_id,), sign=-1)
+        conn.executemany(UPSERT_ROLLUP_SQL, [
+            (self._log_id, user_id, machine_id, total, histogram)
+            for (user_id, machine_id), (total, histogram) in histograms.items()
+        ])
+        add_to_cubes(conn, "sr.log_id = ?", (self._log_id,))
+        add_to_counters(conn, log_count=int(self._log_is_new), session_count=new_sessions,
+                        operation_count=new_operations)
+        bump_generation(conn)
+
+        self.snapshots_written += 1
+        self.rows_written += 1 + len(self._session_rows) + len(operation_rows) + len(histograms)
+        self._session_rows = []
+        self._operation_rows = []
+        self._log_id = None
+
+    def _count_operations(self) -> int:
+        """Count the stored operation rows of the buffered snapshot, as the operation_count counter does"""
+        cursor = self.conn.execute(
+            """
+            SELECT
+                (SELECT COUNT(*) FROM IOOperations
+                 WHERE session_id IN (SELECT session_id FROM UserSessions WHERE log_id = ?)),
+                (SELECT SUM(bucket_count) FROM SessionHistograms
+                 WHERE session_id IN (SELECT session_id FROM UserSessions WHERE log_id = ?))
+            """,
+            (self._log_id, self._log_id)
+        )
+        rows, buckets = cursor.fetchone()
+        return rows + (buckets or 0)
+
+    def _packed_histogram_rows(self, session_ids, histograms):
+        """Build the SessionHistograms rows of the buffered snapshot from its session histograms"""
+        slots = self.cache.io_size_range_slots
+        written_slots = {}
+        for _, user_id, machine_id, range_id, _ in self._operation_rows:
+            written_slots.setdefault((user_id, machine_id), []).append(slots[range_id])
+        existing_buckets = {}
+        if not self._log_is_new:
+            cursor = self.conn.execute(
+                """
+                SELECT us.user_id, us.machine_id, sh.bucket_count
+                FROM SessionHistograms sh
+                JOIN UserSessions us ON us.session_id = sh.session_id
+                WHERE us.log_id = ?
+                """,
+                (self._log_id,)
+            )
+            existing_buckets = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+
+        rows = []
+        for key, (total, histogram) in histograms.items():
+            counts = decode_histograms([histogram], len(slots))[0]
+            bucket_count = merged_bucket_count(counts, written_slots[key], existing_buckets.get(key, 0))
+            rows.append((session_ids[key], total, histogram, bucket_count))
+        return rows
+
+    def _session_histograms(self):
+        """
+        Build the (total_operations, histogram BLOB) of each (user_id, machine_id) in the buffered
+        snapshot. Counts are written over the snapshot's existing rollup, matching the per-range
+        upsert into IOOperations when a snapshot is imported again. Also returns whether the
+        snapshot already had rollups.
+        """
+        slots = self.cache.io_size_range_slots
+        width = len(slots)
+        cursor = self.conn.execute(
+            "SELECT user_id, machine_id, histogram FROM SessionRollups WHERE log_id = ?", (self._log_id,)
+        )
+        existing = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+
+        histograms = {}
+        for _, user_id, machine_id, range_id, count in self._operation_rows:
+            key = (user_id, machine_id)
+            if key not in histograms:
+                if key in existing:
+                    histograms[key] = decode_histograms([existing[key]], width)[0].tolist()
+                else:
+                    histograms[key] = [0] * width
+            histograms[key][slots[range_id]] = count
+        return {
+            key: (sum(counts), encode_histogram(counts)) for key, counts in histograms.items()
+        }, bool(existing)
+
+    def discard(self):
+        """Drop the buffered rows, e.g. after the transaction was rolled back"""
+        self._session_rows = []
+        self._operation_rows = []
+        self._log_id = None
+        self._log_is_new = False
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.rows_written / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.snapshots_written} snapshots, {self.rows_written} rows "
+                f"({self.rows_per_second:,.0f} rows/s)")
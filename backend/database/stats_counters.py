@@ -0,0 +1,87 @@
+import sqlite3
+from typing import Dict
+
+from backend.database.data_generation import bump_generation
+
+# StatsCounters holds the row counts and totals served by /stats, one row per counter. The ingest
+# and Slurm store paths add their deltas in the same transaction as the rows they count, so
+# reading the stats is a single lookup instead of a count over every large table.
+# operation_count is the number of IOOperations rows plus the bucket_count of the packed
+# SessionHistograms, which is what COUNT(*) FROM IOOperations was before packing.
+# `app.py verify` recounts everything from scratch and reports any drift.
+
+COUNTER_NAMES = (
+    'log_count', 'user_count', 'machine_count', 'session_count', 'operation_count', 'total_operations', 'job_count',
+)
+
+_ADD_COUNTER_SQL = """
+INSERT INTO StatsCounters (name, value) VALUES (?, ?)
+ON CONFLICT (name) DO UPDATE SET value = value + excluded.value
+"""
+
+_SET_COUNTER_SQL = """
+INSERT INTO StatsCounters (name, value) VALUES (?, ?)
+ON CONFLICT (name) DO UPDATE SET value = excluded.value
+"""
+
+
+def add_to_counters(conn: sqlite3.Connection, **deltas: int):
+    """Add deltas to the counters, e.g. add_to_counters(conn, log_count=1). The caller owns the transaction."""
+    conn.executemany(_ADD_COUNTER_SQL, [(name, int(delta)) for name, delta in deltas.items() if delta])
+
+
+def set_counters(conn: sqlite3.Connection, **values: int):
+    """Overwrite the given counters. The caller owns the transaction."""
+    conn.executemany(_SET_COUNTER_SQL, [(name, int(value)) for name, value in values.items()])
+
+
+def read_counters(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Return all counters, missing ones as 0"""
+    counters = dict.fromkeys(COUNTER_NAMES, 0)
+    cursor = conn.execute("SELECT name, value FROM StatsCounters")
+    counters.update((row[0], row[1]) for row in cursor.fetchall())
+    return counters
+
+
+def count_from_scratch(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Compute every counter from the tables they count. This scans all large tables."""
+    def scalar(sql):
+        return conn.execute(sql).fetchone()[0] or 0
+
+    return {
+        'log_count': scalar("SELECT COUNT(*) FROM LogEntries"),
+        'user_count': scalar("SELECT COUNT(*) FROM Users"),
+        'machine_count': scalar("SELECT COUNT(*) FROM Machines"),
+        'session_count': scalar("SELECT COUNT(*) FROM UserSessions"),
+        'operation_count': (scalar("SELECT COUNT(*) FROM IOOperations")
+                            + scalar("SELECT SUM(bucket_count) FROM SessionHistograms")),
+        'total_operations': scalar("SELECT SUM(total_operations) FROM SessionRollups"),
+        'job_count': scalar("SELECT COUNT(*) FROM Jobs"),
+    }
+
+
+def initialize_counters(conn: sqlite3.Connection) -> bool:
+    """
+    Fill in the counters from scratch if any of them is missing, e.g. for a database created
+    before the table existed. Returns whether they were recounted. The caller owns the transaction.
+    """
+    present = conn.execute("SELECT COUNT(*) FROM StatsCounters").fetchone()[0]
+    if present >= len(COUNTER_NAMES):
+        return False
+    set_counters(conn, **count_from_scratch(conn))
+    return True
+
+
+def verify_counters(conn: sqlite3.Connection, fix: bool = False) -> Dict[str, tuple]:
+    """
+    Recount every counter and return the ones that drifted as {name: (stored, actual)}.
+    With `fix`, the drifted counters are overwritten with the recounted values. The caller owns
+    the transaction.
+    """
+    stored = read_counters(conn)
+    actual = count_from_scratch(conn)
+    drift = {name: (stored[name], actual[name]) for name in COUNTER_NAMES if stored[name] != actual[name]}
+    if fix and drift:
+        set_counters(conn, **{name: actual_value for name, (_, actual_value) in drift.items()})
+        bump_generation(conn)
+    return drift
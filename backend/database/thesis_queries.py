@@ -12,7 +12,7 @@ def get_user_thesis_details(username: str) -> list[dict]:
     Returns:
         List[Dict]: List of thesis details including supervisors, thesis info, etc.
     """
-    conn = get_db_connection(DB_PATH)
+    conn = get_db_connection(DB_PATH, profile='read')
     cursor = conn.cursor()
     
     try:
@@ -488,14 +488,14 @@ def store_email_notification(user: str, email_type: str, context: str, cc_emails
 
 def get_email_notifications(limit: int = 20, offset: int = 0) -> list:
     """Get recent email notifications from task logs with pagination."""
-    conn = get_db_connection(DB_PATH)
+    conn = get_db_connection(DB_PATH, profile='read')
     try:
         cursor = conn.cursor()
         
         cursor.execute("""
             SELECT timestamp, task_name, status, message, details
             FROM PeriodicTaskLogs 
-            WHERE task_name LIKE 'email-%'
+            WHERE task_name GLOB 'email-*'
             ORDER BY timestamp DESC 
             LIMIT ? OFFSET ?
         """, (limit, offset))
@@ -520,14 +520,14 @@ def get_email_notifications(limit: int = 20, offset: int = 0) -> list:
 
 def get_email_notifications_count() -> int:
     """Get total count of email notifications."""
-    conn = get_db_connection(DB_PATH)
+    conn = get_db_connection(DB_PATH, profile='read')
     try:
         cursor = conn.cursor()
         
         cursor.execute("""
             SELECT COUNT(*) as count
             FROM PeriodicTaskLogs 
-            WHERE task_name LIKE 'email-%'
+            WHERE task_name GLOB 'email-*'
         """)
         
         result = cursor.fetchone()
@@ -549,13 +549,13 @@ def get_email_counts_by_user(start_time: str, end_time: str) -> dict:
         Dict mapping username to count of sent emails.
     """
     import re
-    conn = get_db_connection(DB_PATH)
+    conn = get_db_connection(DB_PATH, profile='read')
     try:
         cursor = conn.cursor()
         cursor.execute(
             """
             SELECT message FROM PeriodicTaskLogs 
-            WHERE task_name LIKE 'email-%' 
+            WHERE task_name GLOB 'email-*' 
               AND timestamp >= ? AND timestamp <= ?
             """,
             (start_time, end_time)
@@ -1,10 +1,52 @@
+import gzip
+import io
+import itertools
+import lzma
+import mmap
+import multiprocessing
 import re
 import sys
+import threading
 import os
-import sqlite3
+import time
 from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
 import shutil
 
+from backend.database.snapshot_writer import SnapshotWriter
+
+try:
+    import zstandard
+except ImportError:  # Only needed for .log.zst files
+    zstandard = None
+
+# Number of snapshots (`Log:` blocks) written per transaction when streaming a file
+DEFAULT_COMMIT_EVERY = 100
+
+# Regular expressions for parsing
+TIMESTAMP_PATTERN = re.compile(r'Log: (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) \((\d+)\)')
+SESSION_PATTERN = re.compile(r'@rd_client\(([^,]+),([^)]+)\)\[([^(]+)\(([^)]+)\)\]:')
+HISTOGRAM_PATTERN = re.compile(r'\[([^,]+), ([^)]+)\)\s+(\d+) \|.*')
+
+# The timestamp header on raw bytes, used to split memory-mapped files at snapshot boundaries
+TIMESTAMP_BYTES_PATTERN = re.compile(TIMESTAMP_PATTERN.pattern.encode())
+
+# Files at least this large are split into chunks that are parsed in parallel
+PARALLEL_CHUNK_MIN_BYTES = 64 * 1024 * 1024
+
+# Parse tasks handed to each worker process ahead of the writer, which bounds the parsed snapshots
+# held in memory when parsing outpaces storing
+PARALLEL_PENDING_TASKS_PER_WORKER = 2
+
+# Compressed log files are decompressed while streaming; the key is also the archive suffix
+COMPRESSION_SUFFIXES = {
+    'gz': '.log.gz',
+    'zst': '.log.zst',
+    'xz': '.log.xz',
+}
+LOG_FILE_SUFFIXES = ('.log',) + tuple(COMPRESSION_SUFFIXES.values())
+
 def convert_to_bytes(size_str):
     """Convert a size string (e.g., '512', '1K', '2M') to bytes"""
     multipliers = {
@@ -22,214 +64,275 @@ def convert_to_bytes(size_str):
     else:
         return 0
 
-def log_exists(conn, unix_timestamp):
-    """Check if a log entry with the given timestamp already exists"""
-    cursor = conn.cursor()
-    cursor.execute("SELECT log_id FROM LogEntries WHERE unix_timestamp = ?", (unix_timestamp,))
-    return cursor.fetchone() is not None
+# Memo tables for the tokenizer; both hold one entry per distinct bucket bound seen in the logs
+_size_bytes = {}
+_range_keys = {}
+_MEMO_MAX_ENTRIES = 4096
 
-def get_log_id(conn, unix_timestamp):
-    """Get the log_id for a given unix_timestamp"""
-    cursor = conn.cursor()
-    cursor.execute("SELECT log_id FROM LogEntries WHERE unix_timestamp = ?", (unix_timestamp,))
-    result = cursor.fetchone()
-    return result[0] if result else None
+def size_to_bytes(size_str):
+    """Memoized convert_to_bytes"""
+    try:
+        return _size_bytes[size_str]
+    except KeyError:
+        value = convert_to_bytes(size_str)
+        if len(_size_bytes) < _MEMO_MAX_ENTRIES:
+            _size_bytes[size_str] = value
+        return value
 
-def get_or_create_user(conn, username, user_role, user_affiliation):
-    """Get existing user ID or create a new user and return its ID"""
-    cursor = conn.cursor()
-    cursor.execute("SELECT user_id FROM Users WHERE username = ?", (username,))
-    result = cursor.fetchone()
-    
-    if result:
-        return result[0]
-    else:
-        cursor.execute(
-            "INSERT INTO Users (username, user_role, user_affiliation) VALUES (?, ?, ?)",
-            (username, user_role, user_affiliation)
-        )
-        return cursor.lastrowid
-
-def get_or_create_machine(conn, machine_name, machine_type):
-    """Get existing machine ID or create a new machine and return its ID"""
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT machine_id FROM Machines WHERE machine_name = ? AND machine_type = ?", 
-        (machine_name, machine_type)
-    )
-    result = cursor.fetchone()
-    
-    if result:
-        return result[0]
-    else:
-        cursor.execute(
-            "INSERT INTO Machines (machine_name, machine_type) VALUES (?, ?)",
-            (machine_name, machine_type)
-        )
-        return cursor.lastrowid
-
-def get_or_create_io_size_range(conn, min_bytes, max_bytes, display_text):
-    """Get existing IO size range ID or create a new one and return its ID"""
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT range_id FROM IOSizeRanges WHERE min_bytes = ? AND max_bytes = ?", 
-        (min_bytes, max_bytes)
-    )
-    result = cursor.fetchone()
-    
-    if result:
-        return result[0]
-    else:
-        cursor.execute(
-            "INSERT INTO IOSizeRanges (min_bytes, max_bytes, display_text) VALUES (?, ?, ?)",
-            (min_bytes, max_bytes, display_text)
-        )
-        return cursor.lastrowid
+def parse_histogram_line(line):
+    """
+    Parse a stripped histogram line like `[1K, 2K)    123 |@@@@   |` without regular expressions.
 
-def parse_and_store_log_data(conn, log_content):
-    """Parse log content and store in the database"""
-    # Regular expressions for parsing
-    timestamp_pattern = re.compile(r'Log: (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) \((\d+)\)')
-    session_pattern = re.compile(r'@rd_client\(([^,]+),([^)]+)\)\[([^(]+)\(([^)]+)\)\]:')
-    histogram_pattern = re.compile(r'\[([^,]+), ([^)]+)\)\s+(\d+) \|.*')
-    
-    # Variables to track current context
-    current_timestamp = None
-    current_unix_timestamp = None
-    current_log_id = None
-    current_machine_name = None
-    current_machine_type = None
-    current_user = None
-    current_user_role = None
-    current_user_affiliation = None
-    current_session_id = None
+    Accepts exactly the lines HISTOGRAM_PATTERN matches. Returns ((min_bytes, max_bytes, display_text), count),
+    or None if the line is not a histogram line.
+    """
+    comma = line.find(',', 1)
+    if comma < 2 or line[comma + 1:comma + 2] != ' ':
+        return None
+    close = line.find(')', comma + 2)
+    if close < comma + 3:
+        return None
     
-    cursor = conn.cursor()
+    rest = line[close + 1:]
+    if not rest[:1].isspace():
+        return None
+    count_str, _, bar = rest.lstrip().partition(' ')
+    # isdecimal is the \d of the pattern, isdigit would also accept e.g. '²', which int() rejects
+    if not (count_str.isdecimal() and bar[:1] == '|'):
+        return None
     
-    # Start a transaction
-    conn.execute("BEGIN TRANSACTION")
-    
-    # Process each line
-    lines = log_content.strip().split('\n')
-    line_index = 0
+    bounds = line[1:close]
+    range_key = _range_keys.get(bounds)
+    if range_key is None:
+        size_min_str = line[1:comma]
+        size_max_str = line[comma + 2:close]
+        range_key = (size_to_bytes(size_min_str), size_to_bytes(size_max_str), f"[{size_min_str}, {size_max_str})")
+        if len(_range_keys) < _MEMO_MAX_ENTRIES:
+            _range_keys[bounds] = range_key
+    return range_key, int(count_str)
+
+@dataclass
+class SessionHistogram:
+    """The histogram of one @rd_client(...) block"""
+    machine_name: str
+    machine_type: str
+    username: str
+    user_role: Optional[str]
+    user_affiliation: Optional[str]
+    # (min_bytes, max_bytes, display_text) -> operation count
+    counts: Dict[Tuple[int, int, str], int] = field(default_factory=dict)
+
+@dataclass
+class Snapshot:
+    """All sessions logged under one `Log:` header"""
+    timestamp: str
+    unix_timestamp: int
+    # (machine_name, machine_type, username) -> session histogram
+    sessions: Dict[Tuple[str, str, str], SessionHistogram] = field(default_factory=dict)
+
+def iter_log_snapshots(lines, skip_timestamps=None):
+    """
+    Parse log lines from any iterable (an open file, a generator, ...) into Snapshot objects.
+
+    Lines are consumed one at a time and only the snapshot currently being read is kept in
+    memory, so memory use stays flat no matter how large the input is. Snapshots whose unix
+    timestamp is in `skip_timestamps` are fast-forwarded to the next `Log:` header without
+    matching any of their lines.
+
+    The line type is picked from its first character (`L`, `@`, `[`), so each line is tried
+    against one parser only; histogram lines, the vast majority, are parsed without regexes.
+    """
+    current_snapshot = None
+    current_session = None
+    skipping = False
     
-    while line_index < len(lines):
-        line = lines[line_index].strip()
-        line_index += 1
+    for line in lines:
+        if skipping and 'Log: ' not in line:
+            continue
+        line = line.strip()
         
         if not line:
             continue
+        first = line[0]
+        
+        # Check if this is a histogram line
+        if first == '[':
+            if current_session is not None:
+                histogram = parse_histogram_line(line)
+                if histogram is not None:
+                    current_session.counts[histogram[0]] = histogram[1]
+            continue
             
         # Check if this is a timestamp line
-        timestamp_match = timestamp_pattern.match(line)
+        timestamp_match = TIMESTAMP_PATTERN.match(line) if first == 'L' else None
         if timestamp_match:
-            timestamp_str = timestamp_match.group(1)
-            unix_timestamp = int(timestamp_match.group(2))
+            if current_snapshot is not None:
+                yield current_snapshot
+            current_snapshot = Snapshot(timestamp_match.group(1), int(timestamp_match.group(2)))
+            current_session = None
             
-            # Check if this log entry already exists
-            if log_exists(conn, unix_timestamp):
-                # Skip to the next timestamp
-                current_log_id = get_log_id(conn, unix_timestamp)
-                current_timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-                current_unix_timestamp = unix_timestamp
-                continue
-            
-            # Insert new log entry
-            cursor.execute(
-                "INSERT INTO LogEntries (timestamp, unix_timestamp) VALUES (?, ?)",
-                (timestamp_str, unix_timestamp)
-            )
-            current_log_id = cursor.lastrowid
-            current_timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-            current_unix_timestamp = unix_timestamp
+            # Already ingested, skip to the next timestamp
+            skipping = skip_timestamps is not None and current_snapshot.unix_timestamp in skip_timestamps
+            if skipping:
+                current_snapshot = None
             continue
         
         # Check if this is a user session line
-        session_match = session_pattern.match(line)
-        if session_match and current_log_id:
-            current_machine_name = session_match.group(1)
-            current_machine_type = session_match.group(2)
-            current_user = session_match.group(3)
+        session_match = SESSION_PATTERN.match(line) if first == '@' else None
+        if session_match and current_snapshot is not None:
+            machine_name = session_match.group(1)
+            machine_type = session_match.group(2)
+            username = session_match.group(3)
             user_status = session_match.group(4)
             
             # Extract user role and affiliation
             user_status_parts = user_status.split('/')
-            current_user_role = user_status_parts[0] if len(user_status_parts) > 0 else None
-            current_user_affiliation = user_status_parts[1] if len(user_status_parts) > 1 else None
-            
-            # Get or create user and machine
-            user_id = get_or_create_user(conn, current_user, current_user_role, current_user_affiliation)
-            machine_id = get_or_create_machine(conn, current_machine_name, current_machine_type)
-            
-            # Create user session
-            try:
-                cursor.execute(
-                    "INSERT INTO UserSessions (log_id, user_id, machine_id) VALUES (?, ?, ?)",
-                    (current_log_id, user_id, machine_id)
-                )
-                current_session_id = cursor.lastrowid
-            except sqlite3.IntegrityError:
-                # Session already exists, get its ID
-                cursor.execute(
-                    "SELECT session_id FROM UserSessions WHERE log_id = ? AND user_id = ? AND machine_id = ?",
-                    (current_log_id, user_id, machine_id)
-                )
-                current_session_id = cursor.fetchone()[0]
-                
-            continue
-        
-        # Check if this is a histogram line
-        histogram_match = histogram_pattern.match(line)
-        if histogram_match and current_session_id:
-            size_min_str = histogram_match.group(1)
-            size_max_str = histogram_match.group(2)
-            count = int(histogram_match.group(3))
+            user_role = user_status_parts[0] if len(user_status_parts) > 0 else None
+            user_affiliation = user_status_parts[1] if len(user_status_parts) > 1 else None
             
-            # Convert size ranges to bytes
-            min_bytes = convert_to_bytes(size_min_str)
-            max_bytes = convert_to_bytes(size_max_str)
-            display_text = f"[{size_min_str}, {size_max_str})"
+            # A repeated session within a snapshot keeps adding to the same histogram
+            key = (machine_name, machine_type, username)
+            current_session = current_snapshot.sessions.get(key)
+            if current_session is None:
+                current_session = SessionHistogram(machine_name, machine_type, username, user_role, user_affiliation)
+                current_snapshot.sessions[key] = current_session
+    
+    if current_snapshot is not None:
+        yield current_snapshot
+
+def parse_and_store_log_data(conn, log_content, writer=None, skip_existing=True):
+    """Parse log content and store in the database"""
+    parse_and_store_log_lines(conn, io.StringIO(log_content), commit_every=None, writer=writer,
+                              skip_existing=skip_existing)
+
+def parse_and_store_log_lines(conn, lines, commit_every=DEFAULT_COMMIT_EVERY, writer=None, skip_existing=True):
+    """
+    Parse log lines from any iterable (an open file, a generator, ...) and store them in the database.
+
+    The transaction is committed every `commit_every` snapshots (`Log:` blocks), always on a
+    snapshot boundary; pass None to commit only once at the end. `writer` is the SnapshotWriter
+    shared by the ingest run; a new one is created if not given. With `skip_existing`, snapshots
+    whose timestamp is already stored are skipped without being parsed.
+
+    Returns the number of snapshots stored.
+    """
+    if writer is None:
+        writer = SnapshotWriter(conn)
+    skip_timestamps = writer.ingested_timestamps if skip_existing else None
+    return store_snapshots(conn, iter_log_snapshots(lines, skip_timestamps), writer,
+                           commit_every=commit_every, skip_existing=skip_existing)
+
+def store_snapshots(conn, snapshots, writer, commit_every=DEFAULT_COMMIT_EVERY, skip_existing=True,
+                    before_commit=None):
+    """
+    Store parsed snapshots in order, committing every `commit_every` snapshots.
+
+    `before_commit` is called in the last transaction right before it is committed, to write
+    rows that have to be committed together with the snapshots.
+
+    Returns the number of snapshots stored.
+    """
+    snapshot_count = 0
+    
+    # Start a transaction
+    conn.execute("BEGIN TRANSACTION")
+    
+    try:
+        for snapshot in snapshots:
+            if skip_existing and snapshot.unix_timestamp in writer.ingested_timestamps:
+                continue
             
-            # Get or create IO size range
-            range_id = get_or_create_io_size_range(conn, min_bytes, max_bytes, display_text)
+            # Commit the previous batch of snapshots before storing a new one
+            if commit_every and snapshot_count and snapshot_count % commit_every == 0:
+                writer.flush()
+                conn.commit()
+                conn.execute("BEGIN TRANSACTION")
+            snapshot_count += 1
             
-            # Insert or update IO operation
-            try:
-                cursor.execute(
-                    "INSERT INTO IOOperations (session_id, range_id, operation_count) VALUES (?, ?, ?)",
-                    (current_session_id, range_id, count)
-                )
-            except sqlite3.IntegrityError:
-                # Update existing operation count
-                cursor.execute(
-                    "UPDATE IOOperations SET operation_count = ? WHERE session_id = ? AND range_id = ?",
-                    (count, current_session_id, range_id)
-                )
+            writer.add(snapshot)
+        writer.flush()
+        if before_commit is not None:
+            before_commit()
+    except Exception:
+        # Only the snapshots since the last commit are lost; drop cached state that went with them
+        writer.discard()
+        conn.rollback()
+        writer.reload()
+        raise
     
     # Commit transaction
     conn.commit()
+    return snapshot_count
+
+def get_log_compression(log_path):
+    """Return the compression ('gz', 'zst', 'xz') of a log file from its name, or None if plain"""
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if log_path.endswith(suffix):
+            return compression
+    return None
+
+def _open_compressed(log_path, compression, mode):
+    """Open a compressed file as a binary stream for reading ('rb') or writing ('wb')"""
+    if compression == 'gz':
+        return gzip.open(log_path, mode)
+    if compression == 'xz':
+        return lzma.open(log_path, mode)
+    if compression == 'zst':
+        if zstandard is None:
+            raise RuntimeError(f"The zstandard package is required for {log_path}")
+        if mode == 'rb':
+            return zstandard.open(log_path, 'rb')
+        return zstandard.open(log_path, 'wb', cctx=zstandard.ZstdCompressor(level=10))
+    raise ValueError(f"Unknown compression: {compression}")
+
+def open_log_file(log_path):
+    """Open a plain or compressed (.log.gz, .log.zst, .log.xz) log file as a text stream"""
+    compression = get_log_compression(log_path)
+    if compression is None:
+        return open(log_path, 'r')
+    return io.TextIOWrapper(_open_compressed(log_path, compression, 'rb'), encoding='utf-8')
+
+def archive_log_file(log_path, archive_dir, compression=None):
+    """
+    Move a processed log file to the archive directory and return its new path.
+
+    With `compression` ('gz', 'zst' or 'xz'), plain log files are compressed into the archive
+    while streaming; files that are already compressed are moved as they are.
+    """
+    log_filename = os.path.basename(log_path)
+    archive_path: str = os.path.join(archive_dir, log_filename)
+    # Add datetime to the filename to avoid overwriting
+    archive_path = archive_path.replace(".log", f"_{datetime.now().strftime('%Y-%m-%d.log')}")
+    
+    if compression is None or get_log_compression(log_path) is not None:
+        shutil.move(log_path, archive_path)
+        return archive_path
+    
+    archive_path += COMPRESSION_SUFFIXES[compression][len('.log'):]
+    with open(log_path, 'rb') as source, _open_compressed(archive_path, compression, 'wb') as target:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+    os.remove(log_path)
+    return archive_path
 
-def process_log_file(conn, log_path, archive_dir=None, verbose=True):
-    """Process a log file and update the database"""
+def process_log_file(conn, log_path, archive_dir=None, verbose=True, commit_every=DEFAULT_COMMIT_EVERY, writer=None,
+                     skip_existing=True, archive_compression=None):
+    """Process a (possibly compressed) log file and update the database, streaming it line by line"""
     if verbose:
         print(f"Processing log file: {log_path}...")
     try:
-        with open(log_path, 'r') as file:
-            log_content = file.read()
-        
-        # Process log content
-        parse_and_store_log_data(conn, log_content)
+        if writer is None:
+            writer = SnapshotWriter(conn)
+        with open_log_file(log_path) as file:
+            snapshot_count = parse_and_store_log_lines(conn, file, commit_every=commit_every, writer=writer,
+                                                       skip_existing=skip_existing)
+        if verbose:
+            print(f"Stored {snapshot_count} snapshots from {log_path}, wrote {writer.summary()}")
         
         # Archive the processed file if archive directory is provided
         if archive_dir:
-            log_filename = os.path.basename(log_path)
-            # Move the file to the archive directory using rsync
-            archive_path: str = os.path.join(archive_dir, log_filename)
-            # Add datetime to the filename to avoid overwriting
-            archive_path = archive_path.replace(".log", f"_{datetime.now().strftime('%Y-%m-%d.log')}")
-            shutil.move(log_path, archive_path)
+            archive_log_file(log_path, archive_dir, archive_compression)
             if verbose:
-                print(f"Archived {log_filename} to {archive_dir}")
+                print(f"Archived {os.path.basename(log_path)} to {archive_dir}")
 
         if verbose:
             print(f"Successfully processed log file: {log_path}")
@@ -238,3 +341,221 @@ def process_log_file(conn, log_path, archive_dir=None, verbose=True):
         print(f"Error processing log file {log_path}: {e}")
         return False
 
+# Timestamps that worker processes can skip while parsing, set by _init_parse_worker
+_worker_skip_timestamps = None
+
+def _init_parse_worker(skip_timestamps):
+    global _worker_skip_timestamps
+    _worker_skip_timestamps = skip_timestamps
+
+def find_snapshot_boundaries(log_path, chunk_count):
+    """
+    Split a log file into at most `chunk_count` byte ranges that each start at a `Log:` header.
+
+    The file is memory-mapped and only searched around the split points, so nothing is read
+    into memory. Returns a list of (start, end) offsets covering the whole file.
+    """
+    size = os.path.getsize(log_path)
+    if size == 0:
+        return []
+    
+    with open(log_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        starts = [0]
+        for i in range(1, chunk_count):
+            position = max(size * i // chunk_count, starts[-1]) - 1
+            # Move forward to the next line that is a valid timestamp header
+            while True:
+                position = mm.find(b'\nLog: ', position + 1)
+                if position == -1 or TIMESTAMP_BYTES_PATTERN.match(mm, position + 1):
+                    break
+            if position == -1:
+                break
+            if position + 1 > starts[-1]:
+                starts.append(position + 1)
+    
+    return list(zip(starts, starts[1:] + [size]))
+
+def iter_mmap_lines(mm, start, end):
+    """Yield the decoded lines of the byte range [start, end) of a memory-mapped file"""
+    mm.seek(start)
+    while mm.tell() < end:
+        yield mm.readline().decode('utf-8')
+
+def parse_log_chunk(task):
+    """
+    Parse one ingest task into a list of snapshots without touching the database.
+
+    Runs in the worker processes of process_log_files_parallel. A task is (log_path, start, end),
+    where end is None for a whole (possibly compressed) file; byte ranges of plain files are read
+    through mmap. Returns
+    (log_path, snapshots, error).
+    """
+    log_path, start, end = task
+    try:
+        if end is None:
+            with open_log_file(log_path) as file:
+                return log_path, list(iter_log_snapshots(file, _worker_skip_timestamps)), None
+        with open(log_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lines = iter_mmap_lines(mm, start, end)
+            return log_path, list(iter_log_snapshots(lines, _worker_skip_timestamps)), None
+    except Exception as e:
+        return log_path, [], str(e)
+
+def _iter_bounded_tasks(tasks, pending, stopped):
+    """
+    Yield the tasks, each once a slot of the `pending` semaphore is free. Consuming a result
+    frees a slot; setting `stopped` (and releasing a slot) ends the iteration.
+    """
+    for task in tasks:
+        pending.acquire()
+        if stopped.is_set():
+            return
+        yield task
+
+def _iter_releasing(results, pending):
+    """Free a slot of the `pending` semaphore for each result taken from the pool"""
+    for result in results:
+        pending.release()
+        yield result
+
+def _iter_task_snapshots(results):
+    """Chain the snapshots of the ordered task results of one file, failing on the first error"""
+    for log_path, snapshots, error in results:
+        if error is not None:
+            raise RuntimeError(error)
+        yield from snapshots
+
+def process_log_files_parallel(conn, log_paths, workers, archive_dir=None, commit_every=DEFAULT_COMMIT_EVERY,
+                               writer=None, skip_existing=True, chunk_min_bytes=PARALLEL_CHUNK_MIN_BYTES,
+                               archive_compression=None, max_pending=None):
+    """
+    Parse log files in `workers` processes and store them from this process.
+
+    Plain files of at least `chunk_min_bytes` are split at `Log:` headers into chunks that are parsed
+    in parallel and stored in one ordered transaction. The regex parsing runs in parallel while
+    a single writer stores the results in the same file and snapshot order as sequential ingest,
+    so the resulting database is identical. At most `max_pending` tasks (by default
+    PARALLEL_PENDING_TASKS_PER_WORKER per worker) are parsed or waiting to be stored at a time.
+    Yields True or False for each file once it has been stored (or failed).
+    """
+    if writer is None:
+        writer = SnapshotWriter(conn)
+    skip_timestamps = frozenset(writer.ingested_timestamps) if skip_existing else None
+    
+    tasks = []
+    chunked_paths = set()
+    for log_path in log_paths:
+        # Several chunks per worker so that uneven chunks still balance out
+        chunks = []
+        if get_log_compression(log_path) is None and os.path.getsize(log_path) >= chunk_min_bytes:
+            chunks = find_snapshot_boundaries(log_path, workers * 4)
+        if chunks:
+            chunked_paths.add(log_path)
+            tasks.extend((log_path, start, end) for start, end in chunks)
+        else:
+            tasks.append((log_path, 0, None))
+    
+    if max_pending is None:
+        max_pending = workers * PARALLEL_PENDING_TASKS_PER_WORKER
+    pending = threading.Semaphore(max_pending)
+    stopped = threading.Event()
+    
+    with multiprocessing.Pool(workers, initializer=_init_parse_worker, initargs=(skip_timestamps,)) as pool:
+        results = _iter_releasing(pool.imap(parse_log_chunk, _iter_bounded_tasks(tasks, pending, stopped)), pending)
+        try:
+            for log_path, file_results in itertools.groupby(results, key=lambda result: result[0]):
+                chunked = log_path in chunked_paths
+                try:
+                    # Snapshots already stored from an earlier file are dropped here, as in sequential ingest
+                    store_snapshots(conn, _iter_task_snapshots(file_results), writer,
+                                    commit_every=None if chunked else commit_every, skip_existing=skip_existing)
+                    if archive_dir:
+                        archive_log_file(log_path, archive_dir, archive_compression)
+                except Exception as e:
+                    print(f"Error processing log file {log_path}: {e}")
+                    yield False
+                    continue
+                yield True
+        finally:
+            # Wake the pool's task feeder if it waits for a slot, or the pool cannot shut down
+            stopped.set()
+            pending.release()
+
+def get_ingest_checkpoint(conn, log_path):
+    """Get the (inode, byte_offset, last_unix_timestamp) checkpoint of a followed log file"""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT inode, byte_offset, last_unix_timestamp FROM LogIngestCheckpoints WHERE path = ?",
+        (log_path,)
+    )
+    result = cursor.fetchone()
+    return tuple(result) if result else None
+
+def save_ingest_checkpoint(conn, log_path, inode, byte_offset, last_unix_timestamp):
+    """Record how far a followed log file has been ingested. The caller owns the transaction."""
+    conn.execute(
+        """
+        INSERT INTO LogIngestCheckpoints (path, inode, byte_offset, last_unix_timestamp, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (path) DO UPDATE SET
+            inode = excluded.inode,
+            byte_offset = excluded.byte_offset,
+            last_unix_timestamp = excluded.last_unix_timestamp,
+            updated_at = excluded.updated_at
+        """,
+        (log_path, inode, byte_offset, last_unix_timestamp, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    )
+
+def follow_log_file(conn, log_path, writer=None, quiet_seconds=30):
+    """
+    Ingest only the bytes appended to a log file since its last checkpoint.
+
+    Snapshots are complete once the next `Log:` header has been written, so the range read
+    ends at the last header and the checkpoint is left there. The trailing snapshot is read
+    as well once the file has been quiet for `quiet_seconds`. A new inode or a shrunken file
+    (rotation, re-fetch) restarts from the beginning; snapshots that are already stored are
+    then skipped without being parsed. The checkpoint is committed in the same transaction as
+    the snapshots it covers.
+
+    Returns the number of snapshots stored.
+    """
+    if writer is None:
+        writer = SnapshotWriter(conn)
+    
+    stat = os.stat(log_path)
+    checkpoint = get_ingest_checkpoint(conn, log_path)
+    offset, last_unix_timestamp = 0, None
+    if checkpoint and checkpoint[0] == stat.st_ino and checkpoint[1] <= stat.st_size:
+        offset, last_unix_timestamp = checkpoint[1], checkpoint[2]
+    
+    if offset == stat.st_size:
+        return 0
+    
+    with open(log_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = min(stat.st_size, len(mm))
+        if time.time() - stat.st_mtime >= quiet_seconds:
+            end = size
+        else:
+            # Stop at the last header after the offset; its snapshot may still be being written
+            end = offset
+            position = mm.rfind(b'\nLog: ', offset, size)
+            if position != -1:
+                end = position + 1
+        
+        if end <= offset:
+            return 0
+        
+        timestamps = []
+        
+        def remember_timestamps(snapshots):
+            for snapshot in snapshots:
+                timestamps.append(snapshot.unix_timestamp)
+                yield snapshot
+        
+        def save_checkpoint():
+            save_ingest_checkpoint(conn, log_path, stat.st_ino, end,
+                                   timestamps[-1] if timestamps else last_unix_timestamp)
+        
+        snapshots = iter_log_snapshots(iter_mmap_lines(mm, offset, end), writer.ingested_timestamps)
+        return store_snapshots(conn, remember_timestamps(snapshots), writer, commit_every=None,
+                               before_commit=save_checkpoint)
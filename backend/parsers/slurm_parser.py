@@ -8,6 +8,10 @@ import os
 from flask import jsonify
 from collections import defaultdict
 from backend.config import GPU_MAX_HOURS
+from backend.database.dimension_cache import DimensionCache
+from backend.database.data_generation import bump_generation
+from backend.database.schema import get_db_connection
+from backend.database.stats_counters import set_counters
 from backend.tasks.calendar_tasks import CALENDAR_LOGS_DIR
 
 class JobState(Enum):
@@ -46,7 +50,7 @@ class UserResourceUsage:
 def get_user_role(db_path: str, username: str) -> Optional[str]:
     """Get user role from database"""
     try:
-        conn = sqlite3.connect(db_path)
+        conn = get_db_connection(db_path, profile='read')
         cursor = conn.cursor()
         
         # Check if Users table exists
@@ -229,12 +233,13 @@ def get_current_usage_summary(db_path: str):
         })
     return sorted(summary, key=lambda x: x['total_gpus'], reverse=True), collection_timestamp
 
-def store_slurm_jobs(jobs: List[SlurmJob], db_path: str, collection_timestamp: Optional[str] = None) -> bool:
-    """Store Slurm jobs in the database"""
+def store_slurm_jobs(jobs: List[SlurmJob], db_path: str, collection_timestamp: Optional[str] = None,
+                     cache: Optional[DimensionCache] = None) -> bool:
+    """Store Slurm jobs in the database, resolving users and machines through a DimensionCache"""
     print(f"Storing {len(jobs)} Slurm jobs in the database")
     conn = None
     try:
-        conn = sqlite3.connect(db_path)
+        conn = get_db_connection(db_path)
         cursor = conn.cursor()
         
         # Start a transaction
@@ -258,34 +263,16 @@ def store_slurm_jobs(jobs: List[SlurmJob], db_path: str, collection_timestamp: O
         # Clear all existing jobs before inserting new ones
         cursor.execute("DELETE FROM Jobs")
         
+        # Resolve users and machines through the dimension cache, inserting new ones in bulk
+        if cache is None:
+            cache = DimensionCache.load(conn)
+        cache.add_users(conn, ((job.user, None, None) for job in jobs))
+        cache.add_machines(conn, ((job.node_list, 'gpu') for job in jobs))
+        
         # Store each job
         for job in jobs:
-            # Get or create user
-            cursor.execute("SELECT user_id FROM Users WHERE username = ?", (job.user,))
-            result = cursor.fetchone()
-            if result:
-                user_id = result[0]
-            else:
-                cursor.execute(
-                    "INSERT INTO Users (username) VALUES (?)",
-                    (job.user,)
-                )
-                user_id = cursor.lastrowid
-            
-            # Get or create machine
-            cursor.execute(
-                "SELECT machine_id FROM Machines WHERE machine_name = ? AND machine_type = 'gpu'",
-                (job.node_list,)
-            )
-            result = cursor.fetchone()
-            if result:
-                machine_id = result[0]
-            else:
-                cursor.execute(
-                    "INSERT INTO Machines (machine_name, machine_type) VALUES (?, 'gpu')",
-                    (job.node_list,)
-                )
-                machine_id = cursor.lastrowid
+            user_id = cache.user_id(job.user)
+            machine_id = cache.machine_id(job.node_list, 'gpu')
             
             # Insert job (use REPLACE to handle duplicate job IDs)
             cursor.execute("""
@@ -299,6 +286,10 @@ def store_slurm_jobs(jobs: List[SlurmJob], db_path: str, collection_timestamp: O
                 job.elapsed_time, job.state.value, job.command, job.end_time, created_at
             ))
         
+        # Jobs was emptied above and job_id is its key
+        set_counters(conn, job_count=len({job.job_id for job in jobs}))
+        bump_generation(conn)
+        
         # Commit transaction
         conn.commit()
 
@@ -308,6 +299,8 @@ def store_slurm_jobs(jobs: List[SlurmJob], db_path: str, collection_timestamp: O
         print(f"Error storing Slurm jobs: {e}")
         if conn:
             conn.rollback()
+            if cache is not None:
+                cache.reload(conn)
         return False
     finally:
         if conn:
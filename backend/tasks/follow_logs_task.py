@@ -0,0 +1,76 @@
+from backend.database.data_generation import read_generation
+from backend.database.schema import get_db_connection
+from backend.database.snapshot_writer import SnapshotWriter
+from backend.parsers.log_parser import follow_log_file
+from config import DB_PATH, INCOMING_LOGS_DIR, LOG_FOLLOW_QUIET_SECONDS
+import glob
+import os
+import logging
+
+
+
+logger = logging.getLogger(__name__)
+
+class LogFollower:
+    """
+    Connection and SnapshotWriter kept by the follow task from one run to the next.
+
+    The writer's dimension cache and ingested timestamps are only reloaded when the data
+    generation shows that something else wrote to the database since the last run.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = None
+        self.writer = None
+        self.generation = None
+
+    def get_writer(self):
+        """Return the writer, creating it or reloading its cached state as needed"""
+        if self.writer is None:
+            self.conn = get_db_connection(self.db_path)
+            self.writer = SnapshotWriter(self.conn)
+        elif read_generation(self.conn)[0] != self.generation:
+            self.writer.reload()
+        return self.writer
+
+    def finish_run(self):
+        """Remember the generation the writer's state is current for"""
+        self.generation = read_generation(self.conn)[0]
+
+    def close(self):
+        """Drop the connection and writer, the next run starts from scratch"""
+        if self.conn is not None:
+            self.conn.close()
+        self.conn = None
+        self.writer = None
+        self.generation = None
+
+follower = LogFollower(DB_PATH)
+
+def follow_incoming_logs():
+    """Scheduled task to ingest the snapshots appended to the incoming IO logs since the last run."""
+    log_files = sorted(glob.glob(os.path.join(INCOMING_LOGS_DIR, "*.log")))
+    if not log_files:
+        return {"status": "skipped", "reason": "No log files in incoming directory"}
+
+    try:
+        writer = follower.get_writer()
+        rows_before = writer.rows_written
+        snapshots_by_file = {}
+        for log_file in log_files:
+            try:
+                stored = follow_log_file(follower.conn, log_file, writer, quiet_seconds=LOG_FOLLOW_QUIET_SECONDS)
+            except FileNotFoundError:
+                # Moved to the archive by a batch import in the meantime
+                continue
+            if stored:
+                snapshots_by_file[os.path.basename(log_file)] = stored
+        follower.finish_run()
+    except Exception:
+        follower.close()
+        raise
+
+    if not snapshots_by_file:
+        return {"status": "skipped", "reason": "No new snapshots"}
+    return {"status": "success", "snapshots": snapshots_by_file, "rows_written": writer.rows_written - rows_before}
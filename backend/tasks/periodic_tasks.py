@@ -40,13 +40,17 @@ class TaskScheduler:
         finally:
             conn.close()
 
-    def add_task(self, name, func, interval_minutes, initial_delay=0):
-        """Add a periodic task to the scheduler, with optional initial delay in seconds"""
+    def add_task(self, name, func, interval_minutes, initial_delay=0, log_skipped=True):
+        """
+        Add a periodic task to the scheduler, with optional initial delay in seconds. Without
+        `log_skipped`, runs that return {"status": "skipped", ...} are not logged.
+        """
         current_time = time.time()
         self.tasks[name] = {
             'func': func,
             'interval': interval_minutes * 60,  # Convert to seconds
-            'last_run': current_time + initial_delay - (interval_minutes * 60)
+            'last_run': current_time + initial_delay - (interval_minutes * 60),
+            'log_skipped': log_skipped
         }
         logger.info(f"Added task '{name}' with interval {interval_minutes} minutes and initial delay {initial_delay} seconds")
 
@@ -55,6 +59,8 @@ class TaskScheduler:
         try:
             logger.info(f"Running task '{name}'")
             result = task_info['func']()
+            if not task_info['log_skipped'] and isinstance(result, dict) and result.get('status') == 'skipped':
+                return
             self.log_task_execution(name, 'success', 
                                   message=f"Task completed successfully",
                                   details=str(result))
@@ -96,7 +102,7 @@ scheduler = TaskScheduler(DB_PATH)
 
 def get_task_logs(limit=20, offset=0):
     """Get recent task logs from the database with pagination"""
-    conn = get_db_connection(DB_PATH)
+    conn = get_db_connection(DB_PATH, profile='read')
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -111,7 +117,7 @@ def get_task_logs(limit=20, offset=0):
 
 def get_task_logs_count():
     """Get total count of task logs"""
-    conn = get_db_connection(DB_PATH)
+    conn = get_db_connection(DB_PATH, profile='read')
     cursor = conn.cursor()
     
     cursor.execute('SELECT COUNT(*) as count FROM PeriodicTaskLogs')
@@ -0,0 +1,87 @@
+import pytest
+
+from backend.database import schema
+from backend.parsers.log_parser import parse_and_store_log_data
+
+# rd_client snapshots as written to the incoming IO logs: zero counts, a session that is logged
+# twice in one snapshot and a size range that only appears later
+SAMPLE_LOG = """\
+Log: 2025-01-06 10:00:00 (1736154000)
+@rd_client(gpu01,gpu)[alice(student/dinfk)]:
+[0, 1)                 0 |                                                    |
+[512, 1K)             12 |@@@@                                                |
+[1K, 2K)             150 |@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@|
+@rd_client(cpu01,cpu)[bob(staff/dinfk)]:
+[512, 1K)              0 |                                                    |
+[4K, 8K)               7 |@@                                                  |
+
+Log: 2025-01-06 11:00:00 (1736157600)
+@rd_client(gpu01,gpu)[alice(student/dinfk)]:
+[1K, 2K)              20 |@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@|
+@rd_client(gpu01,gpu)[bob(staff/dinfk)]:
+[0, 1)                 0 |                                                    |
+@rd_client(gpu01,gpu)[alice(student/dinfk)]:
+[2M, 4M)               3 |@@@@@@@                                             |
+
+Log: 2025-01-07 09:30:00 (1736238600)
+@rd_client(cpu01,cpu)[carol(guest)]:
+[512, 1K)              1 |@                                                   |
+[1K, 2K)               2 |@@                                                  |
+[4K, 8K)               0 |                                                    |
+"""
+
+# Snapshots that continue SAMPLE_LOG, e.g. appended to its file
+NEXT_SNAPSHOTS = """\
+Log: 2025-01-07 10:30:00 (1736242200)
+@rd_client(gpu01,gpu)[alice(student/dinfk)]:
+[1K, 2K)               5 |@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@|
+Log: 2025-01-07 11:30:00 (1736245800)
+@rd_client(gpu01,gpu)[alice(student/dinfk)]:
+[1K, 2K)               6 |@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@|
+"""
+
+# Histogram lines in SAMPLE_LOG, which is what COUNT(*) FROM IOOperations holds after ingesting it
+SAMPLE_LOG_OPERATION_ROWS = 11
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Path of an empty database with the current schema"""
+    path = str(tmp_path / 'io_usage.db')
+    schema.initialize_database(path)
+    return path
+
+
+@pytest.fixture
+def sample_db(db_path):
+    """Path of a database holding SAMPLE_LOG"""
+    conn = schema.get_db_connection(db_path)
+    try:
+        parse_and_store_log_data(conn, SAMPLE_LOG)
+    finally:
+        conn.close()
+    return db_path
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    """Path of a log file holding SAMPLE_LOG"""
+    path = tmp_path / 'incoming' / 'rd_client.log'
+    path.parent.mkdir()
+    path.write_text(SAMPLE_LOG)
+    return str(path)
+
+
+# Tables that hold the ingested data, compared between databases ingested in different ways
+DATA_TABLES = ['LogEntries', 'Users', 'Machines', 'IOSizeRanges', 'UserSessions', 'IOOperations',
+               'SessionHistograms', 'SessionRollups', 'UsagePatterns', 'SizeDistribution', 'StatsCounters']
+
+
+def data_table_rows(db_path):
+    """The sorted rows of the DATA_TABLES of a database, by table"""
+    conn = schema.get_db_connection(db_path, profile='read')
+    try:
+        return {table: sorted(tuple(row) for row in conn.execute(f"SELECT * FROM {table}"))
+                for table in DATA_TABLES}
+    finally:
+        conn.close()
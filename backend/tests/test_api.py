@@ -0,0 +1,161 @@
+import pytest
+from flask import Flask
+
+from backend.api.response_cache import response_cache
+from backend.api import routes
+from backend.api.routes import api
+from backend.database import schema
+from backend.database.data_generation import bump_generation
+from backend.parsers.log_parser import parse_and_store_log_data
+from backend.tests.conftest import NEXT_SNAPSHOTS
+
+
+@pytest.fixture
+def client(sample_db):
+    app = Flask(__name__)
+    app.config['DB_PATH'] = sample_db
+    app.register_blueprint(api, url_prefix='/api')
+    # The generations of another test's database must not shadow this one's
+    response_cache.clear()
+    return app.test_client()
+
+
+def test_historic_usage_top_n(client):
+    entries = client.get('/api/usage/historic?top_n=1').get_json()
+    assert [len(entry['top_users']) for entry in entries] == [1, 1, 1]
+    assert entries[1]['top_users'][0]['username'] == 'alice'
+    for top_n in (0, -1):
+        response = client.get(f'/api/usage/historic?top_n={top_n}')
+        assert response.status_code == 400
+        assert response.get_json() == {'error': 'top_n must be at least 1'}
+
+
+def test_historic_usage_pages(client):
+    first_page = client.get('/api/usage/historic?limit=2').get_json()
+    assert [entry['unix_timestamp'] for entry in first_page] == [1736238600, 1736157600]
+    next_page = client.get('/api/usage/historic?limit=2&before=1736157600').get_json()
+    assert [entry['unix_timestamp'] for entry in next_page] == [1736154000]
+
+    # A bad cursor must not return the first page again
+    for query in ('before=xyz&limit=1', 'before=-1', 'limit=-1', 'limit=1.5', 'top_n=abc'):
+        response = client.get(f'/api/usage/historic?{query}')
+        assert response.status_code == 400, query
+        assert 'error' in response.get_json()
+
+
+@pytest.mark.parametrize('query', [
+    'from=2025-01-06T10:30:00&to=2025-01-07',
+    'from=2025-01-06 10:30&to=2025-01-07 00:00:00',
+    'from=1736155800&to=1736204400',
+    'from=2025-01-06T09:30:00Z&to=2025-01-06T23:00:00%2B00:00',
+])
+def test_time_series_accepts_iso_and_unix_times(client, query):
+    time_series = client.get(f'/api/usage/time?{query}').get_json()['time_series']
+    assert [point['timestamp'] for point in time_series] == ['2025-01-06 11:00:00']
+
+
+@pytest.mark.parametrize('query', ['from=yesterday', 'to=1736155800.5', 'from=', 'from=2025-13-01',
+                                   'from=2025-01-07&to=2025-01-06'])
+def test_invalid_times_are_rejected(client, query):
+    for path in ('/api/usage/time', '/api/usage/user/alice/time', '/api/usage/historic'):
+        response = client.get(f'{path}?{query}')
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+
+
+def test_max_points_below_three_is_rejected(client):
+    assert client.get('/api/usage/time?max_points=2').status_code == 400
+    assert len(client.get('/api/usage/time?max_points=3').get_json()['time_series']) == 3
+    for value in ('abc', '2.5', ''):
+        response = client.get(f'/api/usage/time?max_points={value}')
+        assert response.status_code == 400, value
+        assert 'error' in response.get_json()
+
+
+def bump(db_path):
+    conn = schema.get_db_connection(db_path)
+    try:
+        bump_generation(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_matching_etag_is_answered_with_304(client, sample_db):
+    response = client.get('/api/usage/size')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.last_modified is not None
+
+    response = client.get('/api/usage/size', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    # Another request, or the same one after the data changed, has another ETag
+    assert client.get('/api/usage/size?since=2025-01-07', headers={'If-None-Match': etag}).status_code == 200
+    bump(sample_db)
+    response = client.get('/api/usage/size', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_if_modified_since_is_not_answered(client, sample_db):
+    last_modified = client.get('/api/usage/size').headers['Last-Modified']
+    # Data written within the second of Last-Modified leaves the date unchanged
+    bump(sample_db)
+    response = client.get('/api/usage/size', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 200
+    assert response.get_json()['overall']
+
+
+def test_cached_responses_follow_the_data(client, sample_db):
+    first = client.get('/api/usage/size').get_json()
+    hits = response_cache.stats()['hits']
+    assert client.get('/api/usage/size').get_json() == first
+    assert response_cache.stats()['hits'] == hits + 1
+
+    conn = schema.get_db_connection(sample_db)
+    try:
+        parse_and_store_log_data(conn, NEXT_SNAPSHOTS)
+    finally:
+        conn.close()
+    by_role = client.get('/api/usage/size').get_json()['by_role']['student']
+    assert by_role != first['by_role']['student']
+
+
+def test_failed_stream_gets_no_etag(client, monkeypatch):
+    def failing_entries(*args, **kwargs):
+        yield {'unix_timestamp': 1736238600}
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(routes, 'iter_historic_usage', failing_entries)
+    response = client.get('/api/usage/historic')
+    assert response.status_code == 200
+    assert response.get_json()[-1] == {'error': 'database is locked'}
+    assert 'ETag' not in response.headers and response.last_modified is None
+
+
+def test_coalesced_historic_pages_are_validated(client):
+    response = client.get('/api/usage/historic?limit=2')
+    assert len(response.get_json()) == 2
+    etag = response.headers['ETag']
+    assert client.get('/api/usage/historic?limit=2', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_size_distribution_days(client):
+    overall = client.get('/api/usage/size?since=2025-01-07').get_json()['overall']
+    assert [row['total_operations'] for row in overall] == [1, 2]
+    assert client.get('/api/usage/size?since=1736208000&until=2025-01-07T23:00:00').get_json()['overall'] == overall
+    for query in ('since=garbage', 'until=2025-13-01', 'since=2025-01-08&until=2025-01-07'):
+        response = client.get(f'/api/usage/size?{query}')
+        assert response.status_code == 400, query
+        assert 'error' in response.get_json()
+
+
+def test_user_time_series_formats_share_their_keys(client):
+    rows = client.get('/api/usage/user/alice/time').get_json()
+    columns = client.get('/api/usage/user/alice/time?format=columns').get_json()
+    assert set(rows) == set(columns) == {'timestamp', 'total_operations'}
+    assert rows['timestamp'][0] == '2025-01-06 10:00:00' and columns['timestamp'][0] == 1736154000
+    assert rows['total_operations'] == columns['total_operations'] == [162, 23, 0]
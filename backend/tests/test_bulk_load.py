@@ -0,0 +1,37 @@
+import pytest
+
+from backend.database import schema
+from backend.database.bulk_load import BulkSnapshotWriter
+from backend.database.snapshot_writer import SnapshotWriter
+from backend.parsers import log_parser
+from backend.tests.conftest import NEXT_SNAPSHOTS, SAMPLE_LOG, data_table_rows
+
+FIRST_SNAPSHOTS = SAMPLE_LOG[:SAMPLE_LOG.index('Log: 2025-01-07')]
+
+
+def ingest(db_path, writer_class, histogram_storage, skip_existing):
+    """Store FIRST_SNAPSHOTS, then SAMPLE_LOG and NEXT_SNAPSHOTS with a `writer_class` writer"""
+    schema.initialize_database(db_path)
+    conn = schema.get_db_connection(db_path)
+    try:
+        log_parser.parse_and_store_log_data(conn, FIRST_SNAPSHOTS,
+                                            writer=SnapshotWriter(conn, histogram_storage=histogram_storage))
+        writer = writer_class(conn, histogram_storage=histogram_storage)
+        for text in (SAMPLE_LOG, NEXT_SNAPSHOTS):
+            log_parser.parse_and_store_log_lines(conn, text.splitlines(keepends=True), writer=writer,
+                                                 skip_existing=skip_existing)
+        if writer_class is BulkSnapshotWriter:
+            writer.finish()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('histogram_storage', ['rows', 'packed'])
+@pytest.mark.parametrize('skip_existing', [True, False])
+def test_bulk_merge_matches_sequential_ingest(tmp_path, histogram_storage, skip_existing):
+    sequential, bulk = str(tmp_path / 'sequential.db'), str(tmp_path / 'bulk.db')
+    ingest(sequential, SnapshotWriter, histogram_storage, skip_existing)
+    ingest(bulk, BulkSnapshotWriter, histogram_storage, skip_existing)
+    rows = data_table_rows(bulk)
+    assert rows == data_table_rows(sequential)
+    assert len(rows['LogEntries']) == 5
@@ -0,0 +1,45 @@
+import threading
+
+from backend.config import DB_POOL_MAX_IDLE
+from backend.database import schema
+
+
+def in_new_thread(function):
+    """Run function in a thread of its own, as the threaded dev server does per request"""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_connections_are_reused_across_threads(db_path):
+    def request():
+        conn = schema.get_db_connection(db_path, profile='read')
+        conn.execute("SELECT COUNT(*) FROM LogEntries").fetchone()
+        conn.close()
+        return id(conn)
+
+    assert len({in_new_thread(request) for _ in range(5)}) == 1
+
+
+def test_returned_connections_are_rolled_back(db_path):
+    conn = schema.get_db_connection(db_path)
+    conn.execute("BEGIN TRANSACTION")
+    conn.execute("INSERT INTO Users (username) VALUES ('alice')")
+    conn.close()
+
+    conn = schema.get_db_connection(db_path)
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM Users").fetchone()[0] == 0
+    conn.close()
+
+
+def test_idle_connections_are_bounded(db_path):
+    connections = [schema.get_db_connection(db_path, profile='read') for _ in range(DB_POOL_MAX_IDLE + 2)]
+    for conn in connections:
+        conn.close()
+    key = connections[0].pool_key
+    assert len(schema._pool[key]) == DB_POOL_MAX_IDLE
+    # Connections beyond the bound are really closed
+    assert sum(1 for conn in connections if not conn.pooled) == 2
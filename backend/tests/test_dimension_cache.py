@@ -0,0 +1,76 @@
+import pytest
+
+from backend.database import schema
+from backend.database.dimension_cache import DimensionCache
+from backend.database.snapshot_writer import SnapshotWriter
+from backend.parsers import log_parser
+from backend.tests.conftest import SAMPLE_LOG
+
+USERS = [('alice', 'student', 'dinfk'), ('bob', 'staff', 'dinfk')]
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = schema.get_db_connection(db_path)
+    yield conn
+    conn.close()
+
+
+def statements(conn, action):
+    """The SQL statements `action` runs on `conn`"""
+    executed = []
+    conn.set_trace_callback(executed.append)
+    try:
+        action()
+    finally:
+        conn.set_trace_callback(None)
+    return executed
+
+
+def test_known_keys_do_not_touch_the_database(conn):
+    cache = DimensionCache.load(conn)
+    assert cache.add_users(conn, USERS) == 2
+    assert cache.add_machines(conn, [('gpu01', 'gpu')]) == 1
+    assert cache.add_io_size_ranges(conn, [(1024, 2048, '[1K, 2K)')]) == 1
+    conn.commit()
+
+    assert statements(conn, lambda: (
+        cache.add_users(conn, USERS + [('alice', 'staff', None)]),
+        cache.add_machines(conn, [('gpu01', 'gpu')]),
+        cache.add_io_size_ranges(conn, [(1024, 2048, '[1K, 2K)')]),
+    )) == []
+    assert cache.user_id('bob') == conn.execute("SELECT user_id FROM Users WHERE username = 'bob'").fetchone()[0]
+    # A new key only inserts the missing entries
+    assert cache.add_users(conn, USERS + [('carol', 'guest', None)]) == 1
+    assert sorted(cache.users) == ['alice', 'bob', 'carol']
+
+
+def test_reload_forgets_rolled_back_inserts(conn):
+    cache = DimensionCache.load(conn)
+    conn.execute("BEGIN TRANSACTION")
+    cache.add_users(conn, USERS)
+    conn.rollback()
+    # Stale until reloaded: the cached IDs no longer exist
+    assert 'alice' in cache.users
+
+    cache.reload(conn)
+    assert cache.users == {}
+    assert cache.add_users(conn, USERS) == 2
+    conn.commit()
+    assert cache.users == dict(conn.execute("SELECT username, user_id FROM Users").fetchall())
+
+
+def test_writer_reloads_its_cache_after_a_failed_transaction(conn, monkeypatch):
+    writer = SnapshotWriter(conn)
+
+    def fail():
+        raise OSError('disk full')
+
+    with pytest.raises(OSError):
+        log_parser.store_snapshots(conn, log_parser.iter_log_snapshots(SAMPLE_LOG.splitlines()), writer,
+                                   before_commit=fail)
+    assert writer.cache.users == {} and writer.cache.machines == {}
+
+    # The same writer stores the snapshots with fresh IDs
+    assert log_parser.store_snapshots(conn, log_parser.iter_log_snapshots(SAMPLE_LOG.splitlines()), writer) == 3
+    assert writer.cache.users == dict(conn.execute("SELECT username, user_id FROM Users").fetchall())
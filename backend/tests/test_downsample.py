@@ -0,0 +1,46 @@
+import math
+
+import numpy as np
+import pytest
+
+from backend.utils.downsample import downsample_series, downsample_table, lttb_indices
+
+
+def series(count):
+    """An hourly series with one spike"""
+    values = [int(100 + 50 * math.sin(i / 5)) for i in range(count)]
+    values[count // 3] = 10000
+    return [{'timestamp': 1736154000 + 3600 * i, 'total_operations': value} for i, value in enumerate(values)]
+
+
+@pytest.mark.parametrize('threshold', [3, 4, 10, 99])
+def test_lttb_keeps_the_endpoints(threshold):
+    x = np.arange(100, dtype=np.float64)
+    y = np.sin(x / 7)
+    indices = lttb_indices(x, y, threshold)
+    assert len(indices) == threshold
+    assert indices[0] == 0 and indices[-1] == 99
+    assert list(indices) == sorted(set(indices))
+
+
+def test_lttb_keeps_peaks():
+    points = downsample_series(series(500), 20)
+    assert len(points) == 20
+    assert max(point['total_operations'] for point in points) == 10000
+    assert points[0]['timestamp'] == 1736154000 and points[-1]['timestamp'] == 1736154000 + 3600 * 499
+
+
+def test_short_series_are_returned_as_they_are():
+    points = series(5)
+    assert downsample_series(points, 5) == points
+    assert downsample_series(points, None) == points
+    columns = {'timestamp': ['2025-01-06 10:00:00', '2025-01-06 11:00:00'], 'total_operations': [1, 2]}
+    assert downsample_table(columns, 10) is columns
+
+
+@pytest.mark.parametrize('max_points', [0, 1, 2, -5])
+def test_max_points_below_three_is_an_error(max_points):
+    # Also for series that would not need downsampling, so that the error does not depend on the data
+    for count in (1, 2, 500):
+        with pytest.raises(ValueError):
+            downsample_series(series(count), max_points)
@@ -0,0 +1,94 @@
+import os
+import time
+
+import pytest
+
+from backend.database import schema
+from backend.database.snapshot_writer import SnapshotWriter
+from backend.parsers import log_parser
+from backend.tests.conftest import NEXT_SNAPSHOTS, SAMPLE_LOG
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = schema.get_db_connection(db_path)
+    yield conn
+    conn.close()
+
+
+def make_quiet(log_path):
+    """Backdate the file so that follow_log_file reads its trailing snapshot"""
+    past = time.time() - 3600
+    os.utime(log_path, (past, past))
+
+
+def stored_timestamps(conn):
+    return [row[0] for row in conn.execute("SELECT unix_timestamp FROM LogEntries ORDER BY unix_timestamp")]
+
+
+def test_follow_reads_appended_snapshots_once(conn, log_path):
+    make_quiet(log_path)
+    writer = SnapshotWriter(conn)
+    assert log_parser.follow_log_file(conn, log_path, writer) == 3
+    assert log_parser.get_ingest_checkpoint(conn, log_path)[1:] == (os.path.getsize(log_path), 1736238600)
+    assert log_parser.follow_log_file(conn, log_path, writer) == 0
+
+    # The last snapshot of a file that is still being written waits for the next header
+    with open(log_path, 'a') as file:
+        file.write(NEXT_SNAPSHOTS)
+    assert log_parser.follow_log_file(conn, log_path, writer, quiet_seconds=3600) == 1
+    checkpoint = log_parser.get_ingest_checkpoint(conn, log_path)
+    assert checkpoint[1] == len(SAMPLE_LOG) + NEXT_SNAPSHOTS.index('Log: 2025-01-07 11:30:00')
+    assert checkpoint[2] == 1736242200
+    assert stored_timestamps(conn)[-1] == 1736242200
+
+    make_quiet(log_path)
+    assert log_parser.follow_log_file(conn, log_path, writer) == 1
+    assert stored_timestamps(conn) == [1736154000, 1736157600, 1736238600, 1736242200, 1736245800]
+
+
+def test_follow_resumes_from_the_checkpoint_after_a_restart(db_path, conn, log_path):
+    make_quiet(log_path)
+    log_parser.follow_log_file(conn, log_path)
+    with open(log_path, 'a') as file:
+        file.write(NEXT_SNAPSHOTS)
+    make_quiet(log_path)
+
+    restarted = schema.get_db_connection(db_path)
+    try:
+        writer = SnapshotWriter(restarted)
+        # Only the appended bytes are parsed, the stored snapshots are not even skipped over
+        writer.ingested_timestamps.clear()
+        assert log_parser.follow_log_file(restarted, log_path, writer) == 2
+    finally:
+        restarted.close()
+    assert len(stored_timestamps(conn)) == 5
+
+
+def test_rotated_file_is_read_from_the_start(conn, log_path):
+    make_quiet(log_path)
+    writer = SnapshotWriter(conn)
+    log_parser.follow_log_file(conn, log_path, writer)
+
+    os.remove(log_path)
+    with open(log_path, 'w') as file:
+        file.write(NEXT_SNAPSHOTS)
+    make_quiet(log_path)
+    assert log_parser.follow_log_file(conn, log_path, writer) == 2
+    assert log_parser.get_ingest_checkpoint(conn, log_path)[1:] == (len(NEXT_SNAPSHOTS), 1736245800)
+
+
+def test_checkpoint_is_committed_with_the_snapshots(conn, log_path, monkeypatch):
+    make_quiet(log_path)
+
+    def fail(*args):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(log_parser, 'save_ingest_checkpoint', fail)
+    with pytest.raises(OSError):
+        log_parser.follow_log_file(conn, log_path)
+    assert stored_timestamps(conn) == []
+    assert log_parser.get_ingest_checkpoint(conn, log_path) is None
+
+    monkeypatch.undo()
+    assert log_parser.follow_log_file(conn, log_path) == 3
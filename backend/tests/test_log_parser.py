@@ -0,0 +1,107 @@
+import random
+
+from backend.parsers.log_parser import (
+    HISTOGRAM_PATTERN, SESSION_PATTERN, TIMESTAMP_PATTERN, SessionHistogram, Snapshot,
+    convert_to_bytes, iter_log_snapshots, parse_histogram_line
+)
+from backend.tests.conftest import SAMPLE_LOG
+
+# Lines the tokenizer has to treat exactly like HISTOGRAM_PATTERN
+MALFORMED_LINES = [
+    "[1K, 2K)    ²² |@@   |",
+    "[1K, 2K)    ١٢ |@@   |",
+    "[1K, 2K)    12|@@    |",
+    "[1K, 2K)    12  |@@  |",
+    "[1K, 2K)    12 @@    |",
+    "[1K, 2K)\t12 |@@     |",
+    "[1K, 2K)12 |@@       |",
+    "[1K, 2K)    -1 |     |",
+    "[1K, 2K)    1.5 |    |",
+    "[1K, 2K)",
+    "[1K,2K)     12 |     |",
+    "[, 2K)      12 |     |",
+    "[1K, )      12 |     |",
+    "[,, 2K)     12 |     |",
+    "[1K, 2K, 4K)  12 |   |",
+    "[1K), 2K)   12 |     |",
+    "[1K, 2K))   12 |     |",
+    "[1K, 2K)    12 |",
+    "[1K, 2K)    12 | trailing text",
+    "[4X, 8Y)    12 |     |",
+    "[",
+]
+
+
+def iter_log_snapshots_with_regexes(lines):
+    """The regex parsing iter_log_snapshots did before the tokenizer"""
+    current_snapshot = None
+    current_session = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        timestamp_match = TIMESTAMP_PATTERN.match(line)
+        if timestamp_match:
+            if current_snapshot is not None:
+                yield current_snapshot
+            current_snapshot = Snapshot(timestamp_match.group(1), int(timestamp_match.group(2)))
+            current_session = None
+            continue
+        session_match = SESSION_PATTERN.match(line)
+        if session_match and current_snapshot is not None:
+            user_status_parts = session_match.group(4).split('/')
+            user_affiliation = user_status_parts[1] if len(user_status_parts) > 1 else None
+            key = (session_match.group(1), session_match.group(2), session_match.group(3))
+            current_session = current_snapshot.sessions.get(key)
+            if current_session is None:
+                current_session = SessionHistogram(*key, user_status_parts[0], user_affiliation)
+                current_snapshot.sessions[key] = current_session
+            continue
+        histogram_match = HISTOGRAM_PATTERN.match(line)
+        if histogram_match and current_session is not None:
+            size_min_str, size_max_str = histogram_match.group(1), histogram_match.group(2)
+            key = (convert_to_bytes(size_min_str), convert_to_bytes(size_max_str), f"[{size_min_str}, {size_max_str})")
+            current_session.counts[key] = int(histogram_match.group(3))
+    if current_snapshot is not None:
+        yield current_snapshot
+
+
+def mutations(line, count, seed=0):
+    """Yield `count` copies of `line` with a character deleted, duplicated or replaced"""
+    rng = random.Random(seed)
+    alphabet = '[](), |@0123456789KMG\t²١-'
+    for _ in range(count):
+        i = rng.randrange(len(line))
+        operation = rng.randrange(3)
+        if operation == 0:
+            yield line[:i] + line[i + 1:]
+        elif operation == 1:
+            yield line[:i] + line[i] + line[i:]
+        else:
+            yield line[:i] + rng.choice(alphabet) + line[i + 1:]
+
+
+def test_tokenizer_matches_the_pattern():
+    lines = MALFORMED_LINES + list(mutations("[512K, 1M)     4096 |@@@@@@     |", 5000))
+    # iter_log_snapshots only hands stripped lines starting with [ to the tokenizer
+    lines = [line for line in lines if line.startswith('[') and line == line.strip()]
+    for line in lines:
+        match = HISTOGRAM_PATTERN.match(line)
+        expected = None
+        if match is not None:
+            size_min_str, size_max_str = match.group(1), match.group(2)
+            expected = ((convert_to_bytes(size_min_str), convert_to_bytes(size_max_str),
+                         f"[{size_min_str}, {size_max_str})"), int(match.group(3)))
+        assert parse_histogram_line(line) == expected, line
+
+
+def test_snapshots_match_the_regex_parser():
+    lines = SAMPLE_LOG.splitlines(keepends=True)
+    # Malformed lines inside a session, and a histogram line before any session
+    lines[2:2] = [line + '\n' for line in MALFORMED_LINES]
+    lines.insert(1, "[1K, 2K)    99 |@@   |\n")
+    expected = list(iter_log_snapshots_with_regexes(lines))
+    assert list(iter_log_snapshots(lines)) == expected
+    assert len(expected) == 3
+    assert expected[0].sessions[('gpu01', 'gpu', 'alice')].counts[(1024, 2048, '[1K, 2K)')] == 150
+    assert expected[0].sessions[('gpu01', 'gpu', 'alice')].counts[(0, 0, '[4X, 8Y)')] == 12
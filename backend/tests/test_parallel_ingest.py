@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from backend.database import schema
+from backend.parsers import log_parser
+from backend.tests.conftest import NEXT_SNAPSHOTS, SAMPLE_LOG, data_table_rows
+
+
+@pytest.fixture
+def log_paths(tmp_path):
+    """Three log files, the second repeating the last snapshot of the first"""
+    paths = []
+    for name, text in (('a.log', SAMPLE_LOG), ('b.log', SAMPLE_LOG.split('\n\n')[-1] + NEXT_SNAPSHOTS),
+                       ('c.log', SAMPLE_LOG.replace('2025-01-0', '2025-02-0').replace('17361', '17387'))):
+        path = tmp_path / name
+        path.write_text(text)
+        paths.append(str(path))
+    return paths
+
+
+def ingest(db_path, log_paths, workers, **kwargs):
+    schema.initialize_database(db_path)
+    conn = schema.get_db_connection(db_path)
+    try:
+        if workers == 1:
+            return [log_parser.process_log_file(conn, path, verbose=False) for path in log_paths]
+        return list(log_parser.process_log_files_parallel(conn, log_paths, workers, **kwargs))
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    # Every file split into chunks, parsed with a single task in flight
+    {'chunk_min_bytes': 0, 'max_pending': 1},
+])
+def test_parallel_ingest_matches_sequential_ingest(tmp_path, log_paths, kwargs):
+    sequential, parallel = str(tmp_path / 'sequential.db'), str(tmp_path / 'parallel.db')
+    assert ingest(sequential, log_paths, 1) == [True] * 3
+    # One result per file, in the order of the files
+    assert ingest(parallel, log_paths, 2, **kwargs) == [True] * 3
+    assert data_table_rows(parallel) == data_table_rows(sequential)
+
+
+def test_failed_file_does_not_stop_the_others(tmp_path, log_paths):
+    with open(log_paths[1], 'ab') as file:
+        file.write(b'\xff\n')
+    db_path = str(tmp_path / 'parallel.db')
+    assert ingest(db_path, log_paths, 2, chunk_min_bytes=0, max_pending=1) == [True, False, True]
+
+
+def test_bounded_tasks_wait_for_a_free_slot():
+    pending = threading.Semaphore(2)
+    stopped = threading.Event()
+    tasks = log_parser._iter_bounded_tasks(iter(range(5)), pending, stopped)
+    assert [next(tasks), next(tasks)] == [0, 1]
+
+    fed = []
+    feeder = threading.Thread(target=lambda: fed.extend(tasks))
+    feeder.start()
+    feeder.join(0.1)
+    assert feeder.is_alive() and fed == []
+
+    # A freed slot lets one more task through
+    pending.release()
+    deadline = time.monotonic() + 1
+    while not fed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert fed == [2]
+
+    stopped.set()
+    pending.release()
+    feeder.join(1)
+    assert not feeder.is_alive() and fed == [2]
+
+
+def header_offsets(text):
+    return [i for i in range(len(text)) if text.startswith('Log: 2025', i) and (i == 0 or text[i - 1] == '\n')]
+
+
+def assert_chunks_cover_the_file(path, text, chunk_count):
+    boundaries = log_parser.find_snapshot_boundaries(path, chunk_count)
+    assert len(boundaries) <= chunk_count
+    assert [start for start, _ in boundaries][1:] == [end for _, end in boundaries][:-1]
+    assert boundaries[0][0] == 0 and boundaries[-1][1] == len(text)
+    assert set(start for start, _ in boundaries[1:]) <= set(header_offsets(text))
+
+    chunked = [snapshot for start, end in boundaries
+               for snapshot in log_parser.parse_log_chunk((path, start, end))[1]]
+    assert chunked == list(log_parser.iter_log_snapshots(text.splitlines(keepends=True)))
+    return boundaries
+
+
+def test_snapshot_boundaries_are_headers(tmp_path):
+    # A line that starts like a header but is not one must not become a boundary
+    text = SAMPLE_LOG.replace('[4K, 8K)               7', 'Log: rotated\n[4K, 8K)               7') + NEXT_SNAPSHOTS
+    path = tmp_path / 'rd_client.log'
+    path.write_text(text)
+    for chunk_count in range(1, len(text) + 2):
+        assert_chunks_cover_the_file(str(path), text, chunk_count)
+    assert len(log_parser.find_snapshot_boundaries(str(path), 100)) == 5
+
+
+def test_header_straddling_a_split_point_starts_the_next_chunk(tmp_path):
+    third_header = SAMPLE_LOG.index('Log: 2025-01-07')
+    # Pad the file with blank lines until its middle falls inside the third header
+    padding = 2 * (third_header + 10) - len(SAMPLE_LOG)
+    assert padding >= 0
+    text = SAMPLE_LOG + '\n' * padding
+    path = tmp_path / 'rd_client.log'
+    path.write_text(text)
+    assert len(text) // 2 == third_header + 10
+    assert assert_chunks_cover_the_file(str(path), text, 2) == [(0, len(text))]
+
+    # Splitting one byte before the header starts the second chunk at it
+    text = SAMPLE_LOG + '\n' * (2 * third_header - 2 - len(SAMPLE_LOG))
+    path.write_text(text)
+    assert assert_chunks_cover_the_file(str(path), text, 2) == [(0, third_header), (third_header, len(text))]
+
+
+def test_empty_file_has_no_chunks(tmp_path):
+    path = tmp_path / 'rd_client.log'
+    path.write_text('')
+    assert log_parser.find_snapshot_boundaries(str(path), 4) == []
@@ -0,0 +1,48 @@
+from backend.api.response_cache import ResponseCache
+
+
+def test_least_recently_used_entries_are_evicted_beyond_the_byte_budget():
+    cache = ResponseCache(max_bytes=10)
+    cache.put(1, 'a', b'aaaa', 'application/json')
+    cache.put(1, 'b', b'bbbb', 'application/json')
+    assert cache.get(1, 'a') == (b'aaaa', 'application/json')
+    # 'b' is now the least recently used entry
+    cache.put(1, 'c', b'cccc', 'application/json')
+    assert cache.get(1, 'b') is None
+    assert cache.get(1, 'a') is not None and cache.get(1, 'c') is not None
+
+    # Replacing an entry counts only its new size
+    cache.put(1, 'c', b'cc', 'application/json')
+    stats = cache.stats()
+    assert (stats['entries'], stats['bytes'], stats['evictions']) == (2, 6, 1)
+
+    # A body larger than the whole budget is not stored and evicts nothing
+    cache.put(1, 'd', b'd' * 11, 'application/json')
+    assert cache.get(1, 'd') is None
+    assert cache.stats()['entries'] == 2
+
+
+def test_a_newer_generation_drops_every_entry():
+    cache = ResponseCache(max_bytes=100)
+    cache.put(1, 'a', b'aaaa', 'application/json')
+    assert cache.get(2, 'a') is None
+    assert cache.stats()['bytes'] == 0 and cache.stats()['generation'] == 2
+
+    # A response computed from an older generation is not stored
+    cache.put(1, 'a', b'aaaa', 'application/json')
+    assert cache.get(1, 'a') is None
+    assert cache.get(2, 'a') is None
+    cache.put(2, 'a', b'aaaa', 'application/json')
+    assert cache.get(2, 'a') is not None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 3)
+    assert stats['hit_rate'] == 0.25
+
+
+def test_clear_forgets_the_generation():
+    cache = ResponseCache(max_bytes=100)
+    cache.put(5, 'a', b'aaaa', 'application/json')
+    cache.clear()
+    cache.put(1, 'a', b'aaaa', 'application/json')
+    assert cache.get(1, 'a') == (b'aaaa', 'application/json')
@@ -0,0 +1,193 @@
+import sqlite3
+
+import pytest
+
+from backend.database import queries, schema
+from backend.database.cubes import NO_ROLE
+from backend.database.histograms import encode_histogram
+
+# Tables of the schema before SessionRollups, the cubes and the counters existed
+BASELINE_SCHEMA = """
+CREATE TABLE LogEntries (
+    log_id INTEGER PRIMARY KEY,
+    timestamp DATETIME NOT NULL,
+    unix_timestamp INTEGER NOT NULL,
+    UNIQUE(unix_timestamp)
+);
+CREATE TABLE Users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    user_role TEXT,
+    user_affiliation TEXT,
+    full_name TEXT,
+    title TEXT,
+    image_url TEXT,
+    is_alumni INTEGER DEFAULT 0,
+    last_updated DATETIME,
+    UNIQUE(username)
+);
+CREATE TABLE Machines (
+    machine_id INTEGER PRIMARY KEY,
+    machine_name TEXT NOT NULL,
+    machine_type TEXT NOT NULL,
+    UNIQUE(machine_name, machine_type)
+);
+CREATE TABLE IOSizeRanges (
+    range_id INTEGER PRIMARY KEY,
+    min_bytes INTEGER NOT NULL,
+    max_bytes INTEGER NOT NULL,
+    display_text TEXT NOT NULL,
+    UNIQUE(min_bytes, max_bytes)
+);
+CREATE TABLE UserSessions (
+    session_id INTEGER PRIMARY KEY,
+    log_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    machine_id INTEGER NOT NULL,
+    UNIQUE(log_id, user_id, machine_id)
+);
+CREATE TABLE IOOperations (
+    operation_id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    range_id INTEGER NOT NULL,
+    operation_count INTEGER NOT NULL,
+    UNIQUE(session_id, range_id)
+);
+"""
+
+BASELINE_DATA = """
+INSERT INTO LogEntries VALUES
+    (1, '2025-01-06 10:00:00', 1736157600), (2, '2025-01-06 11:00:00', 1736161200), (3, '2025-01-07 09:30:00', 1736242200);
+INSERT INTO Users (user_id, username, user_role) VALUES (1, 'alice', 'student'), (2, 'bob', 'staff');
+INSERT INTO Machines VALUES (1, 'gpu01', 'gpu'), (2, 'cpu01', 'cpu');
+INSERT INTO IOSizeRanges VALUES (1, 0, 4096, '0-4K'), (2, 4096, 65536, '4K-64K'), (3, 65536, 1048576, '64K-1M');
+INSERT INTO UserSessions VALUES (1, 1, 1, 1), (2, 1, 2, 2), (3, 2, 1, 1), (4, 2, 1, 2), (5, 3, 2, 1);
+INSERT INTO IOOperations (session_id, range_id, operation_count) VALUES
+    (1, 1, 100), (1, 2, 50), (2, 3, 7), (3, 1, 20), (3, 3, 0), (4, 2, 300), (5, 1, 1), (5, 2, 2), (5, 3, 3);
+"""
+
+# The raw tables joined the way the queries read them before the rollups
+RAW_OPERATIONS = """
+FROM IOOperations io
+JOIN UserSessions us ON us.session_id = io.session_id
+JOIN LogEntries l ON l.log_id = us.log_id
+JOIN Users u ON u.user_id = us.user_id
+JOIN Machines m ON m.machine_id = us.machine_id
+JOIN IOSizeRanges r ON r.range_id = io.range_id
+"""
+
+
+@pytest.fixture
+def upgraded_db(tmp_path):
+    """A database with the baseline schema and data, initialized with the current schema"""
+    db_path = str(tmp_path / 'baseline.db')
+    conn = sqlite3.connect(db_path)
+    conn.executescript(BASELINE_SCHEMA + BASELINE_DATA)
+    conn.close()
+    schema.initialize_database(db_path)
+    return db_path
+
+
+def raw(db_path, sql, params=()):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def test_upgrade_builds_rollups(upgraded_db):
+    sessions = raw(upgraded_db, "SELECT COUNT(DISTINCT session_id) FROM IOOperations")[0][0]
+    rollups = raw(upgraded_db, "SELECT COUNT(*) FROM SessionRollups")[0][0]
+    assert rollups == sessions
+
+
+def test_upgrade_keeps_stats(upgraded_db):
+    stats = queries.get_database_stats(upgraded_db)
+    assert stats['total_operations'] == raw(upgraded_db, f"SELECT SUM(io.operation_count) {RAW_OPERATIONS}")[0][0]
+    assert stats['log_count'] == 3
+    assert stats['session_count'] == 5
+
+
+def test_upgrade_keeps_time_usage(upgraded_db):
+    expected = raw(upgraded_db, f"""
+    SELECT l.timestamp, SUM(io.operation_count), COUNT(DISTINCT us.user_id), COUNT(DISTINCT us.machine_id)
+    {RAW_OPERATIONS} GROUP BY l.timestamp ORDER BY l.timestamp
+    """)
+    time_series = queries.get_time_usage(upgraded_db)['time_series']
+    assert [(point['timestamp'], point['total_operations'], point['active_users'], point['active_machines'])
+            for point in time_series] == expected
+
+
+def test_upgrade_keeps_user_and_machine_usage(upgraded_db):
+    for username in ('alice', 'bob'):
+        expected = raw(upgraded_db, f"""
+        SELECT l.timestamp, SUM(io.operation_count) {RAW_OPERATIONS}
+        WHERE u.username = ? GROUP BY l.timestamp ORDER BY l.timestamp
+        """, (username,))
+        usage = queries.get_user_usage(upgraded_db, username=username)
+        assert [(point['timestamp'], point['total_operations']) for point in usage['time_series']] == expected
+
+    expected = raw(upgraded_db, f"""
+    SELECT r.display_text, SUM(io.operation_count) {RAW_OPERATIONS}
+    WHERE m.machine_name = 'gpu01' GROUP BY r.range_id HAVING SUM(io.operation_count) > 0 ORDER BY r.range_id
+    """)
+    usage = queries.get_machine_usage(upgraded_db, machine_name='gpu01')
+    assert [(row['display_text'], row['total_operations']) for row in usage['io_distribution']] == expected
+
+
+def test_upgrade_keeps_patterns_and_size_distribution(upgraded_db):
+    expected = raw(upgraded_db, f"""
+    SELECT strftime('%H', l.timestamp), SUM(io.operation_count) {RAW_OPERATIONS}
+    GROUP BY 1 ORDER BY 1
+    """)
+    hourly = queries.get_time_usage(upgraded_db)['hourly_pattern']
+    assert [(row['hour'], row['total_operations']) for row in hourly] == expected
+
+    expected = raw(upgraded_db, f"""
+    SELECT r.display_text, SUM(io.operation_count) {RAW_OPERATIONS}
+    GROUP BY r.range_id ORDER BY r.range_id
+    """)
+    overall = queries.get_size_distribution(upgraded_db)['overall']
+    assert [(row['display_text'], row['total_operations']) for row in overall] == expected
+
+
+def test_initialize_is_idempotent(upgraded_db):
+    before = queries.get_time_usage(upgraded_db)
+    schema.initialize_database(upgraded_db)
+    assert raw(upgraded_db, "SELECT COUNT(*) FROM SessionRollups")[0][0] == 5
+    assert queries.get_time_usage(upgraded_db) == before
+
+
+def test_upgrade_adds_bucket_count(tmp_path):
+    db_path = str(tmp_path / 'packed.db')
+    conn = sqlite3.connect(db_path)
+    conn.executescript(BASELINE_SCHEMA + BASELINE_DATA + """
+    CREATE TABLE SessionHistograms (session_id INTEGER PRIMARY KEY, total_operations INTEGER NOT NULL,
+                                    histogram BLOB NOT NULL);
+    CREATE TABLE StatsCounters (name TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID;
+    INSERT INTO StatsCounters VALUES ('operation_count', 1);
+    """)
+    conn.execute("INSERT INTO SessionHistograms VALUES (6, 12, ?)", (encode_histogram([0, 12, 0]),))
+    conn.commit()
+    conn.close()
+    schema.initialize_database(db_path)
+
+    assert raw(db_path, "SELECT bucket_count FROM SessionHistograms")[0][0] == 1
+    assert queries.get_database_stats(db_path)['operation_count'] == 9 + 1
+
+
+def test_upgrade_moves_users_without_a_role_out_of_the_empty_role(sample_db):
+    conn = sqlite3.connect(sample_db)
+    conn.execute("UPDATE Users SET user_role = NULL WHERE username = 'carol'")
+    # The cubes as built before NO_ROLE, with carol under the empty role
+    conn.execute("UPDATE UsagePatterns SET user_role = '' WHERE user_role = 'guest'")
+    conn.execute("UPDATE SizeDistribution SET user_role = '' WHERE user_role = 'guest'")
+    conn.commit()
+    conn.close()
+    schema.initialize_database(sample_db)
+
+    assert raw(sample_db, "SELECT DISTINCT user_role FROM SizeDistribution ORDER BY 1") == [
+        (NO_ROLE,), ('staff',), ('student',)
+    ]
+    assert queries.get_time_usage(sample_db, user_role='')['hourly_pattern'] == []
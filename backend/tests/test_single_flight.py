@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+from backend.utils.single_flight import get_single_flight_stats, single_flight
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def run_concurrently(function, count):
+    """Call `function` in `count` threads, returning the threads and a list of their outcomes"""
+    outcomes = []
+
+    def call():
+        try:
+            outcomes.append(('result', function()))
+        except Exception as e:
+            outcomes.append(('error', e))
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def test_followers_get_the_leaders_error():
+    release = threading.Event()
+    executions = []
+
+    @single_flight
+    def failing_query(db_path):
+        executions.append(db_path)
+        release.wait()
+        raise RuntimeError('database is locked')
+
+    threads, outcomes = run_concurrently(lambda: failing_query('io_usage.db'), 4)
+    wait_for(lambda: get_single_flight_stats()['failing_query']['waiting'] == 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert executions == ['io_usage.db']
+    assert [kind for kind, _ in outcomes] == ['error'] * 4
+    # Every caller gets the leader's exception
+    assert len({id(error) for _, error in outcomes}) == 1
+    assert str(outcomes[0][1]) == 'database is locked'
+    stats = get_single_flight_stats()['failing_query']
+    assert (stats['calls'], stats['executions'], stats['coalesced'], stats['waiting']) == (4, 1, 3, 0)
+
+    # The failure is not kept: the next call runs again
+    with pytest.raises(RuntimeError):
+        failing_query('io_usage.db')
+    assert len(executions) == 2
+
+
+def test_followers_share_the_result_of_equal_arguments_only():
+    release = threading.Event()
+    executions = []
+
+    @single_flight
+    def slow_query(db_path, top_n=None):
+        executions.append((db_path, top_n))
+        release.wait()
+        return [db_path, top_n]
+
+    threads, outcomes = run_concurrently(lambda: slow_query('io_usage.db', top_n=5), 3)
+    wait_for(lambda: get_single_flight_stats()['slow_query']['waiting'] == 2)
+    other_threads, other_outcomes = run_concurrently(lambda: slow_query('io_usage.db', top_n=10), 1)
+    wait_for(lambda: len(executions) == 2)
+    release.set()
+    for thread in threads + other_threads:
+        thread.join()
+
+    assert sorted(executions) == [('io_usage.db', 5), ('io_usage.db', 10)]
+    assert outcomes == [('result', ['io_usage.db', 5])] * 3
+    assert other_outcomes == [('result', ['io_usage.db', 10])]
@@ -0,0 +1,31 @@
+from backend.database import schema
+from backend.database.queries import get_size_distribution
+from backend.parsers.log_parser import parse_and_store_log_data
+from backend.tests.conftest import SAMPLE_LOG
+
+
+EMPTY_ROLE_SNAPSHOT = """\
+Log: 2025-01-08 09:00:00 (1736323200)
+@rd_client(cpu01,cpu)[dave(/x)]:
+[512, 1K)              4 |@                                                   |
+"""
+
+
+def test_users_without_a_role_are_left_out_of_by_role(db_path):
+    conn = schema.get_db_connection(db_path)
+    try:
+        # Created without a role by fetch_members before carol's first session is ingested
+        conn.execute("INSERT INTO Users (username) VALUES ('carol')")
+        conn.commit()
+        parse_and_store_log_data(conn, SAMPLE_LOG + EMPTY_ROLE_SNAPSHOT)
+    finally:
+        conn.close()
+
+    size_dist = get_size_distribution(db_path)
+    # dave's role is the empty string, which is listed like any other role
+    assert sorted(size_dist['by_role']) == ['', 'staff', 'student']
+    assert size_dist['by_role'][''] == [{'display_text': '[512, 1K)', 'total_operations': 4}]
+    overall = {row['display_text']: row['total_operations'] for row in size_dist['overall']}
+    assert overall['[512, 1K)'] == 17
+    by_machine_type = {row['display_text']: row['total_operations'] for row in size_dist['by_machine_type']['cpu']}
+    assert by_machine_type == {'[512, 1K)': 5, '[1K, 2K)': 2, '[4K, 8K)': 7}
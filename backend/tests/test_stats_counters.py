@@ -0,0 +1,69 @@
+import pytest
+
+from backend.database import queries, schema, stats_counters
+from backend.database.histograms import pack_histograms
+from backend.database.snapshot_writer import SnapshotWriter
+from backend.parsers.log_parser import parse_and_store_log_data
+from backend.tests.conftest import SAMPLE_LOG, SAMPLE_LOG_OPERATION_ROWS
+
+
+def ingest(db_path, histogram_storage, skip_existing=True):
+    conn = schema.get_db_connection(db_path)
+    try:
+        writer = SnapshotWriter(conn, histogram_storage=histogram_storage)
+        parse_and_store_log_data(conn, SAMPLE_LOG, writer=writer, skip_existing=skip_existing)
+    finally:
+        conn.close()
+
+
+def assert_counters_match(db_path):
+    conn = schema.get_db_connection(db_path)
+    try:
+        assert stats_counters.verify_counters(conn) == {}
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('histogram_storage', ['rows', 'packed'])
+def test_operation_count_counts_zero_buckets(db_path, histogram_storage):
+    ingest(db_path, histogram_storage)
+    stats = queries.get_database_stats(db_path)
+    assert stats['operation_count'] == SAMPLE_LOG_OPERATION_ROWS
+    assert stats['log_count'] == 3
+    assert stats['session_count'] == 5
+    assert stats['total_operations'] == 12 + 150 + 7 + 20 + 3 + 1 + 2
+    assert_counters_match(db_path)
+
+
+@pytest.mark.parametrize('histogram_storage', ['rows', 'packed'])
+def test_reimport_keeps_operation_count(db_path, histogram_storage):
+    ingest(db_path, histogram_storage)
+    ingest(db_path, histogram_storage, skip_existing=False)
+    assert queries.get_database_stats(db_path)['operation_count'] == SAMPLE_LOG_OPERATION_ROWS
+    assert_counters_match(db_path)
+
+
+def test_packing_keeps_operation_count(db_path):
+    ingest(db_path, 'rows')
+    conn = schema.get_db_connection(db_path)
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        assert pack_histograms(conn) == 5
+        conn.commit()
+        assert conn.execute("SELECT COUNT(*) FROM IOOperations").fetchone()[0] == 0
+    finally:
+        conn.close()
+    assert queries.get_database_stats(db_path)['operation_count'] == SAMPLE_LOG_OPERATION_ROWS
+    assert_counters_match(db_path)
+
+    # Rows of a re-imported snapshot are packed over the existing histograms
+    ingest(db_path, 'rows', skip_existing=False)
+    conn = schema.get_db_connection(db_path)
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        pack_histograms(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    assert queries.get_database_stats(db_path)['operation_count'] == SAMPLE_LOG_OPERATION_ROWS
+    assert_counters_match(db_path)
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+from flask import Flask
+
+from backend.api.streaming import stream_array, stream_object
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def rows(count, fail_at=None):
+    for i in range(count):
+        if i == fail_at:
+            raise RuntimeError('database is locked')
+        yield {'row': i}
+
+
+def body(response):
+    return response.get_data(as_text=True)
+
+
+def test_array_and_ndjson(app):
+    with app.test_request_context():
+        assert json.loads(body(stream_array(rows(3)))) == [{'row': 0}, {'row': 1}, {'row': 2}]
+        assert json.loads(body(stream_array(rows(0)))) == []
+        response = stream_array(rows(2), ndjson=True)
+        assert response.mimetype == 'application/x-ndjson'
+        assert [json.loads(line) for line in body(response).splitlines()] == [{'row': 0}, {'row': 1}]
+
+
+def test_object_keeps_pair_order(app):
+    with app.test_request_context():
+        pairs = (('b', 1), ('a', {'y': 2, 'x': 1}))
+        assert body(stream_object(pairs)) == '{"b":1,"a":{"x":1,"y":2}}'
+
+
+def test_first_row_error_raises_before_the_response(app):
+    with app.test_request_context():
+        with pytest.raises(RuntimeError):
+            stream_array(rows(3, fail_at=0))
+        with pytest.raises(RuntimeError):
+            stream_object((f'user{row["row"]}', row) for row in rows(3, fail_at=0))
+
+
+def test_error_after_the_response_started_ends_with_an_error_record(app):
+    with app.test_request_context():
+        assert json.loads(body(stream_array(rows(3, fail_at=2)))) == [
+            {'row': 0}, {'row': 1}, {'error': 'database is locked'}
+        ]
+        lines = body(stream_array(rows(3, fail_at=1), ndjson=True)).splitlines()
+        assert [json.loads(line) for line in lines] == [{'row': 0}, {'error': 'database is locked'}]
+        pairs = ((f'user{row["row"]}', row) for row in rows(3, fail_at=1))
+        assert json.loads(body(stream_object(pairs))) == {'user0': {'row': 0}, '@error': 'database is locked'}
+
+
+def test_object_entry_named_error_is_not_an_error_record(app):
+    with app.test_request_context():
+        pairs = (('error', {'row': 0}), ('alice', {'row': 1}))
+        assert json.loads(body(stream_object(pairs))) == {'error': {'row': 0}, 'alice': {'row': 1}}
@@ -0,0 +1,79 @@
+"""
+Downsampling of time series for charts.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Select `threshold` points of the series (x, y) with Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. The others are split into threshold - 2 buckets
+    and from each bucket the point forming the largest triangle with the previously selected
+    point and the average of the next bucket is kept, which preserves peaks and troughs.
+    Returns the indices of the selected points in ascending order.
+    """
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        raise ValueError("LTTB needs at least 3 points")
+
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket, the last point for the last bucket
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(areas.argmax())
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def downsample_indices(timestamps: List[str], values: List[float], max_points: int) -> Sequence[int]:
+    """
+    Return the indices of the points to keep to reduce a time series, given as parallel lists of
+    timestamps in ascending order ('YYYY-MM-DD HH:MM:SS' strings or unix times) and values, to at
+    most `max_points` points with LTTB. All points are kept if `max_points` is None or the series is shorter.
+    """
+    if max_points is not None and max_points < 3:
+        raise ValueError("max_points must be at least 3")
+    if max_points is None or len(timestamps) <= max_points:
+        return range(len(timestamps))
+    x = np.array(timestamps, dtype='datetime64[s]').astype(np.float64)
+    y = np.array([value or 0 for value in values], dtype=np.float64)
+    return lttb_indices(x, y, max_points)
+
+
+def downsample_series(series: List[dict], max_points: int, value_key: str = 'total_operations',
+                      time_key: str = 'timestamp') -> List[dict]:
+    """Downsample a time series of dicts with LTTB on `value_key`, see downsample_indices"""
+    indices = downsample_indices([point[time_key] for point in series], [point[value_key] for point in series],
+                                 max_points)
+    return [series[i] for i in indices]
+
+
+def downsample_columns(timestamps: List[str], values: List[float], max_points: int) -> Tuple[List[str], List[float]]:
+    """Downsample a time series given as parallel lists with LTTB, see downsample_indices"""
+    indices = downsample_indices(timestamps, values, max_points)
+    return [timestamps[i] for i in indices], [values[i] for i in indices]
+
+
+def downsample_table(columns: Dict[str, list], max_points: int, value_key: str = 'total_operations',
+                     time_key: str = 'timestamp') -> Dict[str, list]:
+    """Downsample a time series given as a dict of parallel column lists with LTTB on `value_key`"""
+    indices = downsample_indices(columns[time_key], columns[value_key], max_points)
+    if isinstance(indices, range):
+        return columns
+    return {name: [values[i] for i in indices] for name, values in columns.items()}
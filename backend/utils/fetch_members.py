@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Script to fetch DISCO members from the website and update the database.
-Designed to run as a weekly scheduled task.
+Designed to run as a weekly scheduled task, from the repository root:
+python -m backend.utils.fetch_members
 """
 
 import os
@@ -13,13 +14,14 @@ import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
 
-# Set up the parent directory in path for imports
+# The backend directory, member_sync.log is written to its logs directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
-sys.path.insert(0, parent_dir)
 
-from database.schema import get_db_connection, initialize_database
-from config import DB_PATH
+from backend.config import DB_PATH
+from backend.database.data_generation import bump_generation
+from backend.database.schema import get_db_connection, initialize_database
+from backend.database.stats_counters import add_to_counters
 
 # Set up logging
 logging.basicConfig(
@@ -259,8 +261,10 @@ def update_user_database(conn, members):
                 member['is_alumni'],
                 member['last_updated']
             ))
+            add_to_counters(conn, user_count=1)
             inserted += 1
     
+    bump_generation(conn)
     conn.commit()
     logger.info(f"Database updated: {inserted} new users inserted, {updated} existing users updated, {skipped} entries skipped")
     return inserted, updated, skipped
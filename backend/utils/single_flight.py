@@ -0,0 +1,98 @@
+"""
+Coalescing of concurrent identical calls.
+
+A function decorated with `single_flight` runs at most once at a time per set of arguments:
+calls made while an identical call is running wait for it and return its result (or raise its
+exception) instead of computing it again. Results are not kept once the running call finishes,
+so this only merges overlapping calls and never serves stale data.
+"""
+import threading
+import time
+from functools import wraps
+from typing import Dict
+
+_lock = threading.Lock()
+# Running calls by (function, args, kwargs)
+_flights: Dict[tuple, '_Flight'] = {}
+# Counters per function name, see get_single_flight_stats
+_stats: Dict[str, dict] = {}
+
+
+class _Flight:
+    """A running call and the callers waiting for it"""
+
+    def __init__(self):
+        self.finished = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+def _function_stats(name: str) -> dict:
+    """Return the counters of a function. Must be called with the lock held."""
+    if name not in _stats:
+        _stats[name] = {'calls': 0, 'executions': 0, 'coalesced': 0, 'waiting': 0, 'saved_seconds': 0.0}
+    return _stats[name]
+
+
+def single_flight(function):
+    """Let concurrent calls of `function` with equal, hashable arguments share one execution"""
+    name = function.__name__
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return function(*args, **kwargs)
+
+        with _lock:
+            stats = _function_stats(name)
+            stats['calls'] += 1
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _flights[key] = _Flight()
+                stats['executions'] += 1
+            else:
+                flight.waiters += 1
+                stats['waiting'] += 1
+
+        if not leader:
+            flight.finished.wait()
+            with _lock:
+                stats['waiting'] -= 1
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        started = time.perf_counter()
+        try:
+            flight.result = function(*args, **kwargs)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with _lock:
+                del _flights[key]
+                # Every waiter was spared a computation of about the same length
+                stats['coalesced'] += flight.waiters
+                stats['saved_seconds'] += elapsed * flight.waiters
+            flight.finished.set()
+
+    return wrapper
+
+
+def get_single_flight_stats() -> dict:
+    """
+    Return per function: calls, executions, calls that shared another call's execution
+    (coalesced), callers waiting right now and the computation time the coalesced calls saved
+    """
+    with _lock:
+        return {
+            name: {**stats, 'saved_seconds': round(stats['saved_seconds'], 3)}
+            for name, stats in sorted(_stats.items())
+        }
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import api from '../../services/api';
+import api, { MAX_CHART_POINTS } from '../../services/api';
 import LoadingSpinner from '../common/LoadingSpinner';
 import ErrorMessage from '../common/ErrorMessage';
 import formatCETDate from '../common/formatCETDate';
@@ -53,7 +53,7 @@ const HourlyIOChart = () => {
     const fetchTimeData = async () => {
       try {
         setLoading(true);
-        const data = await api.getTimeUsage();
+        const data = await api.getTimeUsage({ max_points: MAX_CHART_POINTS, format: 'columns' });
         setTimeData(data);
         setLoading(false);
       } catch (error) {
@@ -72,28 +72,26 @@ const HourlyIOChart = () => {
     }
   };
 
-  // Format timestamp for display
-  const formatTimestamp = (timestamp) => {
-    return formatCETDate(timestamp);
+  // Format a unix time for display
+  const formatTimestamp = (unixTime) => {
+    return formatCETDate(unixTime * 1000);
   };
 
   // Prepare chart data from time series
   const prepareChartData = () => {
-    if (!timeData || !timeData.time_series || timeData.time_series.length === 0) {
+    if (!timeData || !timeData.time_series || timeData.time_series.timestamp.length === 0) {
       return null;
     }
 
-    // Sort time series by timestamp
-    const sortedData = [...timeData.time_series].sort((a, b) => 
-      new Date(a.timestamp) - new Date(b.timestamp)
-    );
+    // The columns come sorted by time, with timestamps as unix times
+    const series = timeData.time_series;
 
     return {
-      labels: sortedData.map(item => formatTimestamp(item.timestamp)),
+      labels: series.timestamp.map(formatTimestamp),
       datasets: [
         {
           label: 'IO Operations',
-          data: sortedData.map(item => item.total_operations),
+          data: series.total_operations,
           fill: false,
           borderColor: '#3498db',
           backgroundColor: 'rgba(52, 152, 219, 0.2)',
@@ -104,7 +102,7 @@ const HourlyIOChart = () => {
         },
         {
           label: 'Active Users',
-          data: sortedData.map(item => item.active_users * 100), // Scale for visibility
+          data: series.active_users.map(users => users * 100), // Scale for visibility
           fill: false,
           borderColor: '#2ecc71',
           backgroundColor: 'rgba(46, 204, 113, 0.2)',
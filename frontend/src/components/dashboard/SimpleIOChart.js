@@ -10,7 +10,7 @@ import {
   Tooltip,
   Legend,
 } from 'chart.js';
-import api from '../../services/api';
+import api, { MAX_CHART_POINTS } from '../../services/api';
 import LoadingSpinner from '../common/LoadingSpinner';
 import ErrorMessage from '../common/ErrorMessage';
 import formatCETDate from '../common/formatCETDate';
@@ -35,7 +35,7 @@ const SimpleIOChart = () => {
     const fetchTimeData = async () => {
       try {
         setLoading(true);
-        const data = await api.getTimeUsage();
+        const data = await api.getTimeUsage({ max_points: MAX_CHART_POINTS, format: 'columns' });
         setTimeData(data);
         setLoading(false);
       } catch (error) {
@@ -48,27 +48,21 @@ const SimpleIOChart = () => {
     fetchTimeData();
   }, []);
 
-  // Format date for chart display - same approach as UserDetail.js
-  const formatDate = (dateString) => {
-    return formatCETDate(dateString, { month: 'short', day: 'numeric' });
+  // Format a unix time for chart display - same approach as UserDetail.js
+  const formatDate = (unixTime) => {
+    return formatCETDate(unixTime * 1000, { month: 'short', day: 'numeric' });
   };
 
   // Prepare chart data
   const prepareChartData = () => {
-    if (!timeData || !timeData.time_series || timeData.time_series.length === 0) {
+    if (!timeData || !timeData.time_series || timeData.time_series.timestamp.length === 0) {
       return null;
     }
 
-    // Sort time series by timestamp
-    const sortedData = [...timeData.time_series].sort((a, b) => 
-      new Date(a.timestamp) - new Date(b.timestamp)
-    );
-
-    const labels = sortedData.map(item => formatDate(item.timestamp));
-    const operations = sortedData.map(item => item.total_operations);
-    
-    // Store original timestamps in an additional array for tooltips
-    const timestamps = sortedData.map(item => item.timestamp);
+    // The columns come sorted by time, with timestamps as unix times
+    const timestamps = timeData.time_series.timestamp;
+    const labels = timestamps.map(formatDate);
+    const operations = timeData.time_series.total_operations;
     
     return {
       labels,
@@ -106,7 +100,7 @@ const SimpleIOChart = () => {
             const timestamp = context[0].dataset.timestamps[dataIndex];
             
             // Format with hour precision
-            const date = new Date(timestamp);
+            const date = new Date(timestamp * 1000);
             return date.toLocaleString('en-US', {
               year: 'numeric',
               month: 'short',
@@ -4,9 +4,14 @@ import LoadingSpinner from '../common/LoadingSpinner';
 import ErrorMessage from '../common/ErrorMessage';
 import formatCETDate from '../common/formatCETDate';
 
+// Number of log entries loaded per page
+const PAGE_SIZE = 50;
+
 const HistoricUsage = () => {
   const [historicData, setHistoricData] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [hasMore, setHasMore] = useState(false);
   const [error, setError] = useState(null);
   const [topN, setTopN] = useState(10);
   const [expandedLogs, setExpandedLogs] = useState({});
@@ -15,8 +20,9 @@ const HistoricUsage = () => {
   const fetchHistoricData = useCallback(async () => {
     try {
       setLoading(true);
-      const data = await api.getHistoricUsage(topN);
+      const data = await api.getHistoricUsage(topN, PAGE_SIZE);
       setHistoricData(data);
+      setHasMore(data.length === PAGE_SIZE);
       setLoading(false);
     } catch (error) {
       console.error('Error fetching historic data:', error);
@@ -28,6 +34,22 @@ const HistoricUsage = () => {
   useEffect(() => {
     fetchHistoricData();
   }, [fetchHistoricData]); // Now fetchHistoricData is properly memoized
+
+  // Load the page after the last loaded entry
+  const fetchMore = async () => {
+    try {
+      setLoadingMore(true);
+      const before = historicData[historicData.length - 1].unix_timestamp;
+      const data = await api.getHistoricUsage(topN, PAGE_SIZE, before);
+      setHistoricData(prev => [...prev, ...data]);
+      setHasMore(data.length === PAGE_SIZE);
+      setLoadingMore(false);
+    } catch (error) {
+      console.error('Error fetching historic data:', error);
+      setError(error.message || 'Failed to fetch historic usage data');
+      setLoadingMore(false);
+    }
+  };
   
   // Sort historic data by timestamp (most recent first)
   const sortedHistoricData = [...historicData].sort((a, b) => {
@@ -152,6 +174,11 @@ const HistoricUsage = () => {
               )}
             </div>
           ))}
+          {hasMore && (
+            <button className="btn" onClick={fetchMore} disabled={loadingMore}>
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          )}
         </div>
       )}
     </div>
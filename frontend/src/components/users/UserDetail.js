@@ -11,7 +11,7 @@ import {
   Tooltip,
   Legend,
 } from 'chart.js';
-import api from '../../services/api';
+import api, { MAX_CHART_POINTS } from '../../services/api';
 import LoadingSpinner from '../common/LoadingSpinner';
 import ErrorMessage from '../common/ErrorMessage';
 import UserCurrentUsage from './UserCurrentUsage';
@@ -31,7 +31,7 @@ ChartJS.register(
 const UserDetail = () => {
   const { username } = useParams();
   const [userData, setUserData] = useState(null);
-  const [timeData, setTimeData] = useState([]);
+  const [timeData, setTimeData] = useState({ timestamp: [], total_operations: [] });
   const [currentUsage, setCurrentUsage] = useState(null);
   const [runningJobs, setRunningJobs] = useState([]);
   const [jobHistory, setJobHistory] = useState([]);
@@ -46,11 +46,11 @@ const UserDetail = () => {
         setLoading(true);
         
         // Fetch user details
-        const data = await api.getUserUsage(username);
+        const data = await api.getUserUsage(username, { max_points: MAX_CHART_POINTS });
         setUserData(data);
         
         // Fetch time stats
-        const timeStats = await api.getUserTimeStats(username);
+        const timeStats = await api.getUserTimeStats(username, { max_points: MAX_CHART_POINTS, format: 'columns' });
         setTimeData(timeStats);
 
         // Fetch current usage, running jobs, and job history
@@ -193,10 +193,10 @@ const ThesisInfoDisplay = ({ thesisInfo, thesisError }) => {
   );
 };
 
-// Format date for chart display
-const formatDate = (dateString) => {
-  if (!dateString) return '';
-  const date = new Date(dateString);
+// Format a unix time for chart display
+const formatDate = (unixTime) => {
+  if (!unixTime) return '';
+  const date = new Date(unixTime * 1000);
   return date.toLocaleDateString('en-US', {
     month: 'short',
     day: 'numeric',
@@ -207,8 +207,8 @@ const formatDate = (dateString) => {
 
 // Prepare chart data
 const prepareChartData = () => {
-  const labels = timeData.map(item => formatDate(item.timestamp));
-  const operations = timeData.map(item => item.total_operations);
+  const labels = timeData.timestamp.map(formatDate);
+  const operations = timeData.total_operations;
   
   return {
     labels,
@@ -336,7 +336,7 @@ const chartOptions = {
           <h3>IO Usage Over Time</h3>
         </div>
         <div className="card-body">
-          {timeData.length > 0 ? (
+          {timeData.timestamp.length > 0 ? (
             <div className="chart-container">
               <Line data={prepareChartData()} options={chartOptions} />
             </div>
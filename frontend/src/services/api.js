@@ -1,26 +1,104 @@
 // API service for making requests to the backend
 const API_URL = process.env.REACT_APP_API_URL || '/api';
 
+// Number of points requested for time series charts, longer series are downsampled by the server
+export const MAX_CHART_POINTS = 2000;
+
+// Number of responses whose validators (ETag, Last-Modified) and data are kept for conditional GETs
+const MAX_VALIDATED_RESPONSES = 200;
+
+// Validators and data of earlier responses by URL, least recently used first
+const validatedResponses = new Map();
+
+/**
+ * Remember the validators and data of a response, or forget the URL if it has none
+ * @param {string} url - Requested URL
+ * @param {Response} response - Fetch response
+ * @param {*} data - Parsed JSON body
+ */
+function storeValidatedResponse(url, response, data) {
+  const etag = response.headers.get('ETag');
+  const lastModified = response.headers.get('Last-Modified');
+  validatedResponses.delete(url);
+  if (!etag && !lastModified) return;
+  validatedResponses.set(url, { etag, lastModified, data });
+  if (validatedResponses.size > MAX_VALIDATED_RESPONSES) {
+    validatedResponses.delete(validatedResponses.keys().next().value);
+  }
+}
+
+/**
+ * Return the message of the error record a streamed response ends with when the server failed
+ * after the response started: a last {error} element of an array or an '@error' member of an object
+ * @param {*} data - Parsed JSON body of a successful response
+ * @returns {string|null} - Error message, or null if the response is complete
+ */
+function streamError(data) {
+  if (Array.isArray(data)) {
+    const last = data[data.length - 1];
+    const isError = last && typeof last === 'object' && Object.keys(last).length === 1 && typeof last.error === 'string';
+    return isError ? last.error : null;
+  }
+  return data && typeof data === 'object' && typeof data['@error'] === 'string' ? data['@error'] : null;
+}
+
 /**
- * Fetch data from the API
+ * Fetch data from the API. Validators of earlier responses are sent along, and the data kept
+ * from the earlier response is returned when the server answers 304 Not Modified.
  * @param {string} endpoint - API endpoint to fetch from
  * @returns {Promise} - Promise with the JSON response
  */
 async function fetchData(endpoint) {
+  const url = `${API_URL}${endpoint}`;
   try {
-    const response = await fetch(`${API_URL}${endpoint}`);
+    const previous = validatedResponses.get(url);
+    const headers = {};
+    if (previous && previous.etag) headers['If-None-Match'] = previous.etag;
+    else if (previous && previous.lastModified) headers['If-Modified-Since'] = previous.lastModified;
+
+    // The validators are handled here, so the browser cache is bypassed
+    const response = await fetch(url, { headers, cache: 'no-store' });
+    
+    if (response.status === 304 && previous) {
+      validatedResponses.delete(url);
+      validatedResponses.set(url, previous);
+      return previous.data;
+    }
     
     if (!response.ok) {
       throw new Error(`HTTP error! Status: ${response.status}`);
     }
     
-    return await response.json();
+    const data = await response.json();
+    // A stream that failed midway must not be kept for revalidation
+    const error = streamError(data);
+    if (error !== null) {
+      validatedResponses.delete(url);
+      throw new Error(`Incomplete response: ${error}`);
+    }
+    storeValidatedResponse(url, response, data);
+    return data;
   } catch (error) {
     console.error('API fetch error:', error);
     throw error;
   }
 }
 
+/**
+ * Append query parameters to an endpoint, skipping null and undefined values
+ * @param {string} endpoint - API endpoint
+ * @param {Object} params - Query parameters
+ * @returns {string} - Endpoint with the query string
+ */
+function withParams(endpoint, params = {}) {
+  const query = new URLSearchParams();
+  Object.entries(params).forEach(([key, value]) => {
+    if (value !== null && value !== undefined) query.append(key, value);
+  });
+  const queryString = query.toString();
+  return queryString ? `${endpoint}?${queryString}` : endpoint;
+}
+
 /**
  * Get all users with their roles and basic info
  * @returns {Promise} - Promise with the users data including roles
@@ -44,22 +122,26 @@ export const getMachines = () => fetchData('/machines');
 /**
  * Get detailed usage statistics for a specific user
  * @param {string} username - Username to get data for
+ * @param {Object} params - Time series parameters: from, to, bucket (10m, 1h, 1d, 1w) and max_points
  * @returns {Promise} - Promise with the user usage data
  */
-export const getUserUsage = (username) => fetchData(`/usage/user/${username}`);
+export const getUserUsage = (username, params = {}) => fetchData(withParams(`/usage/user/${username}`, params));
 
 /**
  * Get detailed usage statistics for a specific machine
  * @param {string} machineName - Machine name to get data for
+ * @param {Object} params - Time series parameters: from, to, bucket (10m, 1h, 1d, 1w) and max_points
  * @returns {Promise} - Promise with the machine usage data
  */
-export const getMachineUsage = (machineName) => fetchData(`/usage/machine/${machineName}`);
+export const getMachineUsage = (machineName, params = {}) =>
+  fetchData(withParams(`/usage/machine/${machineName}`, params));
 
 /**
  * Get time-based usage statistics
+ * @param {Object} params - Time series parameters: from, to, bucket (10m, 1h, 1d, 1w) and max_points
  * @returns {Promise} - Promise with the time usage data
  */
-export const getTimeUsage = () => fetchData('/usage/time');
+export const getTimeUsage = (params = {}) => fetchData(withParams('/usage/time', params));
 
 /**
  * Get size distribution statistics
@@ -70,9 +152,12 @@ export const getSizeDistribution = () => fetchData('/usage/size');
 /**
  * Get time-based usage statistics for a specific user
  * @param {string} username - Username to get time stats for
- * @returns {Promise} - Promise with the user time usage data
+ * @param {Object} params - Time series parameters: from, to, bucket (10m, 1h, 1d, 1w) and max_points
+ * @returns {Promise} - Promise with the user time usage data, parallel timestamp and
+ *   total_operations arrays (timestamps as unix times with format: 'columns')
  */
-export const getUserTimeStats = (username) => fetchData(`/usage/user/${username}/time`);
+export const getUserTimeStats = (username, params = {}) =>
+  fetchData(withParams(`/usage/user/${username}/time`, params));
 
 /**
  * Get top users by IO operations for most recent logs
@@ -84,12 +169,18 @@ export const getTopUsersRecent = (logCount = 5, userCount = 10) =>
   fetchData(`/top-users/recent?logs=${logCount}&users=${userCount}`);
 
 /**
- * Get historic usage data with top N users for each log entry
+ * Get historic usage data with top N users for each log entry, most recent first
  * @param {number} topN - Number of top users to return per log entry
+ * @param {number} limit - Number of log entries per page (all if omitted)
+ * @param {number} before - unix_timestamp of the last entry of the previous page
  * @returns {Promise} - Promise with the historic usage data
  */
-export const getHistoricUsage = (topN = 10) => 
-  fetchData(`/usage/historic?top_n=${topN}`);
+export const getHistoricUsage = (topN = 10, limit = null, before = null) => {
+  const params = new URLSearchParams({ top_n: topN });
+  if (limit !== null) params.append('limit', limit);
+  if (before !== null) params.append('before', before);
+  return fetchData(`/usage/historic?${params.toString()}`);
+};
 
 /**
  * Get periodic task logs with pagination